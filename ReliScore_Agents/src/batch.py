@@ -0,0 +1,156 @@
+import os, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+from .utils import sha1
+from .safety import sanitize_claim
+from .idempotency import IdempotencyIndex
+
+def read_claims(path: Path, field: str = "claim") -> Iterator[str]:
+    # One claim per line: a JSON object (claim under `field`, else title/body/text) or a bare string.
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield line; continue
+            if isinstance(obj, str):
+                yield obj
+            elif isinstance(obj, dict):
+                text = obj.get(field) or obj.get("title") or obj.get("body") or obj.get("text")
+                if text: yield str(text)
+
+def claim_hash(claim: str) -> str:
+    return sha1(sanitize_claim(claim))
+
+def _run_one(claim: str) -> Tuple[str, Optional[Dict], float, Optional[str]]:
+    # Runs in a worker process; HTTP and memo caches are SQLite files under data_cache, so workers share them.
+    from .pipeline import process_claim
+    t0 = time.perf_counter()
+    try:
+        return claim, process_claim(claim), time.perf_counter() - t0, None
+    except Exception as e:
+        return claim, None, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+PARQUET_ROWS = 256
+
+def _parquet_schema():
+    # Declared up front: inferred from a batch that happens to be all errors, label/confidence would come out null-typed.
+    import pyarrow as pa
+    return pa.schema([("hash", pa.string()), ("claim", pa.string()), ("label", pa.string()), ("confidence", pa.float64()),
+                      ("n_items", pa.int64()), ("elapsed_s", pa.float64()), ("error", pa.string()), ("result", pa.string())])
+
+class _Writer:
+    # write() returns the rows that are now on disk; only those may be checkpointed.
+    def __init__(self, out: Path):
+        self.out = Path(out)
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        self.parquet = self.out.suffix == ".parquet"
+        self._rows: List[Dict] = []
+        self._run, self._part = int(time.time()), 0
+        if not self.parquet:
+            self._f = self.out.open("a", encoding="utf-8")
+
+    def write(self, row: Dict) -> List[Dict]:
+        if not self.parquet:
+            self._f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self._f.flush()
+            return [row]
+        self._rows.append(row)
+        return self._flush_parquet() if len(self._rows) >= PARQUET_ROWS else []
+
+    def _flush_parquet(self) -> List[Dict]:
+        # Every flush is a complete part file (an open ParquetWriter has no footer until close, so a crash would lose
+        # all its row groups); written under a temp name and renamed, so a part either exists whole or not at all.
+        if not self._rows: return []
+        import pyarrow as pa, pyarrow.parquet as pq
+        rows, self._rows = self._rows, []
+        cols = {k: [r.get(k) for r in rows] for k in ("hash", "claim", "label", "n_items", "elapsed_s", "error")}
+        cols["label"] = [None if v is None else str(v) for v in cols["label"]]
+        cols["confidence"] = [float(c) if isinstance(c, (int, float)) else None for c in (r.get("confidence") for r in rows)]
+        cols["result"] = [json.dumps(r.get("result"), ensure_ascii=False, default=str) for r in rows]
+        schema = _parquet_schema()
+        self._part += 1
+        part = self.out.with_name(f"{self.out.stem}.{self._run}-{self._part:05d}{self.out.suffix}")
+        tmp = part.with_name(part.name + ".tmp")
+        pq.write_table(pa.table({f.name: cols[f.name] for f in schema}, schema=schema), str(tmp))
+        os.replace(tmp, part)
+        return rows
+
+    def close(self) -> List[Dict]:
+        if self.parquet: return self._flush_parquet()
+        self._f.close()
+        return []
+
+def _pct(xs: List[float], p: float) -> float:
+    if not xs: return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p * (len(xs) - 1))))]
+
+def run_batch(claims_path: Path, out_path: Path, workers: int = 4, field: str = "claim", max_in_flight: Optional[int] = None) -> Dict:
+    out_path = Path(out_path)
+    done = IdempotencyIndex(out_path.with_name(out_path.name + ".done.sqlite"))
+    writer = _Writer(out_path)
+    max_in_flight = max_in_flight or workers * 4
+    latencies: List[float] = []
+    src_calls: Dict[str, int] = {}
+    src_fail: Dict[str, int] = {}
+    n_ok = n_err = n_skip = 0
+    seen = set()
+    def mark(rows: List[Dict]):
+        for r in rows:
+            if not r["error"]: done.check_and_mark(r["hash"])
+    t0 = time.perf_counter()
+    claims = iter(read_claims(claims_path, field))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        while True:
+            while len(pending) < max_in_flight:
+                claim = next(claims, None)
+                if claim is None: break
+                h = claim_hash(claim)
+                if h in seen or h in done:
+                    n_skip += 1; continue
+                seen.add(h)
+                pending.add(pool.submit(_run_one, claim))
+            if not pending: break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                claim, res, elapsed, err = fut.result()
+                h = claim_hash(claim)
+                latencies.append(elapsed)
+                for name, st in ((res or {}).get("retrieval") or {}).items():
+                    src_calls[name] = src_calls.get(name, 0) + 1
+                    if st.get("status") != "ok": src_fail[name] = src_fail.get(name, 0) + 1
+                verdict = (res or {}).get("verdict") or {}
+                # only successful claims are checkpointed, and only once their row is on disk, so failures and rows
+                # still buffered when the run dies are retried on resume
+                mark(writer.write({"hash": h, "claim": claim, "label": verdict.get("label"), "confidence": verdict.get("confidence"),
+                                   "n_items": len((res or {}).get("study_points") or []), "elapsed_s": round(elapsed, 3),
+                                   "error": err, "result": res}))
+                if err:
+                    n_err += 1
+                    logger.warning(f"[batch] {h[:10]} failed: {err}")
+                else:
+                    n_ok += 1
+    mark(writer.close())
+    wall = time.perf_counter() - t0
+    report = {
+        "processed": n_ok, "failed": n_err, "skipped": n_skip, "wall_s": round(wall, 2),
+        "throughput_per_s": round((n_ok + n_err) / wall, 3) if wall > 0 else 0.0,
+        "latency_p50_s": round(_pct(latencies, 0.50), 3), "latency_p95_s": round(_pct(latencies, 0.95), 3),
+        "source_error_rate": {k: round(src_fail.get(k, 0) / v, 3) for k, v in sorted(src_calls.items())},
+    }
+    logger.info(f"[batch] {json.dumps(report)}")
+    return report
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Score claims from a JSONL file with a process pool; resumable.")
+    ap.add_argument("claims"); ap.add_argument("out")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--field", default="claim")
+    args = ap.parse_args()
+    print(json.dumps(run_batch(Path(args.claims), Path(args.out), workers=args.workers, field=args.field), indent=2))
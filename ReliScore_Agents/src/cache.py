@@ -1,21 +1,141 @@
-from typing import Any
-from .utils import save_json, load_json, sha1, cache_path
+import os, json, time, zlib, sqlite3, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .utils import load_json, sha1, cache_path
 
-def get_or_set(name: str, builder) -> Any:
-    p = cache_path(name)
-    obj = load_json(p)
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_MEM_ITEMS = int(os.environ.get("CACHE_MEM_ITEMS", "2048"))
+_MISSING = object()
+
+class CacheStore:
+    # In-process LRU tier in front of a single SQLite file (WAL, safe across worker processes).
+    def __init__(self, path: Path, max_bytes: int = CACHE_MAX_BYTES, mem_items: int = CACHE_MEM_ITEMS, default_ttl: Optional[float] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes, self.mem_items, self.default_ttl = max_bytes, mem_items, default_ttl
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.counters = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, atime REAL)")
+            c.execute("CREATE INDEX IF NOT EXISTS kv_atime ON kv(atime)")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _mem_put(self, key: str, raw: str, expires: Optional[float]):
+        with self._lock:
+            self._mem[key] = (raw, expires)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_items:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if hit[1] is None or hit[1] > now:
+                    self._mem.move_to_end(key)
+                    self.counters["mem_hits"] += 1
+                    return json.loads(hit[0])
+                del self._mem[key]
+        row = self._conn().execute("SELECT value, expires, atime FROM kv WHERE key=?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return default
+        blob, expires, atime = row
+        if expires is not None and expires <= now:
+            self._conn().execute("DELETE FROM kv WHERE key=? AND expires<=?", (key, now))
+            self._count("expired"); self._count("misses")
+            return default
+        if now - (atime or 0) > 60:
+            self._conn().execute("UPDATE kv SET atime=? WHERE key=?", (now, key))
+        raw = zlib.decompress(blob).decode("utf-8")
+        self._mem_put(key, raw, expires)
+        self._count("disk_hits")
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = _MISSING):
+        ttl = self.default_ttl if ttl is _MISSING else ttl
+        now = time.time()
+        expires = now + ttl if ttl else None
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        blob = zlib.compress(raw.encode("utf-8"), 6)
+        self._conn().execute("INSERT OR REPLACE INTO kv (key, value, size, expires, atime) VALUES (?,?,?,?,?)",
+                             (key, blob, len(blob), expires, now))
+        self._mem_put(key, raw, expires)
+        self._count("sets")
+        with self._lock:
+            self._writes += 1
+            check = self._writes % 64 == 0
+        if check:
+            self.evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._mem.pop(key, None)
+        self._conn().execute("DELETE FROM kv WHERE key=?", (key,))
+
+    def evict(self) -> int:
+        c = self._conn()
+        n = c.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires<=?", (time.time(),)).rowcount
+        total = c.execute("SELECT COALESCE(SUM(size),0) FROM kv").fetchone()[0]
+        if total > self.max_bytes:
+            excess, victims = total - int(self.max_bytes * 0.9), []
+            for key, size in c.execute("SELECT key, size FROM kv ORDER BY atime"):
+                victims.append((key,)); excess -= size
+                if excess <= 0: break
+            c.executemany("DELETE FROM kv WHERE key=?", victims)
+            with self._lock:
+                for (k,) in victims: self._mem.pop(k, None)
+            n += len(victims)
+        if n: self._count("evictions", n)
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM kv").fetchone()
+        with self._lock:
+            out = dict(self.counters); out["mem_entries"] = len(self._mem)
+        hits = out["mem_hits"] + out["disk_hits"]
+        out.update(entries=entries, bytes=size, hit_rate=round(hits / max(1, hits + out["misses"]), 4))
+        return out
+
+_STORES: Dict[str, CacheStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(name: str = "cache", **kw) -> CacheStore:
+    with _STORES_LOCK:
+        if name not in _STORES:
+            _STORES[name] = CacheStore(cache_path(f"{name}.sqlite"), **kw)
+        return _STORES[name]
+
+def _read_through(store: CacheStore, key: str, legacy: Path, builder) -> Any:
+    obj = store.get(key)
     if obj is not None:
         return obj
-    obj = builder()
-    save_json(p, obj)
+    obj = load_json(legacy) if legacy.exists() else None
+    if obj is None:
+        obj = builder()
+    store.set(key, obj)
     return obj
 
+def get_or_set(name: str, builder) -> Any:
+    return _read_through(get_store(), f"name:{name}", cache_path(name), builder)
+
 def memoize_json(key: str, fn, *args, **kwargs) -> Any:
     h = sha1(key)
-    p = cache_path(f"memo/{h}.json")
-    obj = load_json(p)
-    if obj is not None:
-        return obj
-    obj = fn(*args, **kwargs)
-    save_json(p, obj)
-    return obj
+    return _read_through(get_store(), f"memo:{h}", cache_path(f"memo/{h}.json"), lambda: fn(*args, **kwargs))
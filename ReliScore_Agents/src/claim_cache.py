@@ -0,0 +1,145 @@
+import os, re, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from loguru import logger
+from .utils import sha1
+from .safety import sanitize_claim, safety_checks
+from .nlp.claim_detect import classify_intent, query_terms
+from .cache import get_store
+from .config import load_run_config
+from .tracing import count
+
+CCFG = load_run_config().get("claim_cache", {})
+CLAIM_CACHE = os.environ.get("CLAIM_CACHE", "1") != "0"
+_WORD = re.compile(r"[^\W_]+")
+
+def claim_key(claim_raw: str) -> Tuple[str, str, str]:
+    # (key, sanitized claim, intent). Case, punctuation and spacing don't change the key; word order does ("A is superior
+    # to B" is not "B is superior to A"). The per-source query_terms are part of it, so a change in how queries are built
+    # doesn't serve results retrieved with the old ones.
+    claim = sanitize_claim(claim_raw)
+    intent = classify_intent(claim)
+    parts = [intent, " ".join(_WORD.findall(claim.casefold()))]
+    parts += [f"{src}={' '.join(_WORD.findall(q.casefold()))}" for src, q in sorted(query_terms(claim, intent).items())]
+    return sha1("|".join(parts)), claim, intent
+
+def _degraded(result: Dict) -> bool:
+    # Some source timed out or failed, so the verdict rests on partial evidence.
+    return any((st or {}).get("status") != "ok" for st in (result.get("retrieval") or {}).values())
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+    def __init__(self):
+        self.event, self.value, self.error = threading.Event(), None, None
+
+class ClaimCache:
+    # process_claim results by normalized claim. Fresh for ttl_s[intent]; for stale_s after that the cached result is
+    # served immediately while one background run refreshes it. Concurrent misses for the same key share one run. A result
+    # from a run where some source failed is kept only for degraded_ttl_s and never served stale.
+    def __init__(self, ttl_s: Optional[Dict[str, float]] = None, stale_s: Optional[float] = None, refresh_workers: int = 2,
+                 degraded_ttl_s: Optional[float] = None):
+        self.ttl_s = {k: float(v) for k, v in (ttl_s or CCFG.get("ttl_s") or {"default": 86400}).items()}
+        self.stale_s = float(CCFG.get("stale_s", 7 * 86400) if stale_s is None else stale_s)
+        self.degraded_ttl_s = float(CCFG.get("degraded_ttl_s", 600) if degraded_ttl_s is None else degraded_ttl_s)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+        self._pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="reli-claim-refresh")
+        self.counters = {"hits": 0, "stale": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "refresh_errors": 0, "degraded": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+        count(f"claim_cache.{name}")
+
+    def ttl(self, intent: str) -> float:
+        return self.ttl_s.get(intent, self.ttl_s.get("default", 86400.0))
+
+    def _store(self):
+        return get_store("claims", mem_items=256)
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        try:
+            return self._store().get(key)
+        except Exception as e:
+            logger.debug(f"[claim_cache] read failed for {key}: {e}")
+            return None
+
+    def _compute(self, key: str, intent: str, fn: Callable[[], Dict]) -> Dict:
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            self._count("coalesced")
+            flight.event.wait()
+            if flight.error is not None: raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+            if flight.value is not None:
+                degraded = _degraded(flight.value)
+                if degraded: self._count("degraded")
+                try:
+                    self._store().set(key, {"fetched": time.time(), "intent": intent, "degraded": degraded, "result": flight.value},
+                                      ttl=self.degraded_ttl_s if degraded else self.ttl(intent) + self.stale_s)
+                except Exception as e:
+                    logger.debug(f"[claim_cache] write failed for {key}: {e}")
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def _refresh(self, key: str, intent: str, fn: Callable[[], Dict]):
+        with self._lock:
+            if key in self._inflight: return
+        self._count("refreshes")
+        def run():
+            try:
+                self._compute(key, intent, fn)
+            except Exception as e:
+                self._count("refresh_errors")
+                logger.warning(f"[claim_cache] background refresh failed: {type(e).__name__}: {e}")
+        self._pool.submit(run)
+
+    @staticmethod
+    def _serve(result: Optional[Dict], claim: str, status: str, age: float) -> Optional[Dict]:
+        # A cached result may come from a differently worded claim: show this claim's text and safety flags.
+        if result is None: return None
+        out = dict(result, claim=claim, safety=safety_checks(claim), cache={"status": status, "age_s": round(age, 1)})
+        if isinstance(out.get("facts"), dict) and "claim" in out["facts"]:
+            out["facts"] = dict(out["facts"], claim=claim)
+        return out
+
+    def get_or_compute(self, claim_raw: str, fn: Callable[[str], Dict]) -> Optional[Dict]:
+        key, claim, intent = claim_key(claim_raw)
+        e = self._lookup(key)
+        if e is not None:
+            age = time.time() - e.get("fetched", 0)
+            ttl, stale = (self.degraded_ttl_s, 0.0) if e.get("degraded") else (self.ttl(intent), self.stale_s)
+            if age < ttl:
+                self._count("hits")
+                return self._serve(e.get("result"), claim, "hit", age)
+            if age < ttl + stale:
+                self._count("stale")
+                self._refresh(key, intent, lambda: fn(claim_raw))
+                return self._serve(e.get("result"), claim, "stale", age)
+        self._count("misses")
+        return self._serve(self._compute(key, intent, lambda: fn(claim_raw)), claim, "miss", 0.0)
+
+    def invalidate(self, claim_raw: str):
+        self._store().delete(claim_key(claim_raw)[0])
+
+_CACHE: Optional[ClaimCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def claim_cache() -> ClaimCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ClaimCache()
+        return _CACHE
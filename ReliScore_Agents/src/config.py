@@ -6,6 +6,11 @@ DEFAULTS = {
     "multihop": {"hop_limit": 3},
     "sd": {"model_id": "runwayml/stable-diffusion-v1-5", "height": 512, "width": 512, "steps": 25, "guidance": 7.5},
     "agent": {"max_hops": 3, "enable_calculator": True, "allow_images": True},
+    "ranking": {"tier_weights": {}, "recency_window": 20.0, "relevance_weight": 0.5},
+    "retrieval": {"deadline_s": 10, "max_workers": 16, "per_source_cap": 4, "source_caps": {}},
+    "claim_cache": {"ttl_s": {"default": 86400, "meta_news": 3 * 3600}, "stale_s": 7 * 86400, "degraded_ttl_s": 600},
+    "evidence_index": {"k": 40, "min_match": 0.5, "fresh_s": 7 * 86400, "enough": 20},
+    "vectors": {"backend": "hashing", "model": "", "dim": 384, "nprobe": 16, "ann_k": 20},
 }
 
 def load_json_if_exists(p: str):
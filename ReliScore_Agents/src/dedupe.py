@@ -0,0 +1,147 @@
+import re, hashlib
+from typing import Dict, List, Optional, Set
+import numpy as np
+
+SOURCE_PRIORITY = {"PubMed": 0, "EuropePMC": 1, "ClinicalTrials.gov": 2, "FDA": 2, "Crossref": 3, "Preprint": 4}
+NUM_PERM, BANDS = 32, 8
+ROWS = NUM_PERM // BANDS
+NEAR_DUP_JACCARD = 0.8
+MIN_TITLE_LEN = 24
+STRONG_IDS = ("doi", "pmid", "pmcid", "nct")
+_P = np.uint64(4294967311)
+_rng = np.random.RandomState(1234)
+_A = _rng.randint(1, 2**31 - 1, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2**31 - 1, size=NUM_PERM).astype(np.uint64)
+_FOLD = _rng.randint(1, 2**31 - 1, size=ROWS).astype(np.uint64) * np.uint64(2**31 + 1)
+
+NCT_PAT = re.compile(r"\bNCT\d{8}\b", re.I)
+RAW_ID_PAT = re.compile(r"^[A-Za-z][\w.]*:\S+$")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def norm_title(t: str) -> str:
+    return _NON_ALNUM.sub(" ", (t or "").lower()).strip()
+
+def title_hash(t: str) -> str:
+    return hashlib.blake2b(t.encode("utf-8"), digest_size=8).hexdigest()
+
+def canonical_keys(x: Dict, nt: Optional[str] = None) -> List[str]:
+    ident = str(x.get("id") or "")
+    keys = []
+    head, _, tail = ident.partition(":")
+    head = head.upper()
+    doi = (x.get("doi") or (tail if head == "DOI" else "")).strip().lower()
+    pmid = str(x.get("pmid") or (tail if head == "PMID" else "")).strip()
+    pmcid = str(x.get("pmcid") or (tail if head == "PMCID" else "")).strip().upper()
+    if doi: keys.append("doi:" + doi)
+    if pmid: keys.append("pmid:" + pmid)
+    if pmcid: keys.append("pmcid:" + pmcid)
+    m = NCT_PAT.search(ident)
+    if m: keys.append("nct:" + m.group(0).upper())
+    if keys: return keys  # a title is only an identity for records without a registry id: two DOIs can share a title
+    if RAW_ID_PAT.match(ident): keys.append("id:" + ident)
+    nt = norm_title(x.get("title")) if nt is None else nt
+    if len(nt) >= MIN_TITLE_LEN: keys.append("title:" + title_hash(nt))
+    return keys
+
+def strong_ids(keys: List[str]) -> Dict[str, str]:
+    # {"doi": "doi:10.1/x", "pmid": ...} from a record's canonical keys: the registry ids it carries.
+    return {k.partition(":")[0]: k for k in keys if k.partition(":")[0] in STRONG_IDS}
+
+def compatible_ids(a: Dict[str, str], b: Dict[str, str]) -> bool:
+    # False when both carry the same kind of id with different values (two DOIs, two PMIDs): different papers.
+    return all(a.get(t, v) == v for t, v in b.items())
+
+def _shingles(nt: str, k: int = 4) -> Set[int]:
+    # Python's str hash is salted per process, which is fine: signatures never leave the process.
+    s = nt.replace(" ", "")
+    return {hash(s[i:i + k]) & 0xFFFFFFFF for i in range(max(1, len(s) - k + 1))}
+
+def _band_keys(shingle_sets: List[Set[int]], chunk: int = 1 << 16) -> np.ndarray:
+    # MinHash all sets in one vectorized pass, then fold each band's ROWS minima into one uint64 bucket key.
+    lens = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    flat = np.fromiter((h for s in shingle_sets for h in s), dtype=np.uint64, count=int(lens.sum()))
+    starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+    sig = np.empty((len(shingle_sets), NUM_PERM), dtype=np.uint64)
+    i = 0
+    while i < len(shingle_sets):
+        j = i + 1
+        while j < len(shingle_sets) and starts[j] + lens[j] - starts[i] <= chunk: j += 1
+        lo, hi = starts[i], starts[j - 1] + lens[j - 1]
+        hv = (_A[:, None] * flat[None, lo:hi] + _B[:, None]) % _P
+        sig[i:j] = np.minimum.reduceat(hv, starts[i:j] - lo, axis=1).T
+        i = j
+    with np.errstate(over="ignore"):
+        return (sig.reshape(-1, BANDS, ROWS) * _FOLD).sum(axis=2, dtype=np.uint64)
+
+class _UF:
+    # Union-find whose groups remember their strong ids; a union that would join conflicting ids is refused.
+    def __init__(self, keys: List[List[str]]):
+        self.p = list(range(len(keys)))
+        self.keys = keys
+        self.ids: Dict[int, Dict[str, str]] = {}  # per root, filled on first union
+    def find(self, i: int) -> int:
+        while self.p[i] != i:
+            self.p[i] = self.p[self.p[i]]; i = self.p[i]
+        return i
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb: return True
+        ia = self.ids.get(ra) or strong_ids(self.keys[ra])
+        ib = self.ids.get(rb) or strong_ids(self.keys[rb])
+        if not compatible_ids(ia, ib): return False
+        lo, hi = min(ra, rb), max(ra, rb)
+        self.p[hi] = lo
+        self.ids[lo] = {**ib, **ia} if ia and ib else ia or ib
+        self.ids.pop(hi, None)
+        return True
+
+def _years_compatible(a: Dict, b: Dict) -> bool:
+    ya, yb = a.get("year"), b.get("year")
+    return not (isinstance(ya, int) and isinstance(yb, int) and abs(ya - yb) > 1)
+
+def merge_records(group: List[Dict]) -> Dict:
+    group = sorted(group, key=lambda r: SOURCE_PRIORITY.get(r.get("source"), 9))
+    out = dict(group[0])
+    for r in group[1:]:
+        for k, v in r.items():
+            if v in (None, "", [], {}): continue
+            if out.get(k) in (None, "", [], {}):
+                out[k] = v
+            elif k in ("abstract", "summary") and isinstance(v, str) and len(v) > len(out.get(k) or ""):
+                out[k] = v
+    if len(group) > 1:
+        out["sources"] = list(dict.fromkeys(r.get("source") for r in group if r.get("source")))
+        out["merged_ids"] = list(dict.fromkeys(r.get("id") for r in group if r.get("id")))
+    return out
+
+def dedupe_records(items: List[Dict], near_dup: bool = True) -> List[Dict]:
+    # Canonical IDs (DOI/PMID/PMCID/NCT, else normalized-title hash) join exact duplicates; MinHash/LSH joins near-duplicate
+    # titles. Title matches need compatible years, and no join may put two different DOIs (PMIDs, ...) in one group.
+    n = len(items)
+    if n < 2: return list(items)
+    titles = [norm_title(x.get("title")) for x in items]
+    keyed = [canonical_keys(x, nt) for x, nt in zip(items, titles)]
+    uf = _UF(keyed)
+    owner: Dict[str, int] = {}
+    for i, ks in enumerate(keyed):
+        for k in ks:
+            j = owner.setdefault(k, i)
+            if j != i and (not k.startswith("title:") or _years_compatible(items[i], items[j])): uf.union(i, j)
+    idx = [i for i, nt in enumerate(titles) if len(nt) >= MIN_TITLE_LEN]
+    if near_dup and len(idx) > 1:
+        shs = [_shingles(titles[i]) for i in idx]
+        keys = _band_keys(shs).tolist()
+        buckets: List[Dict[int, int]] = [{} for _ in range(BANDS)]
+        for pos, i in enumerate(idx):
+            for b, key in enumerate(keys[pos]):
+                q = buckets[b].setdefault(key, pos)
+                if q == pos: continue
+                j = idx[q]
+                if uf.find(i) == uf.find(j): continue
+                sh, other = shs[pos], shs[q]
+                if len(sh & other) >= NEAR_DUP_JACCARD * len(sh | other) and _years_compatible(items[i], items[j]):
+                    uf.union(i, j)
+    groups: Dict[int, List[Dict]] = {}
+    for i, x in enumerate(items):
+        groups.setdefault(uf.find(i), []).append(x)
+    return [merge_records(g) if len(g) > 1 else g[0] for g in groups.values()]
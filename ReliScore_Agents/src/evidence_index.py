@@ -0,0 +1,356 @@
+import os, re, json, math, time, shutil, sqlite3, threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from .utils import cache_path
+from .dedupe import canonical_keys, dedupe_records, merge_records, strong_ids, compatible_ids
+
+SEGMENT_DOCS = int(os.environ.get("INDEX_SEGMENT_DOCS", "100000"))
+MERGE_FACTOR = int(os.environ.get("INDEX_MERGE_FACTOR", "10"))
+BM25_K1, BM25_B = 1.2, 0.75
+TITLE_WEIGHT = 2  # title tokens are counted this many times, a cheap stand-in for per-field BM25F weights
+MAX_TERM = 32
+_WORD = re.compile(r"[^\W_]{2,}")
+# English function words plus the operators and site: filters that appear in source query strings
+STOPWORDS = frozenset("""a an and are as at be by for from has have in into is it its of on or not that the their this to
+was were which with without vs versus among between after before during site org www com""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [t[:MAX_TERM] for t in _WORD.findall((text or "").casefold()) if t not in STOPWORDS]
+
+def doc_tokens(x: Dict) -> List[str]:
+    return tokenize(x.get("title")) * TITLE_WEIGHT + tokenize(x.get("abstract"))
+
+def _build(docs: List[List[str]]) -> Dict[str, np.ndarray]:
+    # Token lists -> CSR postings: vocab (sorted), indptr over vocab, local doc and term frequency per posting.
+    lut: Dict[str, int] = {}
+    flat = array("i")
+    for toks in docs:
+        flat.extend([lut.setdefault(t, len(lut)) for t in toks])
+    n = len(docs)
+    dl = np.fromiter((len(t) for t in docs), dtype=np.int32, count=n)
+    vocab = np.array(list(lut), dtype=f"U{MAX_TERM}") if lut else np.zeros(0, dtype=f"U{MAX_TERM}")
+    order = np.argsort(vocab, kind="stable")
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[order] = np.arange(len(vocab))
+    keys = rank[np.frombuffer(flat, dtype=np.int32)] * n + np.repeat(np.arange(n, dtype=np.int64), dl)
+    keys, tf = np.unique(keys, return_counts=True)
+    return _pack(vocab[order], keys // max(n, 1), keys % max(n, 1), tf, dl)
+
+def _pack(vocab: np.ndarray, term: np.ndarray, doc: np.ndarray, tf: np.ndarray, dl: np.ndarray) -> Dict[str, np.ndarray]:
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term, minlength=len(vocab)), out=indptr[1:])
+    return {"vocab": vocab, "indptr": indptr, "docs": doc.astype(np.int32), "tf": np.minimum(tf, 65535).astype(np.uint16),
+            "dl": dl.astype(np.int32)}
+
+class _Segment:
+    # One immutable, memory-mapped segment; only the live bitmap is ever written (in place, shared across processes).
+    __slots__ = ("id", "path", "vocab", "indptr", "docs", "tf", "dl", "ids", "live")
+    def __init__(self, sid: int, path: Path):
+        self.id, self.path = sid, path
+        for n in ("vocab", "indptr", "docs", "tf", "dl", "ids"):
+            setattr(self, n, np.load(path / f"{n}.npy", mmap_mode="r"))
+        self.live = np.load(path / "live.npy", mmap_mode="r+")
+
+    def ranges(self, terms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if not len(self.vocab): return np.zeros(len(terms), dtype=np.int64), np.zeros(len(terms), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.vocab, terms), len(self.vocab) - 1)
+        found = self.vocab[pos] == terms
+        return np.where(found, self.indptr[pos], 0), np.where(found, self.indptr[pos + 1], 0)
+
+    def kill(self, doc_ids: np.ndarray) -> int:
+        pos = np.minimum(np.searchsorted(self.ids, doc_ids), len(self.ids) - 1)
+        pos = pos[self.ids[pos] == doc_ids]
+        self.live[pos] = 0
+        return len(pos)
+
+class EvidenceIndex:
+    # BM25 over title + abstract of harvested/retrieved evidence. Postings live in immutable mmapped segments, records and
+    # their canonical keys in SQLite. Re-adding a record (same DOI/PMID/...) replaces it: the old doc is cleared in its
+    # segment's live bitmap and dropped for good when segments are merged (tiered, MERGE_FACTOR per tier, in the background).
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._segs: Dict[int, _Segment] = {}
+        self._segs_lock = threading.Lock()
+        self._merger = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reli-index-merge")
+        self._merge_pending = threading.Event()
+        c = self._conn()
+        c.execute("CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, item TEXT, len INTEGER, added REAL)")
+        c.execute("CREATE TABLE IF NOT EXISTS keys (ckey TEXT PRIMARY KEY, doc INTEGER) WITHOUT ROWID")
+        c.execute("CREATE INDEX IF NOT EXISTS keys_doc ON keys(doc)")
+        c.execute("CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, docs INTEGER, created REAL)")
+        c.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER)")
+        c.executemany("INSERT OR IGNORE INTO meta (k, v) VALUES (?, 0)", [("docs",), ("tokens",), ("next_doc",), ("next_seg",)])
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(str(self.root / "index.sqlite"), timeout=120, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _meta(self, c: sqlite3.Connection) -> Dict[str, int]:
+        return dict(c.execute("SELECT k, v FROM meta").fetchall())
+
+    def _segments(self, ids: List[int]) -> List[_Segment]:
+        # Open mmaps are cached per segment id; segments merged away are dropped (their files may already be unlinked).
+        with self._segs_lock:
+            for sid in set(self._segs) - set(ids):
+                del self._segs[sid]
+            for sid in ids:
+                if sid not in self._segs:
+                    self._segs[sid] = _Segment(sid, self.root / f"seg.{sid}")
+            return [self._segs[sid] for sid in ids]
+
+    def _write(self, sid: int, arrays: Dict[str, np.ndarray], ids: np.ndarray) -> Path:
+        p = self.root / f"seg.{sid}"
+        p.mkdir(parents=True, exist_ok=True)
+        for n, a in arrays.items():
+            np.save(p / f"{n}.npy", a)
+        np.save(p / "ids.npy", ids.astype(np.int64))
+        np.save(p / "live.npy", np.ones(len(ids), dtype=np.uint8))
+        return p
+
+    def _kill(self, c: sqlite3.Connection, doc_ids: List[int]):
+        if not doc_ids: return
+        dead = np.unique(np.asarray(doc_ids, dtype=np.int64))
+        sids = [r[0] for r in c.execute("SELECT id FROM segments ORDER BY id")]
+        for s in self._segments(sids):
+            if s.kill(dead): s.live.flush()
+
+    # --- writes
+    def add(self, items: List[Dict]) -> int:
+        # Indexes (or replaces) records; returns how many documents were written.
+        items = dedupe_records([{k: v for k, v in x.items() if not k.startswith("_")} for x in items], near_dup=False)
+        for i in range(0, len(items), SEGMENT_DOCS):
+            self._add_segment(items[i:i + SEGMENT_DOCS])
+        if items: self.schedule_merge()
+        return len(items)
+
+    def _old(self, c: sqlite3.Connection, ckeys: List[str]) -> Dict[str, int]:
+        out = {}
+        for i in range(0, len(ckeys), 500):
+            chunk = ckeys[i:i + 500]
+            out.update(c.execute(f"SELECT ckey, doc FROM keys WHERE ckey IN ({','.join('?' * len(chunk))})", chunk))
+        return out
+
+    def _add_segment(self, items: List[Dict]):
+        keyed = [canonical_keys(x) for x in items]
+        now = time.time()
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        path = None
+        try:
+            old = self._old(c, list({k for ks in keyed for k in ks}))
+            dead: Dict[int, None] = {}
+            if old:
+                prev = {}
+                olds = list(set(old.values()))
+                for i in range(0, len(olds), 500):
+                    chunk = olds[i:i + 500]
+                    prev.update(c.execute(f"SELECT id, item FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+                for j, ks in enumerate(keyed):
+                    # a stored doc sharing a key but carrying a different DOI/PMID/... is another paper and stays
+                    have = strong_ids(ks)
+                    ids = [d for d in dict.fromkeys(old[k] for k in ks if k in old)
+                           if d in prev and compatible_ids(have, strong_ids(canonical_keys(json.loads(prev[d]), "")))]
+                    if not ids: continue
+                    # the fresh copy wins; fields only the stored copy has (an abstract, an effect) are kept
+                    items[j] = merge_records([items[j]] + [json.loads(prev[d]) for d in ids])
+                    keyed[j] = canonical_keys(items[j])
+                    dead.update(dict.fromkeys(ids))
+            meta = self._meta(c)
+            first, sid = meta["next_doc"] + 1, meta["next_seg"] + 1
+            toks = [doc_tokens(x) for x in items]
+            arrays = _build(toks)
+            ids = np.arange(first, first + len(items), dtype=np.int64)
+            path = self._write(sid, arrays, ids)
+            dead_ids = list(dead)
+            gone = 0
+            for i in range(0, len(dead_ids), 500):
+                chunk = dead_ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                gone += c.execute(f"SELECT COALESCE(SUM(len), 0) FROM docs WHERE id IN ({marks})", chunk).fetchone()[0]
+                c.execute(f"DELETE FROM docs WHERE id IN ({marks})", chunk)
+                c.execute(f"DELETE FROM keys WHERE doc IN ({marks})", chunk)
+            c.executemany("INSERT INTO docs (id, item, len, added) VALUES (?,?,?,?)",
+                          ((int(d), json.dumps(x, ensure_ascii=False, default=str), len(t), now) for d, x, t in zip(ids, items, toks)))
+            c.executemany("INSERT OR IGNORE INTO keys (ckey, doc) VALUES (?,?)",
+                          ((k, int(d)) for d, ks in zip(ids, keyed) for k in ks))
+            c.execute("INSERT INTO segments (id, docs, created) VALUES (?,?,?)", (sid, len(items), now))
+            c.executemany("UPDATE meta SET v=? WHERE k=?", [
+                (meta["docs"] + len(items) - len(dead_ids), "docs"), (meta["tokens"] + int(arrays["dl"].sum()) - gone, "tokens"),
+                (int(ids[-1]), "next_doc"), (sid, "next_seg")])
+            # cleared inside the transaction so a concurrent merge can't carry a replaced doc forward
+            self._kill(c, dead_ids)
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            if path is not None: shutil.rmtree(path, ignore_errors=True)
+            raise
+
+    def schedule_merge(self):
+        if self._merge_pending.is_set(): return
+        self._merge_pending.set()
+        def run():
+            self._merge_pending.clear()
+            try:
+                self.maybe_merge()
+            except Exception as e:
+                logger.warning(f"[index] merge failed: {type(e).__name__}: {e}")
+        self._merger.submit(run)
+
+    def maybe_merge(self) -> int:
+        # Tiered policy: a segment's tier is log_MERGE_FACTOR(docs); MERGE_FACTOR segments on one tier merge into one.
+        merged = 0
+        while True:
+            tiers: Dict[int, List[int]] = {}
+            for sid, n in self._conn().execute("SELECT id, docs FROM segments ORDER BY id"):
+                tiers.setdefault(int(math.log(max(n, 1), MERGE_FACTOR)), []).append(sid)
+            full = [ids for ids in tiers.values() if len(ids) >= MERGE_FACTOR]
+            if not full: return merged
+            self.merge(full[0][:MERGE_FACTOR]); merged += 1
+
+    def optimize(self):
+        sids = [r[0] for r in self._conn().execute("SELECT id FROM segments")]
+        if len(sids) > 1: self.merge(sids)
+
+    def merge(self, sids: List[int]):
+        # Rewrites the given segments as one, dropping replaced docs; writers wait on the IMMEDIATE transaction meanwhile.
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        path = None
+        try:
+            have = {r[0] for r in c.execute("SELECT id FROM segments")}
+            segs = self._segments(sorted(have))
+            segs = [s for s in segs if s.id in set(sids)]
+            if len(segs) < 2:
+                c.execute("ROLLBACK"); return
+            ids = np.concatenate([np.asarray(s.ids)[np.asarray(s.live, dtype=bool)] for s in segs])
+            order = np.argsort(ids, kind="stable")
+            ids = ids[order]
+            n = len(ids)
+            newpos = np.empty(n, dtype=np.int64); newpos[order] = np.arange(n)
+            vocab = np.unique(np.concatenate([np.asarray(s.vocab) for s in segs]))
+            terms, docs, tfs, dl = [], [], [], np.empty(n, dtype=np.int32)
+            off = 0
+            for s in segs:
+                live = np.asarray(s.live, dtype=bool)
+                local = np.full(len(live), -1, dtype=np.int64)
+                local[live] = newpos[off:off + int(live.sum())]
+                dl[local[live]] = np.asarray(s.dl)[live]
+                off += int(live.sum())
+                tmap = np.searchsorted(vocab, np.asarray(s.vocab))
+                t = np.repeat(tmap, np.diff(np.asarray(s.indptr)))
+                d = local[np.asarray(s.docs)]
+                keep = d >= 0
+                terms.append(t[keep]); docs.append(d[keep]); tfs.append(np.asarray(s.tf)[keep])
+            t, d, tf = np.concatenate(terms), np.concatenate(docs), np.concatenate(tfs)
+            o = np.argsort(t * max(n, 1) + d, kind="stable")
+            arrays = _pack(vocab, t[o], d[o], tf[o], dl)
+            sid = self._meta(c)["next_seg"] + 1
+            path = self._write(sid, arrays, ids)
+            marks = ",".join("?" * len(segs))
+            c.execute(f"DELETE FROM segments WHERE id IN ({marks})", [s.id for s in segs])
+            c.execute("INSERT INTO segments (id, docs, created) VALUES (?,?,?)", (sid, n, time.time()))
+            c.execute("UPDATE meta SET v=? WHERE k='next_seg'", (sid,))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            if path is not None: shutil.rmtree(path, ignore_errors=True)
+            raise
+        # open mmaps of merged-away segments stay valid after unlink
+        for s in segs:
+            shutil.rmtree(s.path, ignore_errors=True)
+
+    # --- reads
+    def size(self) -> int:
+        return self._meta(self._conn())["docs"]
+
+    def search(self, query: str, k: int = 20, min_match: float = 0.0) -> List[Dict]:
+        # Top-k records by BM25; each comes back with "_bm25" and "_indexed" (when it was last written). A document must
+        # contain at least ceil(min_match * distinct query terms) of the terms.
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0: return []
+        c = self._conn()
+        meta = self._meta(c)
+        n_docs = meta["docs"]
+        if n_docs <= 0: return []
+        avgdl = max(meta["tokens"] / n_docs, 1.0)
+        segs = self._segments([r[0] for r in c.execute("SELECT id FROM segments ORDER BY id")])
+        qt = np.array(terms, dtype=f"U{MAX_TERM}")
+        # df counts live postings only: replaced docs stay in their segment until a merge, but not in n_docs
+        df = np.zeros(len(terms), dtype=np.int64)
+        hits = []
+        for s in segs:
+            lo, hi = s.ranges(qt)
+            parts = [(j, int(a), int(b)) for j, (a, b) in enumerate(zip(lo, hi)) if b > a]
+            if not parts: continue
+            live = np.asarray(s.live, dtype=bool)
+            ds = [np.asarray(s.docs[a:b]) for _, a, b in parts]
+            for (j, _, _), d in zip(parts, ds):
+                df[j] += int(np.count_nonzero(live[d]))
+            hits.append((s, parts, ds, live))
+        df = np.minimum(df, n_docs)  # a writer may have killed docs since meta was read
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        need = max(1, math.ceil(min_match * len(terms)))
+        cand_s, cand_id = [], []
+        for s, parts, ds, live in hits:
+            if len(parts) < need: continue
+            d = np.concatenate(ds)
+            tf = np.concatenate([s.tf[a:b] for _, a, b in parts]).astype(np.float32)
+            w = np.repeat(idf[[j for j, _, _ in parts]].astype(np.float32) * np.float32(BM25_K1 + 1), [b - a for _, a, b in parts])
+            # per-doc length normalization, computed once per segment and gathered per posting (all float32)
+            norm = (np.float32(BM25_K1 * (1 - BM25_B)) + np.float32(BM25_K1 * BM25_B / avgdl) * s.dl.astype(np.float32))[d]
+            score = np.bincount(d, weights=w * tf / (tf + norm), minlength=len(s.ids))
+            ok = live.copy()
+            if need > 1: ok &= np.bincount(d, minlength=len(s.ids)) >= need
+            idx = np.flatnonzero(ok & (score > 0))
+            if len(idx) > k: idx = idx[np.argpartition(-score[idx], k - 1)[:k]]
+            cand_s.append(score[idx]); cand_id.append(np.asarray(s.ids)[idx])
+        if not cand_s: return []
+        sc, ids = np.concatenate(cand_s), np.concatenate(cand_id)
+        top = np.lexsort((ids, -sc))[:k]
+        rows = dict((i, (it, a)) for i, it, a in c.execute(
+            f"SELECT id, item, added FROM docs WHERE id IN ({','.join('?' * len(top))})", ids[top].tolist()))
+        out = []
+        for i in top:
+            row = rows.get(int(ids[i]))
+            if row is None: continue  # replaced since the snapshot
+            out.append(dict(json.loads(row[0]), _bm25=round(float(sc[i]), 4), _indexed=row[1]))
+        return out
+
+    def get(self, ckeys: List[str]) -> List[Dict]:
+        # Records by canonical key, in the order asked, each with "_indexed".
+        c = self._conn()
+        docs = self._old(c, list(dict.fromkeys(ckeys)))
+        ids = list(dict.fromkeys(docs[k] for k in ckeys if k in docs))
+        rows = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows.update((d, (it, a)) for d, it, a in c.execute(f"SELECT id, item, added FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return [dict(json.loads(rows[d][0]), _indexed=rows[d][1]) for d in ids if d in rows]
+
+    def stats(self) -> Dict:
+        c = self._conn()
+        meta = self._meta(c)
+        segs = c.execute("SELECT COUNT(*), COALESCE(SUM(docs), 0) FROM segments").fetchone()
+        return {"docs": meta["docs"], "tokens": meta["tokens"], "segments": segs[0], "segment_docs": segs[1]}
+
+_INDEX: Optional[EvidenceIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+def evidence_index() -> EvidenceIndex:
+    # Process-wide index under data_cache/evidence_index.
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = EvidenceIndex(cache_path("evidence_index"))
+        return _INDEX
@@ -0,0 +1,234 @@
+import os, shutil, sqlite3, threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import networkx as nx
+from .utils import cache_path
+
+COMPACT_EVERY = int(os.environ.get("GRAPH_COMPACT_EVERY", "50000"))
+
+class GraphStore:
+    # Entity graph as memory-mapped CSR arrays (base) plus a SQLite delta of recent edges; node names live in SQLite.
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._csr = None
+        self._gen = -1
+        c = self._conn()
+        c.execute("CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, name TEXT UNIQUE, kind TEXT, title TEXT, year INTEGER, source TEXT)")
+        c.execute("CREATE TABLE IF NOT EXISTS rels (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+        c.execute("CREATE TABLE IF NOT EXISTS delta (u INTEGER, v INTEGER, rel INTEGER, PRIMARY KEY (u, v)) WITHOUT ROWID")
+        c.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER)")
+        c.execute("INSERT OR IGNORE INTO meta (k, v) VALUES ('generation', 0)")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(str(self.root / "graph.sqlite"), timeout=60, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _arrays(self):
+        # Reopen the mmaps only when a compaction has published a new generation.
+        gen = self._conn().execute("SELECT v FROM meta WHERE k='generation'").fetchone()[0]
+        if gen != self._gen:
+            p = self.root / f"csr.{gen}"
+            if gen > 0 and (p / "indptr.npy").exists():
+                self._csr = tuple(np.load(p / f"{n}.npy", mmap_mode="r") for n in ("indptr", "indices", "rel"))
+            else:
+                self._csr = None
+            self._gen = gen
+        return self._csr
+
+    def _id(self, name: str) -> Optional[int]:
+        r = self._conn().execute("SELECT id FROM nodes WHERE name=?", (name,)).fetchone()
+        return r[0] if r else None
+
+    def _names(self, ids: Iterable[int]) -> Dict[int, str]:
+        ids = list(ids)
+        out: Dict[int, str] = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            q = f"SELECT id, name FROM nodes WHERE id IN ({','.join('?' * len(chunk))})"
+            out.update(self._conn().execute(q, chunk).fetchall())
+        return out
+
+    def _rel_id(self, name: str) -> int:
+        c = self._conn()
+        c.execute("INSERT OR IGNORE INTO rels (name) VALUES (?)", (name,))
+        return c.execute("SELECT id FROM rels WHERE name=?", (name,)).fetchone()[0]
+
+    def _adj(self, nid: int) -> Dict[int, int]:
+        out: Dict[int, int] = {}
+        csr = self._arrays()
+        if csr is not None and nid < len(csr[0]) - 1:
+            a, b = int(csr[0][nid]), int(csr[0][nid + 1])
+            out.update(zip(csr[1][a:b].tolist(), csr[2][a:b].tolist()))
+        out.update(self._conn().execute("SELECT v, rel FROM delta WHERE u=?", (nid,)).fetchall())
+        return out
+
+    def number_of_nodes(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        return self._id(name) is not None
+
+    def neighbors(self, name: str) -> List[str]:
+        nid = self._id(name)
+        if nid is None: return []
+        names = self._names(self._adj(nid).keys())
+        return list(names.values())
+
+    def edge_rel(self, u: str, v: str) -> Optional[str]:
+        ui, vi = self._id(u), self._id(v)
+        if ui is None or vi is None: return None
+        rid = self._adj(ui).get(vi)
+        if rid is None: return None
+        r = self._conn().execute("SELECT name FROM rels WHERE id=?", (rid,)).fetchone()
+        return r[0] if r else None
+
+    def k_hop(self, seeds: List[str], hops: int = 2) -> Dict:
+        # Same {"nodes", "edges"} shape as graphrag._neighbors_k_hops, but walks integer ids.
+        start = {i for i in (self._id(s) for s in seeds) if i is not None}
+        seen, frontier, adj = set(start), set(start), {}
+        for _ in range(hops):
+            nxt = set()
+            for u in frontier:
+                adj[u] = self._adj(u)
+                nxt.update(v for v in adj[u] if v not in seen)
+            seen |= nxt; frontier = nxt
+        for u in frontier:
+            adj[u] = self._adj(u)
+        names = self._names(seen)
+        rels = dict(self._conn().execute("SELECT id, name FROM rels").fetchall())
+        edges = [(names[u], names[v], rels.get(r, "")) for u, nb in adj.items() for v, r in nb.items() if v in seen and u < v]
+        return {"nodes": [names[i] for i in seen], "edges": edges}
+
+    def neighborhood(self, seeds: Iterable[str], hops: int = 2) -> nx.Graph:
+        # The k_hop neighbourhood of seeds as a networkx graph, for the graphrag/multihop code written against nx.Graph.
+        # Around the same seeds it answers neighbors/edges exactly as the whole graph would. Seeds the store doesn't
+        # know are added as isolated nodes, so looking them up finds nothing rather than raising.
+        g = nx.Graph()
+        if not self.number_of_nodes(): return g
+        seeds = list(dict.fromkeys(seeds))
+        sub = self.k_hop(seeds, hops)
+        g.add_nodes_from(seeds); g.add_nodes_from(sub["nodes"])
+        g.add_edges_from((u, v, {"rel": r}) for u, v, r in sub["edges"])
+        return g
+
+    def add(self, nodes: List[Tuple[str, Dict]], edges: List[Tuple[str, str, str]]) -> Tuple[int, int]:
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            before = c.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+            c.executemany("INSERT OR IGNORE INTO nodes (name, kind, title, year, source) VALUES (?,?,?,?,?)",
+                          [(n, a.get("kind"), a.get("title"), a.get("year"), a.get("source")) for n, a in nodes])
+            new_nodes = c.execute("SELECT COUNT(*) FROM nodes").fetchone()[0] - before
+            ids = self._name_ids({u for u, _, _ in edges} | {v for _, v, _ in edges})
+            rows = []
+            for u, v, rel in edges:
+                if u not in ids or v not in ids or u == v: continue
+                r = self._rel_id(rel)
+                rows += [(ids[u], ids[v], r), (ids[v], ids[u], r)]
+            csr = self._arrays()
+            if csr is not None:
+                base: Dict[int, set] = {}
+                n_base = len(csr[0]) - 1
+                rows = [x for x in rows if x[0] >= n_base or x[1] not in (base.get(x[0]) or base.setdefault(x[0], self._base_adj(x[0])))]
+            d0 = c.execute("SELECT COUNT(*) FROM delta").fetchone()[0]
+            c.executemany("INSERT OR IGNORE INTO delta (u, v, rel) VALUES (?,?,?)", rows)
+            delta = c.execute("SELECT COUNT(*) FROM delta").fetchone()[0]
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        if delta >= COMPACT_EVERY:
+            self.compact()
+        return new_nodes, (delta - d0) // 2
+
+    def _base_adj(self, nid: int):
+        csr = self._arrays()
+        a, b = int(csr[0][nid]), int(csr[0][nid + 1])
+        return set(csr[1][a:b].tolist())
+
+    def _name_ids(self, names) -> Dict[str, int]:
+        names = list(names)
+        out: Dict[str, int] = {}
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            q = f"SELECT name, id FROM nodes WHERE name IN ({','.join('?' * len(chunk))})"
+            out.update(self._conn().execute(q, chunk).fetchall())
+        return out
+
+    def add_items(self, items: List[Dict]) -> Tuple[int, int]:
+        # Same entities/edges build_entity_graph would create for these items.
+        from .graph.build_graph import extract_entities
+        nodes, edges = [], []
+        for it in items:
+            title = it.get("title", "") or ""
+            paper_id = it.get("id", "paper")
+            nodes.append((paper_id, {"kind": "paper", "title": title, "year": it.get("year"), "source": it.get("source")}))
+            for e in extract_entities(title):
+                nodes.append((e, {"kind": "entity"}))
+                edges.append((paper_id, e, "mentions"))
+        return self.add(nodes, edges)
+
+    def import_networkx(self, g) -> Tuple[int, int]:
+        nodes = [(n, dict(a)) for n, a in g.nodes(data=True)]
+        edges = [(u, v, a.get("rel", "")) for u, v, a in g.edges(data=True)]
+        return self.add(nodes, edges)
+
+    def compact(self):
+        # Fold the delta into a new CSR generation; writers are serialized by the IMMEDIATE transaction.
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            gen = c.execute("SELECT v FROM meta WHERE k='generation'").fetchone()[0]
+            n = (c.execute("SELECT MAX(id) FROM nodes").fetchone()[0] or 0) + 1
+            d = np.array(c.execute("SELECT u, v, rel FROM delta").fetchall() or np.zeros((0, 3)), dtype=np.int64).reshape(-1, 3)
+            csr = self._arrays()
+            if csr is not None:
+                indptr, indices, rel = csr
+                us = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+                base = np.stack([us, np.asarray(indices, dtype=np.int64), np.asarray(rel, dtype=np.int64)], axis=1)
+                d = np.concatenate([base, d])
+            d = d[np.lexsort((d[:, 1], d[:, 0]))]
+            keep = np.ones(len(d), dtype=bool)
+            keep[1:] = (d[1:, 0] != d[:-1, 0]) | (d[1:, 1] != d[:-1, 1])
+            d = d[keep]
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(d[:, 0], minlength=n), out=indptr[1:])
+            out = self.root / f"csr.{gen + 1}"
+            out.mkdir(parents=True, exist_ok=True)
+            np.save(out / "indptr.npy", indptr)
+            np.save(out / "indices.npy", d[:, 1].astype(np.int32))
+            np.save(out / "rel.npy", d[:, 2].astype(np.int16))
+            c.execute("DELETE FROM delta")
+            c.execute("UPDATE meta SET v=? WHERE k='generation'", (gen + 1,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        # open mmaps of the old generation stay valid after unlink
+        shutil.rmtree(self.root / f"csr.{gen}", ignore_errors=True)
+
+_STORE: Optional[GraphStore] = None
+_STORE_LOCK = threading.Lock()
+
+def graph_store() -> GraphStore:
+    # Process-wide store under data_cache/graph; an old pickled networkx graph is imported once.
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = GraphStore(cache_path("graph"))
+            if _STORE.number_of_nodes() == 0:
+                try:
+                    from .graph.build_graph import load_graph
+                    g = load_graph()
+                    if g is not None: _STORE.import_networkx(g)
+                except Exception:
+                    pass
+        return _STORE
@@ -0,0 +1,168 @@
+import os, json, time, sqlite3, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .utils import sha1, cache_path
+from .dedupe import canonical_keys, dedupe_records, merge_records, strong_ids, compatible_ids
+from .ranking import score_batch, score_version
+
+_CHUNK = 500
+
+def _fold(group: List[Dict]) -> Dict:
+    # merge_records, keeping the sources and ids of records that were themselves merged earlier.
+    out = merge_records(group)
+    ids = list(dict.fromkeys(i for r in group for i in (r.get("merged_ids") or [r.get("id")]) if i))
+    if len(ids) > 1:
+        out["sources"] = list(dict.fromkeys(s for r in group for s in (r.get("sources") or [r.get("source")]) if s))
+        out["merged_ids"] = ids
+    else:
+        out.pop("sources", None); out.pop("merged_ids", None)
+    return out
+
+class TopicStore:
+    # Tracked topics, per-source cursors and a persisted, deduplicated corpus per topic. Items are joined on the same
+    # canonical keys as dedupe_records; only items a delta touches are re-scored, and the top-k is an indexed query.
+    # Every keyword's stored scores carry the score_version they were computed under and are redone when it changes,
+    # whether or not the keyword is a registered topic.
+    def __init__(self, path: Path = None):
+        self.path = Path(path or cache_path("harvest.sqlite"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        c = self._conn()
+        c.execute("CREATE TABLE IF NOT EXISTS topics (keyword TEXT PRIMARY KEY, every_s REAL, lim INTEGER, added REAL, last_run REAL)")
+        c.execute("CREATE TABLE IF NOT EXISTS cursors (keyword TEXT, source TEXT, last_date TEXT, last_id TEXT, updated REAL, PRIMARY KEY (keyword, source)) WITHOUT ROWID")
+        c.execute("CREATE TABLE IF NOT EXISTS items (keyword TEXT, ikey TEXT, item TEXT, score REAL, first_seen REAL, updated REAL, PRIMARY KEY (keyword, ikey))")
+        c.execute("CREATE INDEX IF NOT EXISTS items_rank ON items(keyword, score DESC)")
+        c.execute("CREATE TABLE IF NOT EXISTS keys (keyword TEXT, ckey TEXT, ikey TEXT, PRIMARY KEY (keyword, ckey)) WITHOUT ROWID")
+        c.execute("CREATE TABLE IF NOT EXISTS scoring (keyword TEXT PRIMARY KEY, version TEXT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    # --- topics and cursors
+    def add_topic(self, keyword: str, every_s: float = 3600, limit: int = 50):
+        self._conn().execute("INSERT INTO topics (keyword, every_s, lim, added) VALUES (?,?,?,?) "
+                             "ON CONFLICT(keyword) DO UPDATE SET every_s=excluded.every_s, lim=excluded.lim",
+                             (keyword, every_s, limit, time.time()))
+
+    def remove_topic(self, keyword: str):
+        c = self._conn()
+        for t in ("topics", "cursors", "items", "keys", "scoring"):
+            c.execute(f"DELETE FROM {t} WHERE keyword=?", (keyword,))
+
+    def topics(self) -> List[Dict]:
+        rows = self._conn().execute("SELECT keyword, every_s, lim, last_run FROM topics ORDER BY keyword").fetchall()
+        return [{"keyword": k, "every_s": e, "limit": l, "last_run": r} for k, e, l, r in rows]
+
+    def cursor(self, keyword: str, source: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT last_date, last_id, updated FROM cursors WHERE keyword=? AND source=?", (keyword, source)).fetchone()
+        return {"last_date": row[0], "last_id": row[1], "updated": row[2]} if row else None
+
+    def set_cursor(self, keyword: str, source: str, last_date: str, last_id: Optional[str]):
+        self._conn().execute("INSERT OR REPLACE INTO cursors (keyword, source, last_date, last_id, updated) VALUES (?,?,?,?,?)",
+                             (keyword, source, last_date, last_id, time.time()))
+
+    def mark_run(self, keyword: str):
+        self._conn().execute("UPDATE topics SET last_run=? WHERE keyword=?", (time.time(), keyword))
+
+    # --- corpus
+    def size(self, keyword: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM items WHERE keyword=?", (keyword,)).fetchone()[0]
+
+    def top(self, keyword: str, k: int = 50) -> List[Dict]:
+        self.rescore_if_stale(keyword)
+        rows = self._conn().execute("SELECT item, score FROM items WHERE keyword=? ORDER BY score DESC LIMIT ?", (keyword, k))
+        return [dict(json.loads(it), _score=s) for it, s in rows]
+
+    def _owners(self, c: sqlite3.Connection, keyword: str, ckeys: List[str]) -> Dict[str, str]:
+        out = {}
+        for i in range(0, len(ckeys), _CHUNK):
+            chunk = ckeys[i:i + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            out.update(c.execute(f"SELECT ckey, ikey FROM keys WHERE keyword=? AND ckey IN ({marks})", [keyword, *chunk]))
+        return out
+
+    def _load(self, c: sqlite3.Connection, keyword: str, ikey: str) -> Optional[Dict]:
+        row = c.execute("SELECT item FROM items WHERE keyword=? AND ikey=?", (keyword, ikey)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def merge(self, keyword: str, delta: List[Dict]) -> Tuple[int, int]:
+        # Folds a delta into the corpus; returns (added, updated). Only new or changed items are scored.
+        delta = dedupe_records(delta)
+        if not delta: return 0, 0
+        # stored scores must be current before new ones are written next to them
+        self.rescore_if_stale(keyword)
+        keyed = [(x, canonical_keys(x)) for x in delta]
+        now = time.time()
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            owner = self._owners(c, keyword, list({k for _, ks in keyed for k in ks}))
+            touched: Dict[str, Dict] = {}
+            added = set()
+            for x, ks in keyed:
+                # a stored item sharing a key but carrying a different DOI/PMID/... is another paper, not an update
+                have, fold = strong_ids(ks), []
+                for ik in dict.fromkeys(owner[k] for k in ks if k in owner):
+                    o = touched.get(ik) or self._load(c, keyword, ik)
+                    if o is None or not compatible_ids(have, ids := strong_ids(canonical_keys(o, ""))): continue
+                    have = {**ids, **have}; fold.append((ik, o))
+                if not fold:
+                    ikey = next((k for k in ks if k not in owner), None) or "raw:" + sha1(json.dumps(x, sort_keys=True, default=str))
+                    touched[ikey] = x; added.add(ikey)
+                else:
+                    # one new record can bridge several stored ones (a DOI on one, the PMID on another): fold them all into the first
+                    ikey = fold[0][0]
+                    old = [o for _, o in fold]
+                    merged = _fold(old + [x])
+                    for ik, _ in fold[1:]:
+                        touched.pop(ik, None); added.discard(ik)
+                        c.execute("DELETE FROM items WHERE keyword=? AND ikey=?", (keyword, ik))
+                        c.execute("UPDATE keys SET ikey=? WHERE keyword=? AND ikey=?", (ikey, keyword, ik))
+                        for k in [k for k, v in owner.items() if v == ik]: owner[k] = ikey
+                    if len(fold) > 1 or merged != old[0]:
+                        touched[ikey] = merged
+                new_keys = [k for k in ks if k not in owner]
+                for k in new_keys: owner[k] = ikey
+                c.executemany("INSERT OR REPLACE INTO keys (keyword, ckey, ikey) VALUES (?,?,?)", ((keyword, k, ikey) for k in new_keys))
+            if touched:
+                scores = score_batch(list(touched.values())).tolist()
+                c.executemany("INSERT INTO items (keyword, ikey, item, score, first_seen, updated) VALUES (?,?,?,?,?,?) "
+                              "ON CONFLICT(keyword, ikey) DO UPDATE SET item=excluded.item, score=excluded.score, updated=excluded.updated",
+                              ((keyword, ik, json.dumps(it, ensure_ascii=False, default=str), s, now, now)
+                               for (ik, it), s in zip(touched.items(), scores)))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return len(added), len(touched) - len(added)
+
+    def rescore_if_stale(self, keyword: str) -> int:
+        # Redoes a keyword's stored scores when score_version has moved on (new calendar year, changed ranking config);
+        # returns how many items were re-scored.
+        ver = score_version()
+        c = self._conn()
+        row = c.execute("SELECT version FROM scoring WHERE keyword=?", (keyword,)).fetchone()
+        if row is not None and row[0] == ver: return 0
+        n, last = 0, ""
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute("SELECT version FROM scoring WHERE keyword=?", (keyword,)).fetchone()
+            if row is None or row[0] != ver:
+                while True:
+                    rows = c.execute("SELECT ikey, item FROM items WHERE keyword=? AND ikey>? ORDER BY ikey LIMIT 5000", (keyword, last)).fetchall()
+                    if not rows: break
+                    scores = score_batch([json.loads(it) for _, it in rows]).tolist()
+                    c.executemany("UPDATE items SET score=? WHERE keyword=? AND ikey=?", ((s, keyword, ik) for (ik, _), s in zip(rows, scores)))
+                    n += len(rows); last = rows[-1][0]
+                c.execute("INSERT OR REPLACE INTO scoring (keyword, version) VALUES (?,?)", (keyword, ver))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return n
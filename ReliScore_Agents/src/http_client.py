@@ -0,0 +1,208 @@
+import os, time, json, random, base64, threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+from .utils import HTTP_TIMEOUT, sha1
+from .cache import get_store
+from .tracing import count
+
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.5"))
+HTTP_CACHE_TTL = int(os.environ.get("HTTP_CACHE_TTL", "86400"))
+HTTP_NEG_TTL = int(os.environ.get("HTTP_NEG_TTL", "300"))
+HTTP_CACHE = os.environ.get("HTTP_CACHE", "1") != "0"
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "8"))
+# Offline runs: send every request to a local replay stub as <stub>/<host>/<path> (see benchmarks/stub_server.py).
+HTTP_STUB_URL = os.environ.get("HTTP_STUB_URL", "").rstrip("/")
+
+# requests/second and burst per host; NCBI allows 3 rps without an API key.
+HOST_RATES = {
+    "eutils.ncbi.nlm.nih.gov": (3.0, 3),
+    "www.ncbi.nlm.nih.gov": (3.0, 3),
+    "www.ebi.ac.uk": (10.0, 10),
+    "api.crossref.org": (10.0, 10),
+    "clinicaltrials.gov": (5.0, 5),
+    "api.fda.gov": (4.0, 4),
+    "api.unpaywall.org": (10.0, 10),
+}
+DEFAULT_RATE = (5.0, 5)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEADLINE_ERR = "deadline exceeded"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate, self.burst = rate, float(burst)
+        self.tokens, self.ts = float(burst), time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_s = (1.0 - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+_DEADLINE = threading.local()
+
+@contextmanager
+def deadline(at: Optional[float]):
+    # Requests this thread makes inside the block end by `at` (time.monotonic()): each attempt's timeout is capped by
+    # the time left and no retry starts after it. Nested blocks keep the earlier deadline.
+    prev = getattr(_DEADLINE, "at", None)
+    _DEADLINE.at = at if prev is None or at is None else min(prev, at)
+    try:
+        yield
+    finally:
+        _DEADLINE.at = prev
+
+def _time_left() -> Optional[float]:
+    at = getattr(_DEADLINE, "at", None)
+    return None if at is None else at - time.monotonic()
+
+_SESSIONS: Dict[str, requests.Session] = {}
+_BUCKETS: Dict[str, TokenBucket] = {}
+_LOCK = threading.Lock()
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+def session_for(host: str) -> requests.Session:
+    with _LOCK:
+        s = _SESSIONS.get(host)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter); s.mount("http://", adapter)
+            _SESSIONS[host] = s
+        return s
+
+def bucket_for(host: str) -> TokenBucket:
+    with _LOCK:
+        b = _BUCKETS.get(host)
+        if b is None:
+            b = _BUCKETS[host] = TokenBucket(*HOST_RATES.get(host, DEFAULT_RATE))
+        return b
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    return sha1(url + "?" + json.dumps(params or {}, sort_keys=True, default=str))
+
+def _store():
+    return get_store("http", max_bytes=HTTP_CACHE_MAX_BYTES, mem_items=256)
+
+def _load_entry(key: str) -> Optional[Dict]:
+    try:
+        return _store().get(key)
+    except Exception:
+        return None
+
+def _store_entry(key: str, entry: Dict):
+    try:
+        _store().set(key, entry, ttl=None)
+    except Exception as e:
+        logger.debug(f"[http] cache write failed for {key}: {e}")
+
+def _to_entry(res: requests.Response) -> Dict:
+    keep = {k: res.headers[k] for k in ("Content-Type", "ETag", "Last-Modified") if k in res.headers}
+    return {"url": res.url, "status": res.status_code, "headers": keep,
+            "content": base64.b64encode(res.content).decode("ascii"), "fetched": time.time(), "error": None}
+
+def _from_entry(entry: Dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = entry.get("status", 200)
+    res.url = entry.get("url", "")
+    res.headers.update(entry.get("headers") or {})
+    res._content = base64.b64decode(entry.get("content") or "")
+    res.encoding = requests.utils.get_encoding_from_headers(res.headers) or "utf-8"
+    res.reason = "OK (cached)"
+    return res
+
+def _retry_after(res: Optional[requests.Response], attempt: int) -> float:
+    ra = res.headers.get("Retry-After") if res is not None else None
+    if ra and ra.isdigit():
+        return min(float(ra), 30.0)
+    return random.uniform(0, HTTP_BACKOFF * (2 ** attempt))
+
+def _target(url: str) -> str:
+    if not HTTP_STUB_URL: return url
+    u = urlsplit(url)
+    return f"{HTTP_STUB_URL}/{u.netloc}{u.path}" + (f"?{u.query}" if u.query else "")
+
+def _fetch(url: str, params, headers) -> Tuple[Optional[requests.Response], Optional[str]]:
+    host = _host(url)
+    target = _target(url)
+    # rate limits stay keyed on the real host even when a stub answers
+    s, bucket = session_for(_host(target)), bucket_for(host)
+    err = None
+    for attempt in range(HTTP_RETRIES + 1):
+        bucket.acquire()
+        left = _time_left()
+        if left is not None and left <= 0:
+            return None, f"{DEADLINE_ERR} for {url}" + (f" ({err})" if err else "")
+        res = None
+        try:
+            res = s.get(target, params=params, headers=headers, timeout=HTTP_TIMEOUT if left is None else min(HTTP_TIMEOUT, left))
+            if res.status_code in (200, 304):
+                return res, None
+            err = f"HTTP {res.status_code} for {url}"
+            if res.status_code not in RETRY_STATUS:
+                return None, err
+        except (requests.ConnectionError, requests.Timeout) as e:
+            err = str(e)
+        except Exception as e:
+            return None, str(e)
+        if attempt < HTTP_RETRIES:
+            pause = _retry_after(res, attempt)
+            left = _time_left()
+            if left is not None and left <= pause:
+                return None, f"{DEADLINE_ERR} for {url} ({err})"
+            time.sleep(pause)
+    return None, err
+
+def get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[requests.Response], Optional[str]]:
+    if not HTTP_CACHE:
+        return _fetch(url, params, headers)
+    key = cache_key(url, params)
+    entry = _load_entry(key)
+    now = time.time()
+    if entry:
+        age = now - entry.get("fetched", 0)
+        if entry.get("error"):
+            if age < HTTP_NEG_TTL:
+                count("http.cache_neg_hits")
+                return None, entry["error"]
+        elif age < HTTP_CACHE_TTL:
+            count("http.cache_hits")
+            return _from_entry(entry), None
+    count("http.cache_misses")
+    hdrs = dict(headers or {})
+    if entry and not entry.get("error"):
+        v = entry.get("headers") or {}
+        if v.get("ETag"): hdrs["If-None-Match"] = v["ETag"]
+        if v.get("Last-Modified"): hdrs["If-Modified-Since"] = v["Last-Modified"]
+    res, err = _fetch(url, params, hdrs)
+    if res is not None and res.status_code == 304 and entry and not entry.get("error"):
+        count("http.revalidated")
+        entry["fetched"] = now
+        _store_entry(key, entry)
+        return _from_entry(entry), None
+    if res is not None and res.status_code == 200:
+        _store_entry(key, _to_entry(res))
+        return res, None
+    if entry and not entry.get("error"):
+        logger.debug(f"[http] serving stale cache for {url}: {err}")
+        count("http.stale_served")
+        return _from_entry(entry), None
+    err = err or f"HTTP {res.status_code if res is not None else '?'} for {url}"
+    # running out of the caller's time says nothing about the URL, so it is not cached as a failure
+    if not err.startswith(DEADLINE_ERR):
+        _store_entry(key, {"url": url, "fetched": now, "error": err})
+    return None, err
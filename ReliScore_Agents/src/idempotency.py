@@ -0,0 +1,100 @@
+import os, sqlite3, threading
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+_CHUNK = 500
+
+class IdempotencyIndex:
+    # Persistent set of processed keys; INSERT under an IMMEDIATE transaction makes check-and-mark atomic across processes.
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        c = self._conn()
+        c.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        c.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA cache_size=-65536")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def __contains__(self, key: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM seen WHERE key=?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def check_and_mark(self, key: str) -> bool:
+        return self._conn().execute("INSERT OR IGNORE INTO seen (key) VALUES (?)", (key,)).rowcount == 1
+
+    def _mark(self, c: sqlite3.Connection, keys: List[str]) -> List[bool]:
+        # Inside the caller's transaction.
+        out: List[bool] = []
+        for i in range(0, len(keys), _CHUNK):
+            chunk = keys[i:i + _CHUNK]
+            uniq = list(dict.fromkeys(chunk))
+            marks = ",".join("?" * len(uniq))
+            existing = {r[0] for r in c.execute(f"SELECT key FROM seen WHERE key IN ({marks})", uniq)}
+            fresh = [k for k in uniq if k not in existing]
+            c.executemany("INSERT INTO seen (key) VALUES (?)", ((k,) for k in fresh))
+            fresh = set(fresh)
+            for k in chunk:
+                out.append(k in fresh)
+                fresh.discard(k)
+        return out
+
+    def check_and_mark_many(self, keys: Iterable[str]) -> List[bool]:
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            out = self._mark(c, list(keys))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return out
+
+    def import_lines(self, path: Path) -> int:
+        with path.open("r", encoding="utf-8") as f:
+            return sum(self.check_and_mark_many(line.strip() for line in f if line.strip()))
+
+    def migrate_once(self, path: Path) -> int:
+        # Imports a legacy one-key-per-line log exactly once. The import and the "migrated" flag share one IMMEDIATE
+        # transaction: another process opening the index meanwhile waits for it instead of answering from a half-filled
+        # table, and a crash mid-import rolls back, so the next opener runs it again.
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            if c.execute("SELECT 1 FROM meta WHERE k='migrated'").fetchone():
+                c.execute("ROLLBACK"); return 0
+            n = 0
+            if path.exists():
+                with path.open("r", encoding="utf-8") as f:
+                    n = sum(self._mark(c, [line.strip() for line in f if line.strip()]))
+            c.execute("INSERT INTO meta (k, v) VALUES ('migrated', ?)", (str(path),))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return n
+
+_INDEXES: Dict[str, IdempotencyIndex] = {}
+_LOCK = threading.Lock()
+
+def index_for(log_path: Path) -> IdempotencyIndex:
+    # One index per legacy log path; an existing plain-text log is imported into it once, by whichever process gets there first.
+    log_path = Path(log_path)
+    key = str(log_path.resolve())
+    with _LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            idx = IdempotencyIndex(log_path.with_name(log_path.name + ".idx.sqlite"))
+            idx.migrate_once(log_path)
+            _INDEXES[key] = idx
+        return idx
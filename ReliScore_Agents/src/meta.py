@@ -0,0 +1,142 @@
+import os, math
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .study_points import as_table
+
+Z95 = 1.959963984540054
+# Random-effects leave-one-out re-estimates tau² per omitted study, so it is O(k²): a few ms at this size, seconds at
+# tens of thousands. Larger pools report no "loo" unless the caller raises the cap.
+META_LOO_MAX = int(os.environ.get("META_LOO_MAX", "2000"))
+_LOO_BLOCK = 1 << 22  # matrix cells per block (~32 MB of float64)
+
+def log_se(value, ci_low, ci_high, z: float = Z95):
+    # Ratio measures (RR/OR/HR) and their 95% CI -> (log effect, SE of log effect); NaN where the CI is missing or unusable.
+    value, lo, hi = (np.asarray(a, dtype=np.float64) for a in (value, ci_low, ci_high))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.where(value > 0, np.log(value), np.nan)
+        se = (np.log(hi) - np.log(lo)) / (2 * z)
+    se[~((lo > 0) & (hi > lo) & np.isfinite(se))] = np.nan
+    return y, se
+
+def median_log_effect(values) -> float:
+    # Upper median of log(value) over positive values; 0.0 when there are none.
+    v = np.asarray(values, dtype=np.float64)
+    v = v[v > 0]  # also drops NaN
+    if not len(v): return 0.0
+    return float(np.partition(np.log(v), len(v) // 2)[len(v) // 2])
+
+class MetaPool:
+    # Inverse-variance pooling with incremental updates. Weighted mean and Q are merged batch by batch (Chan et al.),
+    # so add() costs O(batch); the DerSimonian-Laird estimate then needs one vectorized pass over the stored variances.
+    def __init__(self, capacity: int = 64):
+        self._y = np.empty(capacity); self._v = np.empty(capacity)
+        self.k = 0
+        self.sw = self.sww = self.mean = self.q = 0.0
+
+    def add(self, y, se) -> "MetaPool":
+        y, se = np.atleast_1d(np.asarray(y, dtype=np.float64)), np.atleast_1d(np.asarray(se, dtype=np.float64))
+        ok = np.isfinite(y) & np.isfinite(se) & (se > 0)
+        y, v = y[ok], se[ok] ** 2
+        n = len(y)
+        if not n: return self
+        if self.k + n > len(self._y):
+            cap = max(2 * len(self._y), self.k + n)
+            self._y = np.resize(self._y, cap); self._v = np.resize(self._v, cap)
+        self._y[self.k:self.k + n], self._v[self.k:self.k + n] = y, v
+        w = 1.0 / v
+        sw_b = float(w.sum())
+        mean_b = float(w @ y) / sw_b
+        q_b = float(w @ (y - mean_b) ** 2)
+        sw = self.sw + sw_b
+        delta = mean_b - self.mean
+        self.q += q_b + delta * delta * self.sw * sw_b / sw
+        self.mean += delta * sw_b / sw
+        self.sw, self.sww, self.k = sw, self.sww + float(w @ w), self.k + n
+        return self
+
+    def add_studies(self, studies) -> "MetaPool":
+        t = as_table(studies)
+        return self.add(*log_se(t.effect_value, t.ci_low, t.ci_high))
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:self.k]
+
+    @property
+    def v(self) -> np.ndarray:
+        return self._v[:self.k]
+
+    def tau2(self) -> float:
+        if self.k < 2: return 0.0
+        c = self.sw - self.sww / self.sw
+        return max(0.0, (self.q - (self.k - 1)) / c) if c > 0 else 0.0
+
+    def heterogeneity(self) -> Dict:
+        df = self.k - 1
+        return {"q": self.q, "df": df, "tau2": self.tau2(),
+                "i2": max(0.0, (self.q - df) / self.q) if df > 0 and self.q > 0 else 0.0}
+
+    @staticmethod
+    def _est(mu: float, se: float) -> Dict:
+        return {"log": mu, "se": se, "ratio": math.exp(mu),
+                "ci_low": math.exp(mu - Z95 * se), "ci_high": math.exp(mu + Z95 * se)}
+
+    def fixed(self) -> Optional[Dict]:
+        if not self.k: return None
+        return self._est(self.mean, math.sqrt(1.0 / self.sw))
+
+    def random(self) -> Optional[Dict]:
+        if not self.k: return None
+        t2 = self.tau2()
+        if t2 == 0.0: return dict(self._est(self.mean, math.sqrt(1.0 / self.sw)), tau2=0.0)
+        w = 1.0 / (self.v + t2)
+        sw = float(w.sum())
+        return dict(self._est(float(w @ self.y) / sw, math.sqrt(1.0 / sw)), tau2=t2)
+
+    def leave_one_out(self) -> Dict[str, np.ndarray]:
+        # Pooled log effect with each study left out: fixed-effect by downdating the sums in O(k), DerSimonian-Laird by
+        # re-weighting with each omission's own tau² (block-wise O(k²)).
+        k = self.k
+        if k < 2: return {"fixed": np.full(k, np.nan), "random": np.full(k, np.nan), "tau2": np.zeros(k)}
+        y, v = self.y, self.v
+        w = 1.0 / v
+        sw_i = self.sw - w
+        fixed = (self.mean * self.sw - w * y) / sw_i
+        q_i = np.maximum(0.0, self.q - w * (y - self.mean) ** 2 * self.sw / sw_i)
+        c_i = sw_i - (self.sww - w * w) / sw_i
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t2 = np.where(c_i > 0, np.maximum(0.0, (q_i - (k - 2)) / c_i), 0.0)
+        rand = np.empty(k)
+        rows = max(1, _LOO_BLOCK // k)
+        for s in range(0, k, rows):
+            ww = 1.0 / (v[None, :] + t2[s:s + rows, None])
+            idx = np.arange(s, min(k, s + rows))
+            ww[idx - s, idx] = 0.0
+            rand[s:s + rows] = (ww @ y) / ww.sum(axis=1)
+        return {"fixed": fixed, "random": rand, "tau2": t2}
+
+    def summary(self, loo: bool = True, ids: Optional[Sequence] = None, loo_max: int = META_LOO_MAX) -> Dict:
+        out = {"k": self.k, "fixed": self.fixed(), "random": self.random(), **self.heterogeneity()}
+        if loo and 2 < self.k <= loo_max:
+            r = np.exp(self.leave_one_out()["random"])
+            base = out["random"]["ratio"]
+            i = int(np.argmax(np.abs(np.log(r / base))))
+            out["loo"] = {"min": float(r.min()), "max": float(r.max()), "most_influential": ids[i] if ids is not None else i,
+                          "crosses_null": bool(np.any((r < 1.0) != (base < 1.0)))}
+        return out
+
+def pooled_effect(studies: List[Dict]) -> Dict:
+    # DerSimonian-Laird random-effects pool over study points whose effect has a usable 95% CI. Without any CI to
+    # weight by, falls back to the geometric mean of the reported ratios.
+    t = as_table(studies)
+    val = t.effect_value
+    n = int(np.count_nonzero(~np.isnan(val)))
+    pos = val[val > 0]
+    if not len(pos): return {"pooled": None, "n": 0}
+    y, se = log_se(val, t.ci_low, t.ci_high)
+    ok = np.flatnonzero(np.isfinite(y) & np.isfinite(se) & (se > 0))
+    if not len(ok):
+        return {"pooled": math.exp(float(np.log(pos).mean())), "n": n, "method": "geometric_mean"}
+    mp = MetaPool(len(ok)).add(y[ok], se[ok])
+    s = mp.summary(ids=[t.ids[i] for i in ok.tolist()])
+    return {"pooled": s["random"]["ratio"], "n": n, "method": "dersimonian_laird", **s}
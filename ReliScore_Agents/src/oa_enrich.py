@@ -0,0 +1,186 @@
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor, wait, TimeoutError as FuturesTimeout
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from .utils import get
+from .cache import get_store
+from .dedupe import canonical_keys
+from .tracing import count
+
+OA_POS_TTL = float(os.environ.get("OA_POS_TTL", str(30 * 86400)))
+OA_NEG_TTL = float(os.environ.get("OA_NEG_TTL", str(86400)))
+OA_WORKERS = int(os.environ.get("OA_WORKERS", "8"))
+# Lookups still running at this point are left behind; they finish in the background and land in the cache.
+OA_DEADLINE_S = float(os.environ.get("OA_DEADLINE_S", "5"))
+UNPAYWALL = "https://api.unpaywall.org/v2/"
+IDCONV = "https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/"
+IDCONV_BATCH = 200
+PMC_ARTICLE = "https://www.ncbi.nlm.nih.gov/pmc/articles/{}/"
+_POOL = ThreadPoolExecutor(max_workers=OA_WORKERS, thread_name_prefix="reli-oa")
+_INFLIGHT: Dict[str, object] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def _store():
+    return get_store("oa", mem_items=4096)
+
+def _ids(item: Dict) -> Tuple[str, str, str]:
+    doi = pmid = pmcid = ""
+    for k in canonical_keys(item, ""):
+        kind, _, v = k.partition(":")
+        if kind == "doi" and not doi: doi = v
+        elif kind == "pmid" and not pmid: pmid = v
+        elif kind == "pmcid" and not pmcid: pmcid = v
+    return doi, pmid, pmcid
+
+def _remember(key: str, url: Optional[str]):
+    try:
+        _store().set(key, {"url": url}, ttl=OA_POS_TTL if url else OA_NEG_TTL)
+    except Exception as e:
+        logger.debug(f"[oa] cache write failed for {key}: {e}")
+
+def _cached(keys: Iterable[str]) -> Dict[str, Optional[str]]:
+    out = {}
+    for k in keys:
+        try:
+            hit = _store().get(k)
+        except Exception:
+            hit = None
+        if hit is not None: out[k] = hit.get("url")
+    return out
+
+def _idconv(pmids: List[str]) -> Dict[str, Dict]:
+    # NCBI ID converter: up to 200 PMIDs per request -> {pmid: {"pmcid", "doi"}}; unknown PMIDs come back without a pmcid.
+    email = (os.environ.get("NCBI_EMAIL") or os.environ.get("UNPAYWALL_EMAIL", "")).strip()
+    params = {"ids": ",".join(pmids), "format": "json", "tool": "reliscore"}
+    if email: params["email"] = email
+    res, err = get(IDCONV, params=params)
+    if err or not res: raise RuntimeError(err or "idconv: no response")
+    out = {}
+    for r in (res.json() or {}).get("records") or []:
+        if isinstance(r, dict) and r.get("pmid"):
+            out[str(r["pmid"])] = {"pmcid": (r.get("pmcid") or "").upper(), "doi": (r.get("doi") or "").lower()}
+    return out
+
+def _best_oa_url(data: Dict) -> Optional[str]:
+    # Unpaywall's best_oa_location, else the first oa_location with a link; the PDF link is preferred over the landing page.
+    if not isinstance(data, dict): return None
+    best = data.get("best_oa_location")
+    if isinstance(best, dict):
+        return best.get("url_for_pdf") or best.get("url")
+    for loc in data.get("oa_locations") or []:
+        if isinstance(loc, dict) and (loc.get("url_for_pdf") or loc.get("url")):
+            return loc.get("url_for_pdf") or loc.get("url")
+    return None
+
+def _unpaywall(doi: str) -> Optional[str]:
+    # Unpaywall has no batch endpoint; one GET per DOI, run concurrently on _POOL.
+    email = os.environ.get("UNPAYWALL_EMAIL", "").strip()
+    res, err = get(f"{UNPAYWALL}{doi}", params={"email": email})
+    if err and err.startswith("HTTP 404"):
+        return None  # Unpaywall doesn't know the DOI: a real negative
+    if err or not res: raise RuntimeError(err or "unpaywall: no response")
+    return _best_oa_url(res.json() or {})
+
+def _submit(key: str, fn, *args):
+    # One in-flight lookup per key across concurrent claims and sources.
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        if fut is None:
+            def run():
+                try:
+                    url = fn(*args)
+                    _remember(key, url)
+                    return url
+                finally:
+                    with _INFLIGHT_LOCK: _INFLIGHT.pop(key, None)
+            fut = _INFLIGHT[key] = _POOL.submit(run)
+            count("oa.lookups")
+        else:
+            count("oa.coalesced")
+        return fut
+
+def _resolve_pmids(pmids: List[str]) -> Dict[str, Tuple[Optional[str], str]]:
+    # pmid -> (PMC url or None, doi); the PMC copy is free to read, otherwise the DOI goes on to Unpaywall.
+    out = {}
+    for i in range(0, len(pmids), IDCONV_BATCH):
+        chunk = pmids[i:i + IDCONV_BATCH]
+        try:
+            recs = _idconv(chunk)
+        except Exception as e:
+            logger.debug(f"[oa] idconv failed for {len(chunk)} PMIDs: {e}")
+            continue
+        count("oa.batch_lookups")
+        for p in chunk:
+            r = recs.get(p) or {}
+            out[p] = (PMC_ARTICLE.format(r["pmcid"]) if r.get("pmcid") else None, r.get("doi", ""))
+    return out
+
+def _pmid_lookup(pmids: List[str]) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+    # ({"pmid:..": PMC url or None}, {"pmid:..": "doi:.."} still to ask Unpaywall); answers are cached as they come, so a
+    # lookup the caller stopped waiting for still pays off for the next claim.
+    found: Dict[str, Optional[str]] = {}
+    doi_of: Dict[str, str] = {}
+    for p, (url, doi) in _resolve_pmids(pmids).items():
+        if url:
+            found[f"pmid:{p}"] = url; _remember(f"pmid:{p}", url)
+        elif doi:
+            doi_of[f"pmid:{p}"] = f"doi:{doi}"
+        else:
+            found[f"pmid:{p}"] = None; _remember(f"pmid:{p}", None)
+    # a PMID whose DOI we just learned may already be cached under the DOI
+    for pk, dk in list(doi_of.items()):
+        hit = _cached([dk])
+        if dk in hit:
+            found[pk] = hit[dk]; _remember(pk, hit[dk]); del doi_of[pk]
+    return found, doi_of
+
+def enrich_batch(items: List[Dict], deadline_s: float = OA_DEADLINE_S) -> List[Dict]:
+    # Sets oa_url in place on items that lack one. Identifiers are deduplicated across the batch, answered from the
+    # DOI/PMID cache (positive and negative), then PMIDs go through the batch ID converter and DOIs to Unpaywall. Returns
+    # within deadline_s: whatever hasn't resolved by then is left as it was.
+    todo: Dict[str, List[Dict]] = {}
+    for it in items:
+        if (it.get("oa_url") or "").strip(): continue
+        try:
+            doi, pmid, pmcid = _ids(it)
+        except Exception:
+            continue
+        if pmcid:
+            it["oa_url"] = PMC_ARTICLE.format(pmcid); continue
+        key = f"doi:{doi}" if doi else f"pmid:{pmid}" if pmid else None
+        if key: todo.setdefault(key, []).append(it)
+    if not todo: return items
+    t_end = time.monotonic() + deadline_s
+    found = _cached(todo)
+    count("oa.cache_hits", len(found))
+    need = [k for k in todo if k not in found]
+    if need:
+        pmids = [k[5:] for k in need if k.startswith("pmid:")]
+        doi_of: Dict[str, str] = {}
+        if pmids:
+            fut = _POOL.submit(_pmid_lookup, pmids)
+            try:
+                got, doi_of = fut.result(timeout=max(0.0, t_end - time.monotonic()))
+                found.update(got)
+            except FuturesTimeout:
+                count("oa.late")
+            except Exception as e:
+                logger.debug(f"[oa] PMID lookup failed: {e}")
+        dois = {k for k in need if k.startswith("doi:")} | set(doi_of.values())
+        if dois and os.environ.get("UNPAYWALL_EMAIL", "").strip() and time.monotonic() < t_end:
+            futs = {k: _submit(k, _unpaywall, k[4:]) for k in dois}
+            wait(list(futs.values()), timeout=max(0.0, t_end - time.monotonic()))
+            for k, fut in futs.items():
+                if not fut.done() or fut.exception() is not None: continue
+                found[k] = fut.result()
+            for pk, dk in doi_of.items():
+                if dk in found:
+                    found[pk] = found[dk]; _remember(pk, found[dk])
+    for k, its in todo.items():
+        url = found.get(k)
+        if url:
+            for it in its: it["oa_url"] = url
+    return items
+
+def enrich_oa(item: Dict) -> Dict:
+    return enrich_batch([item])[0]
@@ -1,5 +1,6 @@
-from typing import Dict, List, Tuple
-from statistics import mean
+import os, time
+from typing import Callable, Dict, Iterator, List, Tuple
+from loguru import logger
 from .safety import sanitize_claim, safety_checks
 from .nlp.claim_detect import classify_intent, query_terms
 from .nlp.normalize import normalize_title
@@ -9,31 +10,38 @@ from .sources.crossref import search_crossref
 from .sources.preprints import search_preprints
 from .sources.ctgov import search_ctgov
 from .sources.fda import search_fda_oncology
-from .sources.fulltext import enrich_oa
 from .extract.effects import extract_effects, infer_direction
-from .aggregate.prevention import pooled_effect
 from .reasoner.verdict import decide_verdict
-from .ranking import rank_items
-from .graph.build_graph import build_entity_graph, persist_graph, load_graph
+from .ranking import rank_items, merge_ranked
+from .retrieval import fan_out_iter
+from .dedupe import dedupe_records, canonical_keys
+from .oa_enrich import enrich_batch, OA_DEADLINE_S
+from .study_points import as_table
+from .meta import MetaPool, pooled_effect
+from .graph_store import graph_store
 from .graph.graphrag import graphrag_retrieve
+from .graph.build_graph import ENTITY_PAT
 from .multihop.router import route as route_hops
 from .multihop.qa import run_multihop
 from .config import load_run_config
+from .tracing import new_trace
+from .claim_cache import CLAIM_CACHE, claim_cache
+from .evidence_index import evidence_index
+from .vector_store import VECTORS, RELEVANCE, VCFG, vector_store, annotate_relevance
 
 CFG = load_run_config()
+ICFG = CFG.get("evidence_index", {})
+EVIDENCE_INDEX = os.environ.get("EVIDENCE_INDEX", "1") != "0"
+ENRICH_MARGIN_S = 0.25  # left between enrichment giving up and the retrieval deadline, for handing the batch back
 
-def _counts(items: List[Dict]) -> Tuple[int,int,int]:
-    s = sum(1 for x in items if (x.get("direction") or "").lower()=="supports")
-    r = sum(1 for x in items if (x.get("direction") or "").lower()=="refutes")
-    u = len(items) - s - r
-    return s, r, max(0,u)
+def _counts(items) -> Tuple[int,int,int]:
+    return as_table(items).counts()
 
-def _year_span(items: List[Dict]):
-    years = [y for y in (x.get("year") for x in items) if isinstance(y,int)]
-    return (min(years), max(years)) if years else (None, None)
+def _year_span(items):
+    return as_table(items).year_span()
 
-def _avg_score(items: List[Dict]) -> float:
-    return round(mean([x.get("_score",0) for x in items]) if items else 0.0, 2)
+def _avg_score(items) -> float:
+    return round(as_table(items).avg_score(), 2)
 
 def emit_study_points(items: List[Dict]) -> List[Dict]:
     out = []
@@ -51,32 +59,14 @@ def aggregate(items: List[Dict], intent: str) -> Dict:
         agg["prevention"] = pooled_effect(items)
     return agg
 
-def _top_effect_snippets(items: List[Dict], k: int = 5):
-    picks = []
-    for it in items:
-        e = it.get("effect")
-        if isinstance(e, dict) and e.get("value"):
-            s = {
-                "title": (it.get("title") or "")[:180],
-                "year": it.get("year"),
-                "metric": e.get("metric"),
-                "value": e.get("value"),
-                "ci_low": e.get("ci_low"),
-                "ci_high": e.get("ci_high"),
-                "direction": it.get("direction"),
-                "source": it.get("source"),
-                "id": it.get("id"),
-                "oa_url": it.get("oa_url"),
-                "_score": it.get("_score",0),
-            }
-            picks.append(s)
-    picks.sort(key=lambda z: z.get("_score",0), reverse=True)
-    return picks[:k]
+def _top_effect_snippets(items, k: int = 5):
+    return as_table(items).top_effects(k)
 
 def build_narrative_facts(claim: str, intent: str, ranked_items: List[Dict], verdict: Dict, aggregates: Dict, hop_trace=None) -> Dict:
-    s, r, u = _counts(ranked_items)
-    y0, y1 = _year_span(ranked_items)
-    avg = _avg_score(ranked_items)
+    table = as_table(ranked_items)
+    s, r, u = _counts(table)
+    y0, y1 = _year_span(table)
+    avg = _avg_score(table)
     pooled = (aggregates or {}).get("prevention", {}).get("pooled")
     facts = {
         "claim": claim,
@@ -86,71 +76,199 @@ def build_narrative_facts(claim: str, intent: str, ranked_items: List[Dict], ver
         "years": {"earliest": y0, "latest": y1},
         "avg_score": avg,
         "pooled_effect": pooled,
-        "top_effects": _top_effect_snippets(ranked_items, k=6),
+        "top_effects": _top_effect_snippets(table, k=6),
         "top_titles": [(it.get("year"), (it.get("title") or "")[:180]) for it in ranked_items[:8]],
         "hop_trace": hop_trace or [],
     }
     return facts
 
-def _retrieve_corpus(intent: str, q: dict) -> List[Dict]:
-    pools: List[Dict] = []
+def _retrieval_tasks(intent: str, q: dict) -> List[Tuple[str, Callable[[], List[Dict]]]]:
+    tasks = []
     if intent == "meta_news":
-        pools += search_fda_oncology(q.get("fda",""), n=25)
-    pools += search_pubmed(q.get("pubmed",""), n=20)
-    pools += search_eupmc(q.get("eupmc",""), n=20)
-    pools += search_crossref(q.get("crossref",""), n=10)
-    pools += search_preprints(q.get("preprint",""), n=8)
-    pools += search_ctgov(q.get("ctgov",""), n=8)
-    items = [enrich_oa(x) for x in pools]
-    return items
-
-def process_claim(claim_raw: str) -> Dict:
-    claim = sanitize_claim(claim_raw)
-    sflags = safety_checks(claim)
-    intent = classify_intent(claim)
-    q = query_terms(claim, intent)
-    # Step 1: retrieve
-    corpus = _retrieve_corpus(intent, q)
-    # Step 2: effects + directions
-    study_points = emit_study_points(corpus)
-    ranked = rank_items(study_points)
-    # Build/Load Graph for Graph-RAG
-    g = load_graph()
-    if g is None:
+        tasks.append(("fda", lambda: search_fda_oncology(q.get("fda",""), n=25)))
+    tasks += [
+        ("pubmed", lambda: search_pubmed(q.get("pubmed",""), n=20)),
+        ("eupmc", lambda: search_eupmc(q.get("eupmc",""), n=20)),
+        ("crossref", lambda: search_crossref(q.get("crossref",""), n=10)),
+        ("preprint", lambda: search_preprints(q.get("preprint",""), n=8)),
+        ("ctgov", lambda: search_ctgov(q.get("ctgov",""), n=8)),
+    ]
+    return tasks
+
+def _enriched(fetch: Callable[[], List[Dict]], until: float, enrich: Callable[..., List[Dict]] = enrich_batch) -> Callable[[], List[Dict]]:
+    # OA enrichment runs in the source's own worker as soon as that source returns, overlapping the slower sources. It is
+    # best effort: it only gets the time left before the retrieval deadline (`until`, monotonic), and when that is gone
+    # or it fails the items go on as fetched rather than the whole source being reported as timed out.
+    def run() -> List[Dict]:
+        items = fetch()
+        left = until - ENRICH_MARGIN_S - time.monotonic()
+        if not items or left <= 0: return items
         try:
-            g = build_entity_graph(ranked)
-            persist_graph(g)
-        except Exception:
-            g = None
+            return enrich(items, deadline_s=min(OA_DEADLINE_S, left))
+        except Exception as e:
+            logger.debug(f"[pipeline] OA enrichment failed: {type(e).__name__}: {e}")
+            return items
+    return run
+
+def _deadline() -> Tuple[float, float]:
+    # (retrieval deadline in seconds, the same as a monotonic time) for one fan-out
+    d = float(CFG.get("retrieval", {}).get("deadline_s", 10))
+    return d, time.monotonic() + d
+
+def _local_hits(claim: str, q: dict) -> Tuple[List[Dict], bool]:
+    # Evidence already in the local index (BM25, plus nearest neighbours by embedding), and whether enough of the BM25
+    # hits are fresh to skip the remote sources altogether.
+    if not EVIDENCE_INDEX: return [], False
+    query = q.get("eupmc") or claim
+    try:
+        hits = evidence_index().search(query, k=ICFG.get("k", 40), min_match=ICFG.get("min_match", 0.5))
+    except Exception as e:
+        logger.warning(f"[pipeline] local index search failed: {type(e).__name__}: {e}")
+        return [], False
+    cutoff = time.time() - ICFG.get("fresh_s", 7 * 86400)
+    enough = sum(1 for x in hits if (x.get("_indexed") or 0) >= cutoff) >= ICFG.get("enough", 20)
+    if VECTORS:
+        try:
+            near = vector_store().neighbors(query, k=VCFG.get("ann_k", 20))
+            seen = {k for x in hits for k in canonical_keys(x)}
+            hits += [x for x in evidence_index().get([ref for ref, _ in near if ref not in seen]) if not seen.intersection(canonical_keys(x))]
+        except Exception as e:
+            logger.warning(f"[pipeline] nearest-neighbour search failed: {type(e).__name__}: {e}")
+    return hits, enough
+
+def _index(items: List[Dict]):
+    if EVIDENCE_INDEX and items: evidence_index().add(items)
+    if VECTORS and items: vector_store().add_items(items)
+
+def _graph_items(mh: Dict) -> List[Dict]:
+    # graph spans become pseudo-items (for visibility)
+    extra = []
+    for sp in (mh.get("graph_snippets") or [])[:5]:
+        extra.append({
+            "id": sp.get("source_id","graph"),
+            "source": "GraphRAG",
+            "title": sp.get("title",""),
+            "year": sp.get("year"),
+            "tier": "case_series",
+            "applicability": 0.7,
+            "oa_url": sp.get("oa_url",""),
+            "abstract": sp.get("text",""),
+            "direction": "unclear",
+            "_score": 1.0
+        })
+    return extra
+
+def _hop_seeds(claim: str, items: List[Dict]) -> set:
+    # Every node graphrag_retrieve may start from: entities in the claim and in any sub-question the multi-hop planner
+    # can cut it into (split on " then " or " and ", lowercased), plus the papers it may pick from `items`.
+    q = (claim or "").strip().rstrip("?")
+    parts = [q, q.lower()] + [p.strip() for cut in (" then ", " and ") for p in q.lower().split(cut)]
+    return {e for p in parts for e in ENTITY_PAT.findall(p)} | {x["id"] for x in items if x.get("id")}
+
+def process_claim_stream(claim_raw: str, top_k: int = 10) -> Iterator[Dict]:
+    # Yields typed events: claim, source (one per source), provisional_verdict (after each batch), ranked, multihop, final.
+    # Stages are timed with tracing spans. Events go out through tr.emit, which pauses the spans still open (the root,
+    # and "retrieve" while sources land), so consumer time is not charged to a stage.
+    tr = new_trace()
+    with tr.span("claim"):
+        claim = sanitize_claim(claim_raw)
+        sflags = safety_checks(claim)
+        intent = classify_intent(claim)
+        q = query_terms(claim, intent)
+    yield from tr.emit({"type": "claim", "claim": claim, "intent": intent, "safety": sflags})
+    # Step 1: retrieve, scoring each batch as it lands. The local index answers first; remote sources run unless
+    # it already holds enough fresh evidence for this query.
+    pools: List[Dict] = []
+    fetched: List[Dict] = []
+    retrieval_status: Dict[str, Dict] = {}
+    provisional: List[Dict] = []
+    # prevention claims get a provisional pooled effect too; each batch is folded into the running sums in O(batch)
+    pool = MetaPool() if intent == "prevention" else None
+    retrieve = tr.start("retrieve")
+    with retrieve.child("local"):
+        local, enough = _local_hits(claim, q)
+    tasks = [("local", lambda: local)] if EVIDENCE_INDEX else []
+    deadline_s, until = _deadline()
+    if not enough:
+        tasks += [(name, tr.wrap(f"source.{name}", _enriched(tr.wrap("fetch", fn), until, tr.wrap("enrich_oa", enrich_batch)), retrieve))
+                  for name, fn in _retrieval_tasks(intent, q)]
+    for name, got, st in fan_out_iter(tasks, deadline_s=deadline_s):
+        retrieval_status[name] = st
+        if st.get("status") != "ok":
+            # fan_out_iter already logged it
+            tr.error(f"source.{name}", RuntimeError(st.get("error") or st["status"]), log=False)
+        tr.count("items.retrieved", len(got))
+        yield from tr.emit({"type": "source", "source": name, **st}, retrieve)
+        if not got: continue
+        # Step 2: effects + directions for just this batch (already OA-enriched in the source's worker)
+        tr.count("items.enriched", sum(1 for x in got if (x.get("oa_url") or "").strip()))
+        with retrieve.child("extract"):
+            batch = emit_study_points(got)
+        if RELEVANCE:
+            try:
+                with retrieve.child("relevance"):
+                    annotate_relevance(claim, batch)
+            except Exception as e:
+                tr.error("relevance", e)
+        pools += batch
+        if name != "local": fetched += batch
+        with retrieve.child("provisional"):
+            provisional = merge_ranked(provisional, batch)
+            # decide_verdict only looks at the top 10, so the merged head is all it needs
+            pv = decide_verdict(provisional[:10], intent=intent)
+            if pool is not None:
+                pool.add_studies(batch)
+                pv_pooled = pool.random()
+        ev = {"type": "provisional_verdict", "verdict": pv, "top": provisional[:top_k], "n": len(provisional)}
+        if pool is not None: ev["pooled"] = pv_pooled["ratio"] if pv_pooled else None
+        yield from tr.emit(ev, retrieve)
+    retrieve.end()
+    with tr.span("dedupe"):
+        deduped = dedupe_records(pools)
+    tr.count("items.deduped", len(pools) - len(deduped))
+    try:
+        with tr.span("index.add"):
+            _index(fetched)
+    except Exception as e:
+        tr.error("index", e)
+    with tr.span("rank"):
+        ranked = rank_items(deduped)
+    yield from tr.emit({"type": "ranked", "top": ranked[:top_k], "n": len(ranked)})
+    # Merge this claim's evidence into the persistent Graph-RAG store
+    try:
+        with tr.span("graph.load"):
+            g = graph_store()
+        with tr.span("graph.add"):
+            g.add_items(ranked)
+    except Exception as e:
+        tr.error("graph", e)
+        g = None
     # Router for multi-hop
-    hop_mode = route_hops(claim)
+    with tr.span("route"):
+        hop_mode = route_hops(claim)
     hop_trace = []
     if hop_mode == "multi_hop" and g is not None:
         try:
-            mh = run_multihop(g, claim, ranked, hop_limit=CFG.get("multihop",{}).get("hop_limit",3), k=CFG.get("graphrag",{}).get("retriever_k",6))
-            hop_trace = mh.get("hop_trace",[])
-            # augment ranked with any spans as pseudo-items (for visibility)
-            for sp in (mh.get("graph_snippets") or [])[:5]:
-                ranked.append({
-                    "id": sp.get("source_id","graph"),
-                    "source": "GraphRAG",
-                    "title": sp.get("title",""),
-                    "year": sp.get("year"),
-                    "tier": "case_series",
-                    "applicability": 0.7,
-                    "oa_url": sp.get("oa_url",""),
-                    "abstract": sp.get("text",""),
-                    "direction": "unclear",
-                    "_score": 1.0
-                })
-            ranked = rank_items(ranked)
-        except Exception:
-            pass
+            with tr.span("graph.neighborhood"):
+                # run_multihop expands 2 hops around its seeds
+                sub = g.neighborhood(_hop_seeds(claim, ranked), hops=2)
+            with tr.span("multihop"):
+                mh = run_multihop(sub, claim, ranked, hop_limit=CFG.get("multihop",{}).get("hop_limit",3), k=CFG.get("graphrag",{}).get("retriever_k",6))
+                hop_trace = mh.get("hop_trace",[])
+                extra = _graph_items(mh)
+                ranked = merge_ranked(ranked, extra)
+        except Exception as e:
+            tr.error("multihop", e)
+        else:
+            yield from tr.emit({"type": "multihop", "hop_trace": hop_trace, "added": len(extra)})
     # Reason
-    verdict = decide_verdict(ranked, intent=intent)
-    aggregates = {"prevention": pooled_effect(ranked)} if intent == "prevention" else {}
-    facts = build_narrative_facts(claim, intent, ranked, verdict, aggregates, hop_trace=hop_trace)
-    return {
+    with tr.span("verdict"):
+        verdict = decide_verdict(ranked, intent=intent)
+    with tr.span("aggregate"):
+        aggregates = {"prevention": pooled_effect(ranked)} if intent == "prevention" else {}
+    with tr.span("narrative"):
+        facts = build_narrative_facts(claim, intent, ranked, verdict, aggregates, hop_trace=hop_trace)
+    yield {"type": "final", "result": {
         "claim": claim,
         "intent": intent,
         "safety": sflags,
@@ -158,5 +276,20 @@ def process_claim(claim_raw: str) -> Dict:
         "aggregates": aggregates,
         "verdict": verdict,
         "facts": facts,
-        "router_debug": {"mode": hop_mode}
-    }
\ No newline at end of file
+        "router_debug": {"mode": hop_mode},
+        "retrieval": retrieval_status,
+        "timings": tr.finish()
+    }}
+
+def _process_claim(claim_raw: str) -> Dict:
+    result = None
+    for ev in process_claim_stream(claim_raw):
+        if ev["type"] == "final":
+            result = ev["result"]
+    return result
+
+def process_claim(claim_raw: str, use_cache: bool = True) -> Dict:
+    # Served from the claim-level cache when an equivalent claim was answered recently (CLAIM_CACHE=0 disables it).
+    if use_cache and CLAIM_CACHE:
+        return claim_cache().get_or_compute(claim_raw, _process_claim)
+    return _process_claim(claim_raw)
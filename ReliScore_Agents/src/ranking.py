@@ -1,26 +1,96 @@
-from typing import List, Dict
+import json, hashlib
+from typing import List, Dict, Optional
 from datetime import datetime
+import numpy as np
+from .config import load_run_config
+from .study_points import DEFAULT_TIER, tier_weight_column
 
+_RANK_CFG = load_run_config().get("ranking", {})
 TIER_WEIGHT = {
     "guideline": 4.0, "systematic_review": 3.5, "randomized_trial": 3.0,
     "cohort": 2.0, "case_control": 1.5, "case_series": 1.0,
     "in_vitro": 0.5, "animal": 0.5,
 }
+TIER_WEIGHT.update(_RANK_CFG.get("tier_weights") or {})
+RECENCY_WINDOW = float(_RANK_CFG.get("recency_window", 20.0))
+# Share of the score that follows "_relevance" (similarity to the claim, 0..1); items without one are not affected.
+RELEVANCE_WEIGHT = float(_RANK_CFG.get("relevance_weight", 0.5))
 
-def score_item(x: Dict) -> float:
+def score_version() -> str:
+    # Changes whenever stored scores go stale: a new calendar year (recency) or different ranking weights.
+    blob = json.dumps([datetime.now().year, TIER_WEIGHT, RECENCY_WINDOW, RELEVANCE_WEIGHT], sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+def score_item(x: Dict, tier_weights: Optional[Dict[str, float]] = None, recency_window: float = RECENCY_WINDOW) -> float:
     year = x.get("year") or 0
     try:
         recency = max(0, datetime.now().year - int(year))
     except:
         recency = 10
-    tier = x.get("tier", "cohort")
-    weight = TIER_WEIGHT.get(tier, 1.0)
-    recency_factor = max(0.2, 1.0 - recency / 20.0)
+    tier = x.get("tier", DEFAULT_TIER)
+    weight = (tier_weights or TIER_WEIGHT).get(tier, 1.0)
+    recency_factor = max(0.2, 1.0 - recency / recency_window)
     applicability = x.get("applicability", 1.0)
     oa_boost = 1.1 if (x.get("oa_url") or "").strip() else 1.0
-    return weight * recency_factor * (0.5 + 0.5 * applicability) * oa_boost
+    relevance = 1.0 - RELEVANCE_WEIGHT + RELEVANCE_WEIGHT * x["_relevance"] if x.get("_relevance") is not None else 1.0
+    return weight * recency_factor * (0.5 + 0.5 * applicability) * oa_boost * relevance
+
+def _recency(year, this_year: int) -> int:
+    try:
+        return max(0, this_year - int(year or 0))
+    except:
+        return 10
+
+def score_batch(items: List[Dict], tier_weights: Optional[Dict[str, float]] = None, recency_window: float = RECENCY_WINDOW) -> np.ndarray:
+    # Same arithmetic as score_item, evaluated column-wise in float64 so scores match bit for bit.
+    n = len(items)
+    if n == 0: return np.zeros(0)
+    tw = tier_weights or TIER_WEIGHT
+    this_year = datetime.now().year
+    rec = np.fromiter((_recency(x.get("year"), this_year) for x in items), dtype=np.float64, count=n)
+    weight = tier_weight_column(items, tw)
+    appl = np.fromiter((x.get("applicability", 1.0) for x in items), dtype=np.float64, count=n)
+    oa = np.fromiter((1.1 if (x.get("oa_url") or "").strip() else 1.0 for x in items), dtype=np.float64, count=n)
+    rel = np.fromiter((x.get("_relevance") if x.get("_relevance") is not None else np.nan for x in items), dtype=np.float64, count=n)
+    return score_columns(rec, weight, appl, oa, recency_window, rel)
+
+def score_columns(recency: np.ndarray, weight: np.ndarray, applicability: np.ndarray, oa_boost: np.ndarray, recency_window: float = RECENCY_WINDOW,
+                  relevance: Optional[np.ndarray] = None) -> np.ndarray:
+    recency_factor = np.maximum(0.2, 1.0 - recency / recency_window)
+    score = weight * recency_factor * (0.5 + 0.5 * applicability) * oa_boost
+    if relevance is None: return score
+    # NaN marks items without a relevance term; np.where keeps their score bit-identical to score_item
+    return np.where(np.isnan(relevance), score, score * (1.0 - RELEVANCE_WEIGHT + RELEVANCE_WEIGHT * relevance))
+
+def _order(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    # Descending by score, ties by original position: identical to sorted(..., reverse=True).
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = -np.partition(-scores, k - 1)[k - 1]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    pick = np.concatenate((above, ties))
+    return pick[np.lexsort((pick, -scores[pick]))]
+
+def rank_items(items: List[Dict], k: Optional[int] = None, tier_weights: Optional[Dict[str, float]] = None, recency_window: float = RECENCY_WINDOW) -> List[Dict]:
+    scores = score_batch(items, tier_weights, recency_window)
+    for it, s in zip(items, scores.tolist()):
+        it["_score"] = s
+    return [items[i] for i in _order(scores, k).tolist()]
 
-def rank_items(items: List[Dict]) -> List[Dict]:
-    for it in items:
-        it["_score"] = score_item(it)
-    return sorted(items, key=lambda z: z.get("_score", 0), reverse=True)
+def merge_ranked(ranked: List[Dict], new_items: List[Dict], k: Optional[int] = None, tier_weights: Optional[Dict[str, float]] = None, recency_window: float = RECENCY_WINDOW) -> List[Dict]:
+    # Scores only new_items and merges them into an already ranked list; same result as rank_items(ranked + new_items).
+    if not new_items: return ranked[:k] if k is not None else ranked
+    new_ranked = rank_items(new_items, k, tier_weights, recency_window)
+    scores = np.fromiter((x.get("_score", 0) for x in ranked), dtype=np.float64, count=len(ranked))
+    new_scores = np.fromiter((x["_score"] for x in new_ranked), dtype=np.float64, count=len(new_ranked))
+    # Existing items win ties because they precede the new ones in ranked + new_items.
+    pos = np.searchsorted(-scores, -new_scores, side="right") + np.arange(len(new_ranked))
+    out: List[Optional[Dict]] = [None] * (len(ranked) + len(new_ranked))
+    for p, x in zip(pos.tolist(), new_ranked): out[p] = x
+    it = iter(ranked)
+    out = [x if x is not None else next(it) for x in out]
+    return out[:k] if k is not None else out
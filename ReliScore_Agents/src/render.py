@@ -0,0 +1,96 @@
+import os, io, json, hashlib, threading, multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "2"))
+RENDER_CACHE_BYTES = int(os.environ.get("RENDER_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Only these fields reach the plots, so only they go into the cache key and across the process boundary.
+PLOT_FIELDS = ("id", "title", "year", "_score", "direction", "source", "effect", "applicability")
+
+class _ByteLRU:
+    def __init__(self, max_bytes: int):
+        self.max_bytes, self.size = max_bytes, 0
+        self._d: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            v = self._d.get(key)
+            if v is not None: self._d.move_to_end(key)
+            return v
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            old = self._d.pop(key, None)
+            if old is not None: self.size -= len(old)
+            self._d[key] = value; self.size += len(value)
+            while self.size > self.max_bytes and len(self._d) > 1:
+                _, v = self._d.popitem(last=False); self.size -= len(v)
+
+_CACHE = _ByteLRU(RENDER_CACHE_BYTES)
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_AGG = False
+
+def plot_points(study_points) -> List[Dict]:
+    return [{k: s.get(k) for k in PLOT_FIELDS if k in s} for s in study_points]
+
+def render_key(fn: Callable, points: List[Dict], fmt: str, dpi: int) -> str:
+    blob = json.dumps([f"{fn.__module__}.{fn.__name__}", fmt, dpi, points], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _use_agg():
+    # In-process renders run on Streamlit's worker threads; only the non-GUI Agg backend is safe off the main thread.
+    global _AGG
+    with _POOL_LOCK:
+        if not _AGG:
+            _init_worker(); _AGG = True
+
+def _render_bytes(fn: Callable, points: List[Dict], fmt: str = "png", dpi: int = 100) -> bytes:
+    import matplotlib.pyplot as plt
+    fig = fn(points)
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+def _pool() -> ProcessPoolExecutor:
+    # spawn, not fork: the Streamlit server is multi-threaded and pyplot keeps global state.
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+        return _POOL
+
+def render(fn: Callable, study_points, fmt: str = "png", dpi: int = 100) -> bytes:
+    # Synchronous, cached: PNG/SVG bytes for fn(study_points); the figure is always closed.
+    points = plot_points(study_points)
+    key = render_key(fn, points, fmt, dpi)
+    out = _CACHE.get(key)
+    if out is None:
+        _use_agg()
+        out = _render_bytes(fn, points, fmt, dpi)
+        _CACHE.put(key, out)
+    return out
+
+def render_async(fn: Callable, study_points, fmt: str = "png", dpi: int = 100) -> Future:
+    # Cached bytes come back as an already-resolved Future; misses render in the worker pool.
+    points = plot_points(study_points)
+    key = render_key(fn, points, fmt, dpi)
+    out = _CACHE.get(key)
+    if out is not None:
+        f: Future = Future(); f.set_result(out)
+        return f
+    fut = _pool().submit(_render_bytes, fn, points, fmt, dpi)
+    fut.add_done_callback(lambda fu: fu.exception() is None and _CACHE.put(key, fu.result()))
+    return fut
+
+def render_many(fns: Dict[str, Callable], study_points, fmt: str = "png", dpi: int = 100) -> Dict[str, Future]:
+    return {name: render_async(fn, study_points, fmt, dpi) for name, fn in fns.items()}
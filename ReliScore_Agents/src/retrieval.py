@@ -0,0 +1,73 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, TimeoutError as FuturesTimeout
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+from .config import load_run_config
+from .http_client import deadline as http_deadline
+
+RCFG = load_run_config().get("retrieval", {})
+_POOL = ThreadPoolExecutor(max_workers=int(RCFG.get("max_workers", 16)), thread_name_prefix="reli-src")
+_CAPS: Dict[str, threading.BoundedSemaphore] = {}
+_CAPS_LOCK = threading.Lock()
+
+def _cap(source: str) -> threading.BoundedSemaphore:
+    with _CAPS_LOCK:
+        if source not in _CAPS:
+            n = RCFG.get("source_caps", {}).get(source, RCFG.get("per_source_cap", 4))
+            _CAPS[source] = threading.BoundedSemaphore(max(1, int(n)))
+        return _CAPS[source]
+
+def _run(source: str, fn: Callable[[], List[Dict]], deadline: float) -> List[Dict]:
+    sem = _cap(source)
+    if not sem.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise TimeoutError(f"{source}: waited past deadline for a concurrency slot")
+    try:
+        # the source's HTTP calls share the deadline, so a straggler gives up its slot instead of running on
+        with http_deadline(deadline):
+            return fn() or []
+    finally:
+        sem.release()
+
+def _outcome(name: str, fut, deadline_s: float) -> Tuple[List[Dict], Dict]:
+    if not fut.done():
+        # a running thread can't be cancelled; it stops at its next request, which is bounded by the same deadline
+        queued = fut.cancel()
+        logger.warning(f"[retrieval] {name} timed out after {deadline_s:.1f}s" + (" before it started" if queued else ""))
+        return [], {"status": "timed_out", "n": 0}
+    try:
+        got = fut.result()
+        return got, {"status": "ok", "n": len(got)}
+    except Exception as e:
+        logger.warning(f"[retrieval] {name} failed: {e}")
+        return [], {"status": "timed_out" if isinstance(e, TimeoutError) else "error", "n": 0, "error": str(e)}
+
+def fan_out(tasks: List[Tuple[str, Callable[[], List[Dict]]]], deadline_s: Optional[float] = None) -> Tuple[List[Dict], Dict[str, Dict]]:
+    # Runs every (source, fn) at once; returns whatever arrived by the deadline (in task order) plus a per-source status.
+    deadline_s = float(deadline_s if deadline_s is not None else RCFG.get("deadline_s", 10))
+    deadline = time.monotonic() + deadline_s
+    futs = {name: _POOL.submit(_run, name, fn, deadline) for name, fn in tasks}
+    wait(list(futs.values()), timeout=deadline_s)
+    items: List[Dict] = []
+    status: Dict[str, Dict] = {}
+    for name, fut in futs.items():
+        got, status[name] = _outcome(name, fut, deadline_s)
+        items += got
+    return items, status
+
+def fan_out_iter(tasks: List[Tuple[str, Callable[[], List[Dict]]]], deadline_s: Optional[float] = None) -> Iterator[Tuple[str, List[Dict], Dict]]:
+    # Same scheduling as fan_out, but yields (source, items, status) as each source finishes; stragglers are reported at the deadline.
+    deadline_s = float(deadline_s if deadline_s is not None else RCFG.get("deadline_s", 10))
+    deadline = time.monotonic() + deadline_s
+    futs = {_POOL.submit(_run, name, fn, deadline): name for name, fn in tasks}
+    reported = set()
+    try:
+        for fut in as_completed(futs, timeout=deadline_s):
+            reported.add(fut)
+            got, st = _outcome(futs[fut], fut, deadline_s)
+            yield futs[fut], got, st
+    except FuturesTimeout:
+        pass
+    for fut, name in futs.items():
+        if fut not in reported:
+            got, st = _outcome(name, fut, deadline_s)
+            yield name, got, st
@@ -0,0 +1,126 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+UNCLEAR, SUPPORTS, REFUTES = 0, 1, 2
+_DIR_CODE = {"supports": SUPPORTS, "refutes": REFUTES}
+DEFAULT_TIER = "cohort"  # what ranking assumes for a point without a "tier"
+
+def tier_codes(records) -> Tuple[np.ndarray, List]:
+    # Each record's tier as an index into the returned names (first-seen order).
+    names, index = [], {}
+    codes = np.empty(len(records), dtype=np.int32)
+    for i, x in enumerate(records):
+        t = x.get("tier", DEFAULT_TIER)
+        c = index.get(t)
+        if c is None:
+            c = index[t] = len(names); names.append(t)
+        codes[i] = c
+    return codes, names
+
+def tier_weight_column(items, weights: Dict[str, float]) -> np.ndarray:
+    # Per-point weight from a tier -> weight map (1.0 for tiers not in it); reads the tier column when given a table.
+    codes, names = (items.tier, items.tier_names) if isinstance(items, StudyPointTable) else tier_codes(items)
+    return np.fromiter((weights.get(t, 1.0) for t in names), dtype=np.float64, count=len(names))[codes]
+
+class StudyPointTable:
+    # Column view over a list of study-point dicts, built in one pass; iterating or indexing yields the original dicts.
+    __slots__ = ("records", "ids", "sources", "year", "direction", "score", "effect_value", "ci_low", "ci_high", "has_effect", "tier", "tier_names", "_agg")
+
+    def __init__(self, records: List[Dict]):
+        self.records = records if isinstance(records, list) else list(records)
+        n = len(self.records)
+        self.ids: List[str] = [None] * n
+        self.sources: List[str] = [None] * n
+        self.year = np.full(n, np.nan)
+        self.direction = np.zeros(n, dtype=np.int8)
+        self.score = np.zeros(n)
+        self.effect_value = np.full(n, np.nan)
+        self.ci_low = np.full(n, np.nan)
+        self.ci_high = np.full(n, np.nan)
+        self.has_effect = np.zeros(n, dtype=bool)
+        self.tier = np.empty(n, dtype=np.int32)
+        self.tier_names: List = []
+        tix: Dict = {}
+        for i, x in enumerate(self.records):
+            self.ids[i] = x.get("id"); self.sources[i] = x.get("source")
+            y = x.get("year")
+            if isinstance(y, int) and not isinstance(y, bool): self.year[i] = y
+            self.direction[i] = _DIR_CODE.get((x.get("direction") or "").lower(), UNCLEAR)
+            self.score[i] = x.get("_score", 0)
+            t = x.get("tier", DEFAULT_TIER)
+            c = tix.get(t)
+            if c is None:
+                c = tix[t] = len(self.tier_names); self.tier_names.append(t)
+            self.tier[i] = c
+            e = x.get("effect")
+            if isinstance(e, dict):
+                v = e.get("value")
+                if v: self.has_effect[i] = True
+                if isinstance(v, (int, float)): self.effect_value[i] = v
+                if isinstance(e.get("ci_low"), (int, float)): self.ci_low[i] = e["ci_low"]
+                if isinstance(e.get("ci_high"), (int, float)): self.ci_high[i] = e["ci_high"]
+        self._agg: Dict = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def counts(self) -> Tuple[int, int, int]:
+        if "counts" not in self._agg:
+            bc = np.bincount(self.direction, minlength=3)
+            self._agg["counts"] = (int(bc[SUPPORTS]), int(bc[REFUTES]), int(bc[UNCLEAR]))
+        return self._agg["counts"]
+
+    def year_span(self) -> Tuple[Optional[int], Optional[int]]:
+        if "years" not in self._agg:
+            ys = self.year[~np.isnan(self.year)]
+            self._agg["years"] = (int(ys.min()), int(ys.max())) if len(ys) else (None, None)
+        return self._agg["years"]
+
+    def avg_score(self) -> float:
+        if "avg" not in self._agg:
+            self._agg["avg"] = float(self.score.mean()) if len(self.score) else 0.0
+        return self._agg["avg"]
+
+    def tier_counts(self) -> Dict[str, int]:
+        # Points per tier; a missing or non-string tier is counted as "unknown".
+        if "tiers" not in self._agg:
+            out: Dict[str, int] = {}
+            for t, c in zip(self.tier_names, np.bincount(self.tier, minlength=len(self.tier_names)).tolist()):
+                k = t if isinstance(t, str) and t else "unknown"
+                out[k] = out.get(k, 0) + c
+            self._agg["tiers"] = out
+        return self._agg["tiers"]
+
+    def effect_values(self) -> List[float]:
+        v = self.effect_value
+        return v[~np.isnan(v) & (v > 0)].tolist()
+
+    def years_and_scores(self) -> Tuple[list, list]:
+        # Points with a truthy year, sorted by (year, score).
+        m = np.flatnonzero(~np.isnan(self.year) & (self.year != 0))
+        if not len(m): return [], []
+        o = m[np.lexsort((self.score[m], self.year[m]))]
+        return self.year[o].astype(int).tolist(), self.score[o].tolist()
+
+    def top_effects(self, k: int = 5) -> List[Dict]:
+        idx = np.flatnonzero(self.has_effect)
+        idx = idx[np.argsort(-self.score[idx], kind="stable")][:k]
+        out = []
+        for i in idx.tolist():
+            it, e = self.records[i], self.records[i]["effect"]
+            out.append({
+                "title": (it.get("title") or "")[:180], "year": it.get("year"),
+                "metric": e.get("metric"), "value": e.get("value"), "ci_low": e.get("ci_low"), "ci_high": e.get("ci_high"),
+                "direction": it.get("direction"), "source": it.get("source"), "id": it.get("id"),
+                "oa_url": it.get("oa_url"), "_score": it.get("_score", 0),
+            })
+        return out
+
+def as_table(items) -> StudyPointTable:
+    return items if isinstance(items, StudyPointTable) else StudyPointTable(items)
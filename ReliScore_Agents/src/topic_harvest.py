@@ -1,4 +1,8 @@
-from typing import Dict, List
+import os, json, time, argparse, threading
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
 from .sources.pubmed import search_pubmed
 from .sources.europe_pmc import search_eupmc
 from .sources.crossref import search_crossref
@@ -7,17 +11,197 @@ from .sources.ctgov import search_ctgov
 from .sources.agency import harvest_agencies
 from .sources.repos import find_datasets
 from .ranking import rank_items
-from .utils import dedupe_list
+from .retrieval import fan_out, fan_out_iter, RCFG
+from .dedupe import dedupe_records, canonical_keys
+from .http_client import TokenBucket
+from .harvest_store import TopicStore
+from .evidence_index import evidence_index
+from .vector_store import VECTORS, vector_store
+
+HARVEST_WORKERS = int(os.environ.get("HARVEST_WORKERS", "2"))
+HARVEST_TOPICS_PER_MIN = float(os.environ.get("HARVEST_TOPICS_PER_MIN", "6"))
+# Date windows start this far before the cursor: indexing dates lag and sources backfill, the merge absorbs the overlap.
+HARVEST_OVERLAP_DAYS = int(os.environ.get("HARVEST_OVERLAP_DAYS", "1"))
+# A harvest run is a background job, not a user waiting on a claim: it gets its own, longer deadline than retrieval.
+HARVEST_DEADLINE_S = float(os.environ.get("HARVEST_DEADLINE_S", "120"))
+BACKFILL_N = {"pubmed": 200, "eupmc": 200, "crossref": 100, "preprint": 50, "ctgov": 100, "agency": 5, "repos": 5}
+DELTA_N = {"pubmed": 100, "eupmc": 100, "crossref": 50, "preprint": 25, "ctgov": 50}
 
 def harvest_topic(keyword: str, limit: int = 50) -> Dict[str, List[Dict]]:
-    pools = []
-    pools += search_pubmed(keyword, n=20)
-    pools += search_eupmc(keyword, n=20)
-    pools += search_crossref(keyword, n=15)
-    pools += search_preprints(keyword, n=10)
-    pools += search_ctgov(keyword, n=10)
-    pools += harvest_agencies(keyword, n=5)
-    pools += find_datasets(keyword, n=5)
-    items = dedupe_list(pools)
-    ranked = rank_items(items)[:limit]
-    return {"items": ranked}
+    pools, status = fan_out([
+        ("pubmed", lambda: search_pubmed(keyword, n=20)),
+        ("eupmc", lambda: search_eupmc(keyword, n=20)),
+        ("crossref", lambda: search_crossref(keyword, n=15)),
+        ("preprint", lambda: search_preprints(keyword, n=10)),
+        ("ctgov", lambda: search_ctgov(keyword, n=10)),
+        ("agency", lambda: harvest_agencies(keyword, n=5)),
+        ("repos", lambda: find_datasets(keyword, n=5)),
+    ], deadline_s=RCFG.get("deadline_s"))
+    items = dedupe_records(pools)
+    _index(items)
+    ranked = rank_items(items, k=limit)
+    return {"items": ranked, "sources": status}
+
+def _index(items: List[Dict]):
+    # Harvested records feed the local evidence index that process_claim queries before going remote.
+    try:
+        evidence_index().add(items)
+        if VECTORS: vector_store().add_items(items)
+    except Exception as e:
+        logger.warning(f"[harvest] indexing {len(items)} records failed: {type(e).__name__}: {e}")
+
+# Query for records added between `since` and `until` (YYYY-MM-DD, inclusive), in each source's own date syntax. Crossref
+# (and the preprint search that runs through it) has no date field in its free-text query, so those re-run the plain
+# query and the merge keeps only what is new; agency/repos results don't change between runs and are fetched at backfill only.
+DELTA_QUERY: Dict[str, Callable[[str, str, str], str]] = {
+    "pubmed": lambda kw, since, until: f'({kw}) AND ("{since.replace("-", "/")}"[EDAT] : "{until.replace("-", "/")}"[EDAT])',
+    "eupmc": lambda kw, since, until: f"({kw}) AND FIRST_IDATE:[{since} TO {until}]",
+    "ctgov": lambda kw, since, until: f"{kw} AND AREA[LastUpdatePostDate]RANGE[{since},{until}]",
+    "crossref": lambda kw, since, until: kw,
+    "preprint": lambda kw, since, until: kw,
+}
+DATED = {"pubmed", "eupmc", "ctgov"}
+SEARCH: Dict[str, Callable[[str, int], List[Dict]]] = {
+    "pubmed": search_pubmed, "eupmc": search_eupmc, "crossref": search_crossref, "preprint": search_preprints,
+    "ctgov": search_ctgov, "agency": harvest_agencies, "repos": find_datasets,
+}
+
+def _fetch_window(source: str, keyword: str, since: date, until: date, t_end: float) -> Tuple[List[Dict], Optional[date]]:
+    # (records, first day not fully fetched or None). The adapters take no offset, so a window that comes back full is
+    # paged by date instead: split in half and both halves fetched, down to single days, until t_end.
+    n = DELTA_N[source]
+    got = SEARCH[source](DELTA_QUERY[source](keyword, since.isoformat(), until.isoformat()), n=n)
+    if len(got) < n or source not in DATED: return got, None
+    if since >= until:
+        logger.warning(f"[harvest] {source} has more than {n} records for {keyword!r} on {since}; only the first {n} are kept")
+        return got, None
+    if time.monotonic() >= t_end: return got, since
+    mid = since + (until - since) // 2
+    left, gap = _fetch_window(source, keyword, since, mid, t_end)
+    if gap is not None: return got + left, gap
+    right, gap = _fetch_window(source, keyword, mid + timedelta(days=1), until, t_end)
+    return got + left + right, gap
+
+def _task(store: TopicStore, keyword: str, source: str, until: date, t_end: float, gaps: Dict[str, Optional[date]]):
+    cur = store.cursor(keyword, source)
+    if cur is None:
+        n = BACKFILL_N[source]
+        return lambda: SEARCH[source](keyword, n=n)
+    if source not in DELTA_QUERY: return None
+    since = datetime.strptime(cur["last_date"], "%Y-%m-%d").date() - timedelta(days=HARVEST_OVERLAP_DAYS)
+    def run() -> List[Dict]:
+        got, gaps[source] = _fetch_window(source, keyword, since, until, t_end)
+        return got
+    return run
+
+def harvest_incremental(keyword: str, store: Optional[TopicStore] = None, limit: int = 50) -> Dict:
+    # One delta run for a tracked topic: each source fetches from its own cursor and the results are folded into the
+    # topic's stored corpus. The first run per source is a backfill. Adapters return [] on errors, so a cursor only moves
+    # when its source answered with something (an empty answer just means the next window starts earlier), and only up
+    # to the first day it could not page through before the deadline.
+    store = store or TopicStore()
+    today = datetime.now(timezone.utc).date()
+    t0 = time.monotonic()
+    gaps: Dict[str, Optional[date]] = {}
+    # windows are split only while there is time left to fetch the halves and merge
+    t_end = t0 + 0.8 * HARVEST_DEADLINE_S
+    tasks = [(s, fn) for s in SEARCH if (fn := _task(store, keyword, s, today, t_end, gaps)) is not None]
+    items: List[Dict] = []
+    status: Dict[str, Dict] = {}
+    moved: Dict[str, Tuple[str, Optional[str]]] = {}
+    for source, got, st in fan_out_iter(tasks, deadline_s=HARVEST_DEADLINE_S):
+        items += got; status[source] = st
+        if st.get("status") == "ok" and got:
+            upto = gaps.get(source) or today
+            cur = store.cursor(keyword, source)
+            if cur is None or upto.isoformat() > cur["last_date"]:
+                moved[source] = (upto.isoformat(), next((k for x in got for k in canonical_keys(x)), None))
+    added, updated = store.merge(keyword, items)
+    _index(items)
+    # cursors move only after the merge has committed, so a crash re-fetches instead of skipping
+    for source, (last_date, last_id) in moved.items():
+        store.set_cursor(keyword, source, last_date, last_id)
+    store.mark_run(keyword)
+    size = store.size(keyword)
+    logger.info(f"[harvest] {keyword!r}: {len(items)} fetched, {added} new, {updated} updated, corpus {size}")
+    return {"keyword": keyword, "fetched": len(items), "added": added, "updated": updated, "size": size,
+            "seconds": round(time.monotonic() - t0, 3), "sources": status, "items": store.top(keyword, limit)}
+
+class HarvestScheduler:
+    # Runs harvest_incremental for every tracked topic on its own interval. Topics run on a small pool (one run per
+    # topic at a time) and starts are rate-limited; per-host request limits are already shared through http_client.
+    def __init__(self, store: Optional[TopicStore] = None, workers: int = HARVEST_WORKERS, topics_per_min: float = HARVEST_TOPICS_PER_MIN):
+        import schedule
+        self.store = store or TopicStore()
+        self.sched = schedule.Scheduler()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reli-harvest")
+        self._bucket = TokenBucket(topics_per_min / 60.0, max(1, workers))
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _run(self, keyword: str, limit: int):
+        try:
+            self._bucket.acquire()
+            harvest_incremental(keyword, self.store, limit)
+        except Exception as e:
+            logger.warning(f"[harvest] {keyword!r} failed: {type(e).__name__}: {e}")
+        finally:
+            with self._lock: self._running.discard(keyword)
+
+    def submit(self, keyword: str, limit: int = 50) -> bool:
+        with self._lock:
+            if keyword in self._running: return False
+            self._running.add(keyword)
+        self._pool.submit(self._run, keyword, limit)
+        return True
+
+    def load(self):
+        # (Re)builds the job list from the store; topics that were never run, or are overdue, start right away.
+        self.sched.clear()
+        now = time.time()
+        for t in self.store.topics():
+            every = max(60, int(t["every_s"] or 3600))
+            self.sched.every(every).seconds.do(self.submit, t["keyword"], t["limit"] or 50).tag(t["keyword"])
+            if not t["last_run"] or now - t["last_run"] >= every:
+                self.submit(t["keyword"], t["limit"] or 50)
+        return self
+
+    def run_forever(self, reload_s: float = 300):
+        self.load()
+        last = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() - last >= reload_s:
+                self.load(); last = time.monotonic()
+            self.sched.run_pending()
+            self._stop.wait(min(1.0, max(0.0, self.sched.idle_seconds or 1.0)))
+        self._pool.shutdown(wait=True)
+
+    def stop(self):
+        self._stop.set()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Track topics and keep their evidence corpus up to date incrementally.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("track"); p.add_argument("keyword"); p.add_argument("--every", type=float, default=3600); p.add_argument("--limit", type=int, default=50)
+    p = sub.add_parser("untrack"); p.add_argument("keyword")
+    p = sub.add_parser("once"); p.add_argument("keyword", nargs="?"); p.add_argument("--limit", type=int, default=50)
+    p = sub.add_parser("top"); p.add_argument("keyword"); p.add_argument("-k", type=int, default=20)
+    sub.add_parser("run"); sub.add_parser("list")
+    args = ap.parse_args()
+    store = TopicStore()
+    if args.cmd == "track":
+        store.add_topic(args.keyword, args.every, args.limit); print(json.dumps(store.topics(), indent=2))
+    elif args.cmd == "untrack":
+        store.remove_topic(args.keyword)
+    elif args.cmd == "list":
+        print(json.dumps([dict(t, size=store.size(t["keyword"]), cursors={s: store.cursor(t["keyword"], s) for s in SEARCH})
+                          for t in store.topics()], indent=2))
+    elif args.cmd == "once":
+        kws = [args.keyword] if args.keyword else [t["keyword"] for t in store.topics()]
+        runs = [harvest_incremental(k, store, args.limit) for k in kws]
+        print(json.dumps([{k: v for k, v in r.items() if k != "items"} for r in runs], indent=2))
+    elif args.cmd == "top":
+        print(json.dumps(store.top(args.keyword, args.k), indent=2, ensure_ascii=False))
+    else:
+        HarvestScheduler(store).run_forever()
@@ -0,0 +1,244 @@
+import os, json, time, threading, contextvars
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from loguru import logger
+
+# RELI_TRACE=0 turns spans and counters into no-ops; RELI_METRICS_PORT serves /metrics (Prometheus text) and /metrics.json.
+TRACE = os.environ.get("RELI_TRACE", "1") != "0"
+METRICS_PORT = int(os.environ.get("RELI_METRICS_PORT", "0"))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Registry:
+    # Process-wide aggregates across claims: per-stage latency histograms, event counters and error counts.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: Dict[str, List] = {}  # name -> [bucket counts..., +Inf count, sum]
+        self.counters: Dict[str, float] = {}
+        self.errors: Dict[str, int] = {}
+
+    def observe(self, stage: str, secs: float):
+        with self.lock:
+            h = self.stages.get(stage)
+            if h is None: h = self.stages[stage] = [0] * (len(BUCKETS) + 1) + [0.0]
+            h[bisect_left(BUCKETS, secs)] += 1
+            h[-1] += secs
+
+    def add(self, name: str, n: float = 1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def error(self, stage: str):
+        with self.lock: self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def to_json(self) -> Dict[str, Any]:
+        with self.lock:
+            stages = {k: {"count": sum(h[:-1]), "sum_s": round(h[-1], 6),
+                          "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h[:-1]))} for k, h in self.stages.items()}
+            return {"stages": stages, "counters": dict(self.counters), "errors": dict(self.errors)}
+
+    def to_prometheus(self) -> str:
+        esc = lambda s: s.replace("\\", "\\\\").replace('"', '\\"')
+        out = ["# TYPE reliscore_stage_seconds histogram"]
+        with self.lock:
+            for k, h in sorted(self.stages.items()):
+                cum = 0
+                for b, c in zip([str(b) for b in BUCKETS] + ["+Inf"], h[:-1]):
+                    cum += c
+                    out.append(f'reliscore_stage_seconds_bucket{{stage="{esc(k)}",le="{b}"}} {cum}')
+                out.append(f'reliscore_stage_seconds_sum{{stage="{esc(k)}"}} {h[-1]:.6f}')
+                out.append(f'reliscore_stage_seconds_count{{stage="{esc(k)}"}} {cum}')
+            out.append("# TYPE reliscore_events_total counter")
+            out += [f'reliscore_events_total{{name="{esc(k)}"}} {v}' for k, v in sorted(self.counters.items())]
+            out.append("# TYPE reliscore_errors_total counter")
+            out += [f'reliscore_errors_total{{stage="{esc(k)}"}} {v}' for k, v in sorted(self.errors.items())]
+        return "\n".join(out) + "\n"
+
+REGISTRY = Registry()
+
+class Span:
+    # secs is the span's own time: wall time minus any stretch it spent paused (handed to a stream's consumer).
+    __slots__ = ("trace", "name", "t0", "secs", "children", "error", "lock", "_token", "idle", "_paused")
+    def __init__(self, trace: "Trace", name: str):
+        self.trace, self.name = trace, name
+        self.t0, self.secs = time.perf_counter(), None
+        self.idle, self._paused = 0.0, None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self.lock = threading.Lock()
+
+    def child(self, name: str) -> "Span":
+        sp = Span(self.trace, name)
+        with self.lock: self.children.append(sp)
+        return sp
+
+    def pause(self):
+        if self._paused is None: self._paused = time.perf_counter()
+
+    def resume(self):
+        if self._paused is not None:
+            self.idle += time.perf_counter() - self._paused
+            self._paused = None
+
+    def _elapsed(self) -> float:
+        now = time.perf_counter()
+        return now - self.t0 - self.idle - (now - self._paused if self._paused is not None else 0.0)
+
+    def end(self):
+        if self.secs is None:
+            self.secs = self._elapsed()
+            REGISTRY.observe(self.name, self.secs)
+
+    def __enter__(self) -> "Span":
+        self._token = _CURRENT.set((self.trace, self))
+        return self
+
+    def __exit__(self, et, e, tb):
+        _CURRENT.reset(self._token)
+        if e is not None:
+            self.error = f"{et.__name__}: {e}"  # counted by whoever handles it, via Trace.error
+        self.end()
+        return False
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        d = {"name": self.name, "start_ms": round((self.t0 - origin) * 1000, 2),
+             "ms": round((self.secs if self.secs is not None else self._elapsed()) * 1000, 2)}
+        if self.secs is None: d["open"] = True  # e.g. a source that outlived the retrieval deadline
+        if self.error: d["error"] = self.error
+        if self.children: d["children"] = [c.to_dict(origin) for c in list(self.children)]
+        return d
+
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("reli_trace", default=None)
+
+class Trace:
+    # One claim's span tree and counters; spans opened in pool threads attach through wrap().
+    def __init__(self, name: str = "process_claim"):
+        self.root = Span(self, name)
+        self.counters: Dict[str, float] = {}
+        self.errors: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        _ensure_server()
+
+    def _parent(self) -> Span:
+        cur = _CURRENT.get()
+        return cur[1] if cur is not None and cur[0] is self else self.root
+
+    def span(self, name: str) -> Span:
+        return self._parent().child(name)
+
+    def start(self, name: str) -> Span:
+        # For stages that yield mid-way: call .end() explicitly instead of using `with`.
+        return self._parent().child(name)
+
+    def emit(self, event: Any, *spans: Span) -> Iterator[Any]:
+        # `yield from tr.emit(event, *open_spans)` in a stream: the root and the given spans are paused while the
+        # consumer has the event, so stage timings leave out consumer time.
+        spans = (self.root,) + spans
+        for sp in spans: sp.pause()
+        try:
+            yield event
+        finally:
+            for sp in spans: sp.resume()
+
+    def wrap(self, name: str, fn: Callable, parent: Optional[Span] = None) -> Callable:
+        # Runs fn under a child span of `parent` (default: the span open where it is called) in whatever thread calls it;
+        # counters inside land on this trace.
+        def run(*a, **kw):
+            with (parent or self._parent()).child(name):
+                return fn(*a, **kw)
+        return run
+
+    def count(self, name: str, n: float = 1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+        REGISTRY.add(name, n)
+
+    def error(self, stage: str, e: BaseException, log: bool = True):
+        with self.lock: self.errors[stage] = self.errors.get(stage, 0) + 1
+        REGISTRY.error(stage)
+        if log: logger.opt(exception=e).warning(f"[trace] {stage} failed: {type(e).__name__}: {e}")
+
+    def finish(self) -> Dict[str, Any]:
+        self.root.end()
+        REGISTRY.add("claims")
+        t = {"total_ms": round(self.root.secs * 1000, 2), "spans": self.root.to_dict(self.root.t0).get("children", []),
+             "counters": dict(self.counters), "errors": dict(self.errors)}
+        logger.bind(timings=t).info(f"[trace] {self.root.name} {t['total_ms']:.0f}ms " +
+                                    " ".join(f"{s['name']}={s['ms']:.0f}ms" for s in t["spans"]) +
+                                    (f" errors={t['errors']}" if t["errors"] else ""))
+        return t
+
+class _NullSpan:
+    def child(self, name): return self
+    def end(self): pass
+    def pause(self): pass
+    def resume(self): pass
+    def __enter__(self): return self
+    def __exit__(self, et, e, tb): return False
+
+class _NullTrace:
+    # What new_trace() hands out with RELI_TRACE=0: every call is a constant-time no-op, errors are still logged.
+    _span = _NullSpan()
+    counters: Dict[str, float] = {}
+    errors: Dict[str, int] = {}
+    def span(self, name): return self._span
+    def start(self, name): return self._span
+    def wrap(self, name, fn, parent=None): return fn
+    def emit(self, event, *spans): yield event
+    def count(self, name, n=1): pass
+    def error(self, stage, e, log=True):
+        if log: logger.opt(exception=e).debug(f"[trace] {stage} failed: {type(e).__name__}: {e}")
+    def finish(self): return {}
+
+NULL_TRACE = _NullTrace()
+
+def new_trace(name: str = "process_claim"):
+    return Trace(name) if TRACE else NULL_TRACE
+
+def count(name: str, n: float = 1):
+    # For library code (http_client, caches): attributes to the current claim's trace if there is one.
+    if not TRACE: return
+    cur = _CURRENT.get()
+    if cur is not None: cur[0].count(name, n)
+    else: REGISTRY.add(name, n)
+
+def metrics_text() -> str:
+    return REGISTRY.to_prometheus()
+
+def metrics_json() -> Dict[str, Any]:
+    return REGISTRY.to_json()
+
+_SERVER = None
+_SERVER_TRIED = False
+_SERVER_LOCK = threading.Lock()
+
+def serve_metrics(port: int = METRICS_PORT, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    global _SERVER
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a): pass
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, ctype = json.dumps(metrics_json()).encode("utf-8"), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = metrics_text().encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_response(404); self.send_header("Content-Length", "0"); self.end_headers(); return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host, port), Handler)
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, daemon=True, name="reli-metrics").start()
+            logger.info(f"[trace] metrics on http://{host}:{_SERVER.server_port}/metrics")
+        return _SERVER
+
+def _ensure_server():
+    global _SERVER_TRIED
+    if METRICS_PORT and not _SERVER_TRIED:
+        _SERVER_TRIED = True
+        try:
+            serve_metrics(METRICS_PORT)
+        except OSError as e:
+            # another process (e.g. a second Streamlit worker) already owns the port
+            logger.debug(f"[trace] metrics server not started: {e}")
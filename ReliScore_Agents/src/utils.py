@@ -24,30 +24,12 @@ def load_json(path: Path) -> Optional[Any]:
     return None
 
 def get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[requests.Response], Optional[str]]:
-    try:
-        res = requests.get(url, params=params, headers=headers, timeout=HTTP_TIMEOUT)
-        if res.status_code == 200:
-            return res, None
-        return None, f"HTTP {res.status_code} for {url}"
-    except Exception as e:
-        return None, str(e)
+    from .http_client import get as pooled_get
+    return pooled_get(url, params=params, headers=headers)
 
 def redact_email(text: str) -> str:
     return re.sub(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", "[redacted-email]", text or "")
 
-def dedupe_list(items):
-    seen = set()
-    out = []
-    for x in items:
-        try:
-            k = json.dumps(x, sort_keys=True, default=str)
-        except Exception:
-            k = str(x)
-        if k not in seen:
-            seen.add(k)
-            out.append(x)
-    return out
-
 def safe_int(x, default=None):
     try:
         return int(x)
@@ -58,12 +40,9 @@ def now_ts() -> int:
     return int(time.time())
 
 def log_idempotent(path: Path, key: str) -> bool:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    if not path.exists():
-        path.write_text("", encoding="utf-8")
-    existing = set(line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip())
-    if key in existing:
-        return False
-    with path.open("a", encoding="utf-8") as f:
-        f.write(key + "\n")
-    return True
+    from .idempotency import index_for
+    return index_for(path).check_and_mark(key)
+
+def log_idempotent_many(path: Path, keys) -> list:
+    from .idempotency import index_for
+    return index_for(path).check_and_mark_many(keys)
@@ -0,0 +1,341 @@
+import os, re, math, zlib, shutil, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+from .utils import sha1, cache_path
+from .config import load_run_config
+from .dedupe import canonical_keys
+from .evidence_index import tokenize
+from .tracing import count
+
+VCFG = load_run_config().get("vectors", {})
+# Off by default: retrieved items are only embedded (and stored under data_cache/vectors) when VECTORS=1.
+VECTORS = os.environ.get("VECTORS", "0") != "0"
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND") or VCFG.get("backend", "hashing")
+# The hashing backend is lexical, so its similarity is not blended into ranking; only a model backend
+# (sentence-transformers, openai, or one registered by name) re-orders results.
+RELEVANCE = VECTORS and EMBED_BACKEND != "hashing"
+MAX_TEXT = 2000
+# The ANN lists cover the rows present at the last build; newer rows are scanned exactly until they outgrow this share.
+ANN_TAIL_MAX = float(os.environ.get("ANN_TAIL_MAX", "0.25"))
+ANN_MIN_ROWS = 4096  # below this an exact scan is as fast as probing lists
+
+def item_text(x: Dict) -> str:
+    # What an evidence record is embedded as: title plus the start of its abstract.
+    return (f"{x.get('title') or ''}. {x.get('abstract') or ''}").strip(" .")[:MAX_TEXT]
+
+def _normalize(v: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.where(n > 0, n, 1.0)
+
+# --- backends: embed(texts) -> (n, dim) float32; `key` names the cache namespace, so switching model never mixes vectors
+class HashingEmbedder:
+    # Offline default: signed feature hashing of word unigrams and bigrams, sublinear tf, L2-normalized. Lexical rather
+    # than semantic, but free, deterministic and dependency-free; plug in a model backend for real semantic similarity.
+    def __init__(self, model: str = "", dim: int = 384):
+        self.dim, self.batch_size = int(dim or 384), 4096
+        self.key = f"hashing-{self.dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            toks = tokenize(t)
+            feats = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+            if not feats: continue
+            h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.uint32, count=len(feats))
+            v = np.bincount(h % self.dim, weights=np.where(h >> 31, -1.0, 1.0), minlength=self.dim)
+            out[i] = np.sign(v) * np.log1p(np.abs(v))
+        return _normalize(out)
+
+class SentenceTransformerEmbedder:
+    # Local model via sentence-transformers (optional dependency); runs offline once the model is in the HF cache.
+    def __init__(self, model: str = "", dim: int = 0):
+        from sentence_transformers import SentenceTransformer
+        self.name = model or "sentence-transformers/all-MiniLM-L6-v2"
+        self.model = SentenceTransformer(self.name)
+        self.dim, self.batch_size = self.model.get_sentence_embedding_dimension(), 64
+        self.key = f"st-{self.name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+class OpenAIEmbedder:
+    # OPENAI_EMBED_MODEL through the embeddings endpoint, up to batch_size texts per request.
+    def __init__(self, model: str = "", dim: int = 0):
+        from openai import OpenAI
+        self.name = model or os.environ.get("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+        self.client = OpenAI(base_url=os.environ.get("OPENAI_BASE_URL") or None)
+        # text-embedding-3 models can be shortened server-side; older models have a fixed width
+        self.params = {"dimensions": int(dim)} if dim and self.name.startswith("text-embedding-3") else {}
+        self.dim = int(dim) if self.params else {"text-embedding-3-large": 3072}.get(self.name, 1536)
+        self.batch_size = 256
+        self.key = f"openai-{self.name}-{self.dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        res = self.client.embeddings.create(model=self.name, input=texts, **self.params)
+        return _normalize(np.array([d.embedding for d in sorted(res.data, key=lambda d: d.index)], dtype=np.float32))
+
+BACKENDS: Dict[str, Callable[..., object]] = {
+    "hashing": HashingEmbedder, "sentence-transformers": SentenceTransformerEmbedder, "openai": OpenAIEmbedder,
+}
+
+def register_backend(name: str, factory: Callable[..., object]):
+    # factory(model, dim) -> object with key, dim, batch_size and embed(texts) -> (n, dim) float32 array.
+    BACKENDS[name] = factory
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 8, seed: int = 0) -> np.ndarray:
+    # Spherical k-means (unit vectors, dot-product assignment) -> (k, dim) unit centroids.
+    rng = np.random.default_rng(seed)
+    c = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        a = np.argmax(x @ c.T, axis=1)
+        order = np.argsort(a, kind="stable")
+        sizes = np.bincount(a, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        nz = sizes > 0
+        c[nz] = np.add.reduceat(x[order], starts[nz], axis=0)
+        c = _normalize(c)
+    return c
+
+class VectorStore:
+    # Embeddings by text hash: rows of one float16 matrix file, memory-mapped, with the hash -> row map in SQLite. Only
+    # texts not seen before go to the backend (in batches), so cost follows new texts, not corpus size. Rows carry a ref
+    # (a record's canonical key) and are searchable through an IVF index over the same matrix; texts without one
+    # (queries) are embedded but never stored, so one-off queries don't grow the matrix.
+    def __init__(self, root: Path, backend=None):
+        self.backend = backend or BACKENDS[EMBED_BACKEND](VCFG.get("model", ""), VCFG.get("dim", 384))
+        self.dim = self.backend.dim
+        self.root = Path(root) / re.sub(r"[^\w.-]+", "_", self.backend.key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / "vectors.f16"
+        self.path.touch(exist_ok=True)
+        self._local = threading.local()
+        self._mm: Optional[np.memmap] = None
+        self._mm_lock = threading.Lock()
+        self._ivf = None  # (generation, centroids, indptr, rows)
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reli-ann")
+        self._build_pending = threading.Event()
+        c = self._conn()
+        c.execute("CREATE TABLE IF NOT EXISTS vecs (hash TEXT PRIMARY KEY, row INTEGER, ref TEXT, ivf INTEGER DEFAULT 0) WITHOUT ROWID")
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS vecs_row ON vecs(row)")
+        c.execute("CREATE INDEX IF NOT EXISTS vecs_tail ON vecs(row) WHERE ref IS NOT NULL AND ivf=0")
+        c.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER)")
+        c.executemany("INSERT OR IGNORE INTO meta (k, v) VALUES (?, 0)", [("rows",), ("ivf_gen",)])
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(str(self.root / "vectors.sqlite"), timeout=60, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _matrix(self, need: int) -> np.ndarray:
+        # (rows, dim) float16 view of the file, remapped when it has grown past what we have mapped.
+        with self._mm_lock:
+            if self._mm is None or len(self._mm) < need:
+                n = self.path.stat().st_size // (2 * self.dim)
+                self._mm = np.memmap(self.path, dtype=np.float16, mode="r", shape=(n, self.dim)) if n else np.zeros((0, self.dim), np.float16)
+            return self._mm
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, Tuple[int, Optional[str]]]:
+        out = {}
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            out.update((h, (r, ref)) for h, r, ref in self._conn().execute(
+                f"SELECT hash, row, ref FROM vecs WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+        return out
+
+    def _append(self, hashes: List[str], vecs: np.ndarray, refs: List[Optional[str]]) -> Dict[str, int]:
+        # Rows are allocated and written under the SQLite write lock, so processes sharing the file never overlap.
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            known = self._lookup(hashes)  # another writer may have added some meanwhile
+            new = [i for i, h in enumerate(hashes) if h not in known]
+            first = c.execute("SELECT v FROM meta WHERE k='rows'").fetchone()[0]
+            if new:
+                with open(self.path, "r+b") as f:
+                    f.seek(first * 2 * self.dim)
+                    f.write(np.ascontiguousarray(vecs[new], dtype=np.float16).tobytes())
+                c.executemany("INSERT INTO vecs (hash, row, ref) VALUES (?,?,?)",
+                              ((hashes[i], first + j, refs[i]) for j, i in enumerate(new)))
+                c.execute("UPDATE meta SET v=? WHERE k='rows'", (first + len(new),))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        out = {h: r for h, (r, _) in known.items()}
+        out.update((hashes[i], first + j) for j, i in enumerate(new))
+        return out
+
+    def embed(self, texts: Sequence[str], refs: Optional[Sequence[Optional[str]]] = None) -> np.ndarray:
+        # (n, dim) float32 unit vectors. Cached texts are read from the matrix; the rest are embedded once, in batches.
+        texts = [(t or "")[:MAX_TEXT] for t in texts]
+        if not texts: return np.zeros((0, self.dim), dtype=np.float32)
+        refs = list(refs) if refs is not None else [None] * len(texts)
+        hashes = [sha1(" ".join(t.split())) for t in texts]
+        found = self._lookup(list(dict.fromkeys(hashes)))
+        rows = {h: r for h, (r, _) in found.items()}
+        count("vectors.cache_hits", sum(1 for h in hashes if h in rows))
+        todo: Dict[str, Tuple[str, Optional[str]]] = {}
+        for h, t, ref in zip(hashes, texts, refs):
+            if h not in rows and (h not in todo or ref and not todo[h][1]): todo[h] = (t, ref)
+        # a cached text that is now also a record gains its ref and becomes searchable
+        give = [(ref, h) for h, ref in dict(zip(hashes, refs)).items() if ref and h in found and found[h][1] is None]
+        if give:
+            self._conn().executemany("UPDATE vecs SET ref=? WHERE hash=? AND ref IS NULL", give)
+        transient: Dict[str, np.ndarray] = {}
+        if todo:
+            hs = list(todo)
+            bs = self.backend.batch_size
+            for i in range(0, len(hs), bs):
+                chunk = hs[i:i + bs]
+                vecs = self.backend.embed([todo[h][0] for h in chunk])
+                count("vectors.embedded", len(chunk)); count("vectors.batches")
+                keep = [j for j, h in enumerate(chunk) if todo[h][1]]
+                if keep:
+                    rows.update(self._append([chunk[j] for j in keep], vecs[keep], [todo[chunk[j]][1] for j in keep]))
+                # rounded like a stored row, so a text scores the same whether or not it is in the matrix
+                transient.update((h, v) for h, v in zip(chunk, np.asarray(vecs, dtype=np.float16).astype(np.float32)) if not todo[h][1])
+        out = np.empty((len(hashes), self.dim), dtype=np.float32)
+        at = [i for i, h in enumerate(hashes) if h in rows]
+        if at:
+            idx = np.fromiter((rows[hashes[i]] for i in at), dtype=np.int64, count=len(at))
+            out[at] = self._matrix(int(idx.max()) + 1)[idx]
+        for i, h in enumerate(hashes):
+            if h not in rows: out[i] = transient[h]
+        return _normalize(out)
+
+    def add_items(self, items: List[Dict]) -> int:
+        # Embeds records (keyed by their first canonical key) so neighbors() can return them.
+        pairs = [(item_text(x), ks[0]) for x in items if (ks := canonical_keys(x))]
+        pairs = [(t, k) for t, k in pairs if t]
+        if pairs:
+            self.embed([t for t, _ in pairs], [k for _, k in pairs])
+            self.schedule_build()
+        return len(pairs)
+
+    # --- ANN (IVF-flat over the float16 matrix)
+    def _load_ivf(self):
+        gen = self._conn().execute("SELECT v FROM meta WHERE k='ivf_gen'").fetchone()[0]
+        if gen and (self._ivf is None or self._ivf[0] != gen):
+            p = self.root / f"ivf.{gen}"
+            if (p / "centroids.npy").exists():
+                self._ivf = (gen,) + tuple(np.load(p / f"{n}.npy", mmap_mode="r") for n in ("centroids", "indptr", "rows"))
+        return self._ivf
+
+    def schedule_build(self):
+        if self._build_pending.is_set(): return
+        self._build_pending.set()
+        def run():
+            self._build_pending.clear()
+            try:
+                self.maybe_build()
+            except Exception as e:
+                logger.warning(f"[vectors] ANN build failed: {type(e).__name__}: {e}")
+        self._builder.submit(run)
+
+    def maybe_build(self) -> bool:
+        c = self._conn()
+        tail = c.execute("SELECT COUNT(*) FROM vecs WHERE ref IS NOT NULL AND ivf=0").fetchone()[0]
+        ivf = self._load_ivf()
+        covered = len(ivf[3]) if ivf else 0
+        if tail + covered < ANN_MIN_ROWS or tail <= ANN_TAIL_MAX * covered: return False
+        self.build(); return True
+
+    def build(self):
+        # Retrains the coarse quantizer on all searchable rows (~sqrt(n) lists) and publishes a new IVF generation.
+        c = self._conn()
+        rows = np.array([r for (r,) in c.execute("SELECT row FROM vecs WHERE ref IS NOT NULL ORDER BY row")], dtype=np.int64)
+        if not len(rows): return
+        m = self._matrix(int(rows.max()) + 1)
+        nlist = max(1, min(4096, int(math.sqrt(len(rows)))))
+        rng = np.random.default_rng(0)
+        sample = rows if len(rows) <= 256 * nlist else np.sort(rng.choice(rows, 256 * nlist, replace=False))
+        cent = _kmeans(_normalize(np.asarray(m[sample], dtype=np.float32)), nlist)
+        assign = np.empty(len(rows), dtype=np.int64)
+        for s in range(0, len(rows), 65536):
+            assign[s:s + 65536] = np.argmax(np.asarray(m[rows[s:s + 65536]], dtype=np.float32) @ cent.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        indptr = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=indptr[1:])
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            gen = c.execute("SELECT v FROM meta WHERE k='ivf_gen'").fetchone()[0] + 1
+            p = self.root / f"ivf.{gen}"
+            p.mkdir(parents=True, exist_ok=True)
+            np.save(p / "centroids.npy", cent.astype(np.float32)); np.save(p / "indptr.npy", indptr); np.save(p / "rows.npy", rows[order])
+            c.executemany("UPDATE vecs SET ivf=1 WHERE row=?", ((r,) for r in rows.tolist()))
+            c.execute("UPDATE meta SET v=? WHERE k='ivf_gen'", (gen,))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        for old in self.root.glob("ivf.*"):
+            if old.name != f"ivf.{gen}": shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"[vectors] ANN rebuilt: {len(rows)} rows in {nlist} lists")
+
+    def neighbors(self, text: str, k: int = 20, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        # Approximate top-k refs by cosine: probe the nprobe closest lists, plus an exact scan of rows added since the build.
+        q = self.embed([text])[0]
+        ivf = self._load_ivf()
+        tail = np.array([r for (r,) in self._conn().execute("SELECT row FROM vecs WHERE ref IS NOT NULL AND ivf=0")], dtype=np.int64)
+        cand = [tail]
+        if ivf is not None:
+            _, cent, indptr, rows = ivf
+            nprobe = min(len(cent), nprobe or VCFG.get("nprobe", 16))
+            lists = np.argpartition(-(cent @ q), nprobe - 1)[:nprobe]
+            cand += [rows[indptr[l]:indptr[l + 1]] for l in lists]
+        cand = np.concatenate(cand)
+        if not len(cand): return []
+        m = self._matrix(int(cand.max()) + 1)
+        sims = np.asarray(m[cand], dtype=np.float32) @ q
+        top = np.argsort(-sims)[:4 * k]
+        picked = {int(cand[i]): float(sims[i]) for i in top}
+        refs = {}
+        ids = list(picked)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            refs.update(self._conn().execute(f"SELECT row, ref FROM vecs WHERE row IN ({','.join('?' * len(chunk))})", chunk))
+        out: Dict[str, float] = {}
+        for r in ids:
+            ref = refs.get(r)
+            if ref and ref not in out: out[ref] = picked[r]  # an updated record may hold several rows
+        return sorted(out.items(), key=lambda kv: -kv[1])[:k]
+
+    def relevance(self, query: str, items: List[Dict]) -> np.ndarray:
+        # Cosine similarity of each item to the query, clipped to [0, 1].
+        if not items: return np.zeros(0)
+        # items are stored under their record key, as add_items would; the query is embedded without being stored
+        texts = [item_text(x) for x in items]
+        refs = [next(iter(canonical_keys(x)), None) if t else None for x, t in zip(items, texts)]
+        v = self.embed([query] + texts, [None] + refs)
+        return np.clip(v[1:] @ v[0], 0.0, 1.0).astype(np.float64)
+
+    def stats(self) -> Dict:
+        rows, refs, tail = self._conn().execute(
+            "SELECT COUNT(*), COUNT(ref), COALESCE(SUM(ref IS NOT NULL AND ivf=0), 0) FROM vecs").fetchone()
+        ivf = self._load_ivf()
+        return {"backend": self.backend.key, "dim": self.dim, "rows": rows, "searchable": refs, "ann_tail": tail,
+                "ann_lists": len(ivf[1]) if ivf else 0}
+
+def annotate_relevance(query: str, items: List[Dict]) -> List[Dict]:
+    # Sets "_relevance" on each item, which score_batch blends into the ranking score.
+    for x, r in zip(items, vector_store().relevance(query, items).tolist()):
+        x["_relevance"] = round(r, 4)
+    return items
+
+_STORE: Optional[VectorStore] = None
+_STORE_LOCK = threading.Lock()
+
+def vector_store() -> VectorStore:
+    # Process-wide store under data_cache/vectors, one subdirectory per backend/model.
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = VectorStore(cache_path("vectors"))
+        return _STORE
@@ -1,5 +1,7 @@
+from concurrent.futures import Future
 from typing import List, Dict
 import matplotlib.pyplot as plt
+from .render import render_many
 
 def beeswarm_like(study_points: List[Dict]):
     xs = [i for i,_ in enumerate(study_points)]
@@ -46,3 +48,9 @@ def timeline(study_points: List[Dict]):
     ax.fill_between(xs, [y*0.9 for y in ys], [y*1.1 for y in ys], alpha=0.2)
     ax.set_xlabel("Year"); ax.set_ylabel("Score"); ax.set_title("Evidence Timeline")
     return fig
+
+EVIDENCE_PLOTS = {"beeswarm": beeswarm_like, "forest_plot": forest_plot, "timeline": timeline}
+
+def evidence_images(study_points: List[Dict], fmt: str = "png", dpi: int = 100) -> Dict[str, Future]:
+    # Image bytes per plot, rendered (and the figure closed) in render's pool; show them with st.image(fut.result()).
+    return render_many(EVIDENCE_PLOTS, study_points, fmt, dpi)
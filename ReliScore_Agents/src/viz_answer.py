@@ -1,7 +1,9 @@
+from concurrent.futures import Future
 from typing import List, Dict
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D  # noqa: F401
 import math
+from .render import render_many
 
 def _split_counts(study_points: List[Dict]):
     by_src = {}
@@ -78,3 +80,10 @@ def evidence_galaxy_3d(study_points: List[Dict]):
     ax.set_xlabel("Year"); ax.set_ylabel("Quality (score)"); ax.set_zlabel("log(effect)")
     ax.set_title("Evidence Galaxy (3D)")
     return fig
+
+# Keyed like captions_from_insights, so each image pairs with its caption.
+ANSWER_PLOTS = {"reli_graph": reli_graph, "trust_compass": trust_compass, "timeline_ribbon": timeline_ribbon, "evidence_galaxy": evidence_galaxy_3d}
+
+def answer_images(study_points: List[Dict], fmt: str = "png", dpi: int = 100) -> Dict[str, Future]:
+    # Image bytes per plot, rendered (and the figure closed) in render's pool; show them with st.image(fut.result()).
+    return render_many(ANSWER_PLOTS, study_points, fmt, dpi)
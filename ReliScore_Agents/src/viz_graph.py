@@ -1,7 +1,28 @@
 from typing import Dict
+from collections import OrderedDict
 import matplotlib.pyplot as plt
 import networkx as nx
-import io, base64
+import io, base64, json, hashlib, threading
+
+LAYOUT_CACHE_SIZE = 256
+_LAYOUTS: "OrderedDict[str, Dict]" = OrderedDict()
+_LAYOUTS_LOCK = threading.Lock()
+
+def _layout(g: nx.Graph) -> Dict:
+    # spring_layout is seeded, so the same neighborhood always lands on the same positions; reuse them.
+    key = hashlib.sha1(json.dumps([sorted(map(str, g.nodes())), sorted(sorted(map(str, e)) for e in g.edges())]).encode("utf-8")).hexdigest()
+    with _LAYOUTS_LOCK:
+        pos = _LAYOUTS.get(key)
+        if pos is not None:
+            _LAYOUTS.move_to_end(key)
+            return pos
+    # computed outside the lock; two threads racing on one key compute the same seeded layout
+    pos = nx.spring_layout(g, seed=42, k=0.6)
+    with _LAYOUTS_LOCK:
+        _LAYOUTS[key] = pos
+        while len(_LAYOUTS) > LAYOUT_CACHE_SIZE:
+            _LAYOUTS.popitem(last=False)
+    return pos
 
 def draw_neighborhood(neighborhood: Dict, out_path: str) -> str:
     nodes = neighborhood.get("nodes") or []
@@ -15,7 +36,7 @@ def draw_neighborhood(neighborhood: Dict, out_path: str) -> str:
     g.add_nodes_from(nodes)
     for u,v,rel in edges:
         g.add_edge(u,v,rel=rel)
-    pos = nx.spring_layout(g, seed=42, k=0.6)
+    pos = _layout(g)
     fig, ax = plt.subplots(figsize=(5,4))
     nx.draw_networkx_nodes(g, pos, node_size=300, ax=ax)
     nx.draw_networkx_labels(g, pos, font_size=8, ax=ax)
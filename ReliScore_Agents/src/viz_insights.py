@@ -1,19 +1,14 @@
 from typing import List, Dict, Tuple, Optional
-import math
-from statistics import mean
+from .study_points import as_table
+from .meta import median_log_effect
+from .ranking import TIER_WEIGHT
 
 def _counts(study_points: List[Dict]) -> Dict[str,int]:
-    supp = sum(1 for s in study_points if (s.get("direction") or "").lower()=="supports")
-    refu = sum(1 for s in study_points if (s.get("direction") or "").lower()=="refutes")
-    uncl = len(study_points) - supp - refu
-    return {"supports": supp, "refutes": refu, "unclear": max(0, uncl)}
+    supp, refu, uncl = as_table(study_points).counts()
+    return {"supports": supp, "refutes": refu, "unclear": uncl}
 
 def _years_and_scores(study_points: List[Dict]) -> Tuple[list, list]:
-    pts = [(s.get("year"), s.get("_score",0)) for s in study_points if s.get("year")]
-    pts = sorted(pts)
-    if not pts: return [], []
-    xs = [x for x,_ in pts]; ys = [y for _,y in pts]
-    return xs, ys
+    return as_table(study_points).years_and_scores()
 
 def _slope(xs: list, ys: list) -> Optional[float]:
     n = len(xs)
@@ -23,30 +18,21 @@ def _slope(xs: list, ys: list) -> Optional[float]:
     den = sum((x-xbar)**2 for x in xs) or 1e-9
     return num/den
 
-def _effects(study_points: List[Dict]):
-    vals = []
-    for s in study_points:
-        e = s.get("effect")
-        if isinstance(e, dict) and isinstance(e.get("value"), (int,float)) and e["value"]>0:
-            vals.append(e["value"])
-    return vals
-
 def insights(study_points: List[Dict], verdict: Dict) -> Dict:
+    study_points = as_table(study_points)
     n = len(study_points); counts = _counts(study_points)
     consensus = (counts["supports"] / n) if n>0 else 0.0
     xs, ys = _years_and_scores(study_points)
     trend = _slope(xs, ys)
-    effs = _effects(study_points); has_fx = len(effs) > 0
-    if has_fx:
-        log_vals = [math.log(v) for v in effs if v>0]
-        med_log = sorted(log_vals)[len(log_vals)//2] if log_vals else 0.0
-    else:
-        med_log = 0.0
-    avg_score = mean([s.get("_score",0) for s in study_points]) if n else 0.0
+    has_fx = bool((study_points.effect_value > 0).any())
+    med_log = median_log_effect(study_points.effect_value)
+    avg_score = study_points.avg_score()
+    tiers = study_points.tier_counts()
+    top_tier = max(tiers, key=lambda t: TIER_WEIGHT.get(t, 0.0)) if tiers else None
     label = (verdict or {}).get("label","Unclear")
     return {"n": n, "supports": counts["supports"], "refutes": counts["refutes"], "unclear": counts["unclear"],
             "consensus": consensus, "avg_score": avg_score, "trend_slope": trend, "has_effects": has_fx,
-            "median_log_effect": med_log, "label": label}
+            "median_log_effect": med_log, "label": label, "tiers": tiers, "top_tier": top_tier}
 
 def captions_from_insights(ins: Dict) -> Dict[str, str]:
     if ins["n"] == 0: reli_take = "No evidence found to split."
@@ -64,6 +50,8 @@ def captions_from_insights(ins: Dict) -> Dict[str, str]:
     if ins["label"] == "Supported": tc_take += " Studies cluster toward agreement."
     elif ins["label"] == "Contradicted": tc_take += " Studies cluster toward disagreement."
     elif ins["label"] == "Mixed": tc_take += " Agreement is split."
+    if ins.get("top_tier") in TIER_WEIGHT:
+        tc_take += f" Strongest design: {ins['top_tier'].replace('_', ' ')} ({ins['tiers'][ins['top_tier']]} of {ins['n']})."
 
     if ins["trend_slope"] is None: tl_take = "Not enough dated studies to assess trends."
     elif ins["trend_slope"] > 0.01: tl_take = "Evidence quality trends upward over time."
@@ -1,4 +1,7 @@
-import re
+import os, re, json, time, heapq, itertools, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.lexicon import Lexicon
 
 PII_PATTERNS = [
     r'\b\d{3}-\d{2}-\d{4}\b',          # SSN
@@ -6,9 +9,152 @@ PII_PATTERNS = [
     r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}',  # email
     r'\b\d{5}(?:-\d{4})?\b',           # US ZIP
 ]
+PII_TYPES = ["SSN", "PHONE", "EMAIL", "ZIP"]
+REPLACEMENT = "[REDACTED]"
+# Longer than any single match we expect (an email is at most 254 chars), so a match can't straddle a stream cut.
+STREAM_OVERLAP = int(os.getenv("REDACT_STREAM_OVERLAP", "1024"))
+_CTX = 16
+# Optional names/MRN/facility lexicon, built with `python -m utils.lexicon entries.txt lexicon.npz`.
+REDACT_LEXICON = os.getenv("REDACT_LEXICON", "")
+_LEXICON: Optional[Lexicon] = None
+_LEXICON_LOCK = threading.Lock()
 
-def redact_phi(text: str) -> str:
-    out = text
-    for p in PII_PATTERNS:
-        out = re.sub(p, "[REDACTED]", out)
-    return out
+# One alternation; at a given offset the earlier pattern in PII_PATTERNS wins.
+_RX = re.compile("|".join(f"(?P<{t}>{p})" for t, p in zip(PII_TYPES, PII_PATTERNS)))
+# Every pattern lives inside a run of [\w.%+@-] and needs a digit or an '@'. Finding those runs is a fast
+# charset scan, and matching the alternation only inside them gives the same matches as scanning everything.
+_HIT = re.compile(r"[\d@][\w.%+@-]*")
+_RUN_CHAR = re.compile(r"[\w.%+@-]")
+
+def _matches(text: str, pos: int = 0) -> Iterator[re.Match]:
+    n = len(text)
+    while pos < n:
+        h = _HIT.search(text, pos)
+        if h is None: return
+        s, e = h.start(), h.end()
+        while s > pos and _RUN_CHAR.match(text, s - 1): s -= 1
+        yield from _RX.finditer(text, s, e)
+        pos = e
+
+def default_lexicon() -> Optional[Lexicon]:
+    global _LEXICON
+    if not REDACT_LEXICON: return None
+    with _LEXICON_LOCK:
+        if _LEXICON is None:
+            _LEXICON = Lexicon.load(REDACT_LEXICON)
+        return _LEXICON
+
+def _hits(text: str, pos: int, lexicon: Optional[Lexicon]) -> Iterator[Tuple[int, int, str]]:
+    # (start, end, type) in order; pattern and lexicon hits that overlap are merged and keep the first one's type.
+    rx = ((m.start(), m.end(), m.lastgroup) for m in _matches(text, pos))
+    if lexicon is None:
+        yield from rx; return
+    cur = None
+    for h in heapq.merge(rx, lexicon.find(text, pos)):
+        if cur is not None and h[0] < cur[1]:
+            if h[1] > cur[1]: cur = (cur[0], h[1], cur[2])
+            continue
+        if cur is not None: yield cur
+        cur = h
+    if cur is not None: yield cur
+
+def _redact(text: str, spans: Optional[List[Dict]] = None, pos: int = 0, cut: Optional[int] = None, base: int = 0,
+            lexicon: Optional[Lexicon] = None, hits: Optional[List[Tuple[int, int, str]]] = None) -> Tuple[str, int]:
+    # Redacts text[pos:] (or up to `cut`; a match starting before it is taken whole); returns the text and where it stopped.
+    out, last = [], pos
+    for a, b, kind in (_hits(text, pos, lexicon) if hits is None else hits):
+        if cut is not None and a >= cut: break
+        out.append(text[last:a]); out.append(REPLACEMENT)
+        if spans is not None: spans.append({"type": kind, "start": base + a, "end": base + b})
+        last = b
+    end = len(text) if cut is None else max(last, cut)
+    out.append(text[last:end])
+    return "".join(out), end
+
+def redact_phi(text: str, lexicon: Optional[Lexicon] = None) -> str:
+    return _redact(text, lexicon=lexicon or default_lexicon())[0]
+
+def find_phi(text: str, offset: int = 0, lexicon: Optional[Lexicon] = None) -> List[Dict]:
+    return [{"type": k, "start": offset + a, "end": offset + b} for a, b, k in _hits(text, 0, lexicon or default_lexicon())]
+
+def redact_with_spans(text: str, lexicon: Optional[Lexicon] = None) -> Tuple[str, List[Dict]]:
+    spans: List[Dict] = []
+    return _redact(text, spans, lexicon=lexicon or default_lexicon())[0], spans
+
+def _run_start(s: str, i: int, lo: int) -> int:
+    while i > lo and _RUN_CHAR.match(s, i - 1) and _RUN_CHAR.match(s, i): i -= 1
+    return i
+
+def _stream_cut(s: str, i: int, lo: int, hits: List[Tuple[int, int, str]]) -> int:
+    # Latest point at or before i where a stream round may stop: outside any [\w.%+@-] run (every pattern match lies
+    # within one, and lexicon matching must restart on a whole token) and outside any hit, since a hit crossing the cut
+    # could overlap one only the next round sees. Returns lo when there is no such point.
+    k = len(hits)
+    while True:
+        i = _run_start(s, i, lo)
+        while k and hits[k - 1][0] >= i: k -= 1
+        if i == lo or not k or hits[k - 1][1] <= i: return i
+        i = hits[k - 1][0]
+
+def redact_stream(chunks: Iterable[str], overlap: int = STREAM_OVERLAP, lexicon: Optional[Lexicon] = None) -> Iterator[Tuple[str, List[Dict]]]:
+    # Chunks in, (redacted text, spans) out; span offsets are into the concatenated input.
+    # The last `overlap` chars are held back each round, and a few chars of committed text stay as \b context. A run
+    # or hit still open at the cut is held back whole, however long, so only such a run grows the buffer past 2 * overlap.
+    lexicon = lexicon or default_lexicon()
+    ctx, buf, base = "", "", 0
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) < 2 * overlap: continue
+        s, spans = ctx + buf, []
+        # only a hit starting before the latest possible cut can decide where the round stops
+        hits = list(itertools.takewhile(lambda h: h[0] < len(s) - overlap, _hits(s, len(ctx), lexicon)))
+        cut = _stream_cut(s, len(s) - overlap, len(ctx), hits)
+        if cut == len(ctx): continue
+        text, end = _redact(s, spans, len(ctx), cut, base - len(ctx), lexicon, hits)
+        yield text, spans
+        base += end - len(ctx)
+        ctx, buf = s[max(0, end - _CTX):end], s[end:]
+    if buf:
+        s, spans = ctx + buf, []
+        text, _ = _redact(s, spans, len(ctx), None, base - len(ctx), lexicon)
+        yield text, spans
+
+def _read_chunks(f, size: int) -> Iterator[str]:
+    while True:
+        chunk = f.read(size)
+        if not chunk: return
+        yield chunk
+
+def redact_file(src: str, dst: str, spans_path: Optional[str] = None, chunk_chars: int = 1 << 20, encoding: str = "utf-8",
+                lexicon: Optional[Lexicon] = None) -> Dict:
+    # Streams src -> dst in constant memory; spans (character offsets) optionally go to a JSONL file.
+    counts: Dict[str, int] = {t: 0 for t in PII_TYPES}
+    t0 = time.perf_counter()
+    sf = open(spans_path, "w", encoding="utf-8") if spans_path else None
+    try:
+        with open(src, "r", encoding=encoding, newline="") as fi, open(dst, "w", encoding=encoding, newline="") as fo:
+            for text, spans in redact_stream(_read_chunks(fi, chunk_chars), lexicon=lexicon):
+                fo.write(text)
+                for sp in spans:
+                    counts[sp["type"]] = counts.get(sp["type"], 0) + 1
+                    if sf: sf.write(json.dumps(sp) + "\n")
+    finally:
+        if sf: sf.close()
+    secs = time.perf_counter() - t0
+    size = os.path.getsize(src)
+    return {"bytes": size, "seconds": round(secs, 3), "mb_s": round(size / 1e6 / secs, 2) if secs else 0.0, "counts": counts}
+
+def _init_worker(lexicon_path: str):
+    global REDACT_LEXICON
+    REDACT_LEXICON = lexicon_path
+
+def redact_batch(texts: List[str], workers: Optional[int] = None, chunksize: int = 64, lexicon_path: Optional[str] = None) -> List[Tuple[str, List[Dict]]]:
+    # Many documents across worker processes; small batches stay in-process. Workers load the lexicon from disk once.
+    lexicon_path = REDACT_LEXICON if lexicon_path is None else lexicon_path
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(texts) <= chunksize:
+        lex = Lexicon.load(lexicon_path) if lexicon_path and lexicon_path != REDACT_LEXICON else None
+        return [redact_with_spans(t, lex) for t in texts]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(lexicon_path,)) as pool:
+        return list(pool.map(redact_with_spans, texts, chunksize=chunksize))
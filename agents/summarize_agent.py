@@ -1,7 +1,82 @@
-import os, time
-from openai import OpenAI
-import pdfplumber
-import PyPDF2
+import os, zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import tiktoken
+from utils.llm_client import get_gateway
+from utils.pdf_extract import extract_text
+
+LONG_DOC_TOKENS = int(os.getenv("SUMMARY_LONG_DOC_TOKENS", "6000"))
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+CHUNK_WORKERS = int(os.getenv("SUMMARY_CHUNK_WORKERS", "4"))
+
+SYSTEM_PROMPT = (
+    "You are a medical text summarizer. "
+    "Summarize the given medical report into ONLY 5–6 lines. "
+    "Be concise, professional, and focus on key clinical details."
+)
+CHUNK_PROMPT = (
+    "You are a medical text summarizer. The text is one section of a longer medical report. "
+    "Summarize it in a few sentences, keeping diagnoses, findings, medications, dates and outcomes."
+)
+REDUCE_PROMPT = (
+    "You are a medical text summarizer. Merge these section summaries of one medical report "
+    "into a single concise summary, keeping the key clinical details."
+)
+
+_ENC = None
+
+def _encoding():
+    # tiktoken fetches its BPE files on first use; offline we fall back to ~4 chars per token.
+    global _ENC
+    if _ENC is None:
+        try:
+            _ENC = tiktoken.encoding_for_model("gpt-4o-mini")
+        except Exception:
+            _ENC = False
+    return _ENC
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    return len(enc.encode(text, disallowed_special=())) if enc else len(text) // 4 + 1
+
+def _split_long(line: str, max_tokens: int) -> List[str]:
+    enc = _encoding()
+    if enc:
+        ids = enc.encode(line, disallowed_special=())
+        return [enc.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+    step = max_tokens * 4
+    return [line[i:i + step] for i in range(0, len(line), step)]
+
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    # Content-defined boundaries: once a chunk holds half the budget it may close after any line whose crc ends in 0b11,
+    # so an edit only moves the boundaries next to it and the other chunks (and their cached summaries) stay byte-identical.
+    chunks, cur, n = [], [], 0
+    for line in text.splitlines():
+        t = count_tokens(line) + 1
+        pieces = _split_long(line, max_tokens) if t > max_tokens else [line]
+        for piece in pieces:
+            t = count_tokens(piece) + 1 if len(pieces) > 1 else t
+            if cur and n + t > max_tokens:
+                chunks.append("\n".join(cur)); cur, n = [], 0
+            cur.append(piece); n += t
+            if n >= max_tokens // 2 and zlib.crc32(piece.encode("utf-8")) & 3 == 3:
+                chunks.append("\n".join(cur)); cur, n = [], 0
+    if cur:
+        chunks.append("\n".join(cur))
+    return [c for c in chunks if c.strip()]
+
+def _group(parts: List[str], max_tokens: int) -> List[List[str]]:
+    # Greedy packing for one reduce level; never a lone summary per group, so each level shrinks.
+    groups, cur, n = [], [], 0
+    for p in parts:
+        t = count_tokens(p)
+        if len(cur) >= 2 and n + t > max_tokens:
+            groups.append(cur); cur, n = [], 0
+        cur.append(p); n += t
+    if cur:
+        if len(cur) == 1 and groups: groups[-1].extend(cur)
+        else: groups.append(cur)
+    return groups
 
 class SummarizeTool:
     def __init__(self, max_retries=2, verbose=True):
@@ -11,62 +86,45 @@ class SummarizeTool:
     def execute(self, text: str) -> str:
         return self._summarize(text)
 
-    def execute_pdf(self, pdf_path: str) -> str:
-        text = self._extract_pdf_text(pdf_path)
+    def execute_pdf(self, pdf) -> str:
+        # `pdf` is a path or the raw bytes of an upload.
+        text = self._extract_pdf_text(pdf)
         if not text.strip():
             raise ValueError("No text could be extracted from the PDF.")
         return self._summarize(text)
 
-    def _extract_pdf_text(self, pdf_path: str) -> str:
-        text = ""
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted + "\n"
-            if self.verbose:
-                print("[SummarizeTool] Extracted text with pdfplumber")
-        except Exception:
-            with open(pdf_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted + "\n"
-            if self.verbose:
-                print("[SummarizeTool] Extracted text with PyPDF2")
-        return text.strip()
+    def _extract_pdf_text(self, pdf) -> str:
+        text = extract_text(pdf)
+        if self.verbose:
+            print("[SummarizeTool] Extracted text from PDF")
+        return text
 
     def _summarize(self, text: str) -> str:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY is not set. Check your .env file.")
+        if count_tokens(text) <= LONG_DOC_TOKENS:
+            return self._complete(SYSTEM_PROMPT, text)
+        return self._summarize_long(text)
 
-        client = OpenAI(api_key=api_key)
-        models_to_try = ["gpt-4o-mini", "gpt-3.5-turbo"]
-
-        system_prompt = (
-            "You are a medical text summarizer. "
-            "Summarize the given medical report into ONLY 5–6 lines. "
-            "Be concise, professional, and focus on key clinical details."
-        )
+    def _summarize_long(self, text: str) -> str:
+        # Map: summarize chunks in parallel (temperature 0 + LLM cache, so unchanged chunks are free on re-upload).
+        # Reduce: merge summaries level by level until they fit one final call.
+        chunks = chunk_text(text)
+        if self.verbose:
+            print(f"[SummarizeTool] Long document: {len(chunks)} chunks")
+        with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as pool:
+            parts = list(pool.map(lambda c: self._complete(CHUNK_PROMPT, c, max_tokens=300, cache=True), chunks))
+            while len(parts) > 1 and count_tokens("\n\n".join(parts)) > LONG_DOC_TOKENS:
+                groups = _group(parts, CHUNK_TOKENS)
+                parts = list(pool.map(lambda g: self._complete(REDUCE_PROMPT, "\n\n".join(g), max_tokens=300, cache=True), groups))
+        return self._complete(SYSTEM_PROMPT, "\n\n".join(parts))
 
-        last_error = None
-        for model in models_to_try:
-            for attempt in range(self.max_retries):
-                try:
-                    response = client.chat.completions.create(
-                        model=model,
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": text},
-                        ],
-                    )
-                    return response.choices[0].message.content.strip()
-                except Exception as e:
-                    last_error = e
-                    if self.verbose:
-                        print(f"[SummarizeTool] Attempt {attempt+1} failed on {model}: {e}")
-                    time.sleep(2)
-        raise RuntimeError(f"Failed to summarize. Last error: {last_error}")
+    def _complete(self, system: str, user: str, max_tokens: int = 400, cache=None) -> str:
+        try:
+            return get_gateway().complete(system, user, model="gpt-4o-mini", fallbacks=["gpt-3.5-turbo"],
+                                          max_tokens=max_tokens, retries=max(0, self.max_retries - 1), cache=cache)
+        except Exception as e:
+            if self.verbose:
+                print(f"[SummarizeTool] Summarization failed: {e}")
+            raise RuntimeError(f"Failed to summarize. Last error: {e}") from e
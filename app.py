@@ -15,9 +15,7 @@ with tab1:
     if st.button("Summarize"):
         tool = SummarizeTool()
         if uploaded_file is not None:
-            with open("temp.pdf", "wb") as f:
-                f.write(uploaded_file.read())
-            out = tool.execute_pdf("temp.pdf")
+            out = tool.execute_pdf(uploaded_file.getvalue())
         elif txt.strip():
             out = tool.execute(txt)
         else:
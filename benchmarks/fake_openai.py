@@ -0,0 +1,52 @@
+import json, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+class FakeOpenAI:
+    # Minimal OpenAI-compatible /v1/chat/completions endpoint with fixed latency; point OPENAI_BASE_URL at `url`.
+    def __init__(self, latency: float = 0.05, port: int = 0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.models = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown(); self.server.server_close()
+
+    def _reply(self, body: dict) -> Tuple[bytes, int]:
+        user = body["messages"][-1]["content"]
+        text = f"Summary of {len(user)} chars: " + " ".join(user.split()[:20])
+        tokens = len(user) // 4
+        return json.dumps({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": 30, "total_tokens": tokens + 30},
+        }).encode("utf-8"), 200
+
+    def _handler(self):
+        fake = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def log_message(self, *a): pass
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+                with fake.lock:
+                    fake.calls += 1
+                    fake.models[body.get("model")] = fake.models.get(body.get("model"), 0) + 1
+                time.sleep(fake.latency)
+                out, status = fake._reply(body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers(); self.wfile.write(out)
+        return Handler
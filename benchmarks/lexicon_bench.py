@@ -0,0 +1,64 @@
+import os, re, sys, json, time, random, argparse, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.lexicon import Lexicon
+from agents.redactor_agent import redact_phi
+
+def make_entries(n: int, seed: int = 0):
+    # Mix of patient names, MRNs and facility names, roughly the shape of a real PHI lexicon.
+    rnd = random.Random(seed)
+    syl = ["an", "be", "car", "do", "el", "fa", "gri", "ho", "is", "jo", "ka", "li", "mo", "ne", "or", "pa", "qui", "ro", "sa", "ti"]
+    name = lambda: "".join(rnd.choice(syl) for _ in range(rnd.randint(2, 4))).title()
+    out = []
+    for i in range(n):
+        k = i % 10
+        if k < 7: out.append((f"{name()} {name()}", "NAME"))
+        elif k < 9: out.append((f"MRN {rnd.randint(10**6, 10**7 - 1)}", "MRN"))
+        else: out.append((f"{name()} {rnd.choice(['General', 'Memorial', 'Community'])} Hospital", "FACILITY"))
+    return out
+
+def make_text(entries, mb: int, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    words = "patient presents with acute chest pain denies fever history of hypertension follow up labs normal plan".split()
+    parts, n = [], 0
+    while n < mb * 1_000_000:
+        w = rnd.choice(entries)[0] if rnd.random() < 0.01 else rnd.choice(words)
+        parts.append(w); n += len(w) + 1
+    return " ".join(parts)
+
+def _mbs(size: int, secs: float) -> float:
+    return round(size / 1e6 / secs, 2) if secs else 0.0
+
+def run(sizes, mb: int = 8, regex_max: int = 10_000) -> list:
+    tmp = tempfile.mkdtemp(prefix="lexbench")
+    results = []
+    for n in sizes:
+        entries = make_entries(n)
+        text = make_text(entries, mb)
+        size = len(text.encode("utf-8"))
+        t0 = time.perf_counter(); lex = Lexicon.build(entries); t_build = time.perf_counter() - t0
+        path = os.path.join(tmp, f"lex{n}.npz")
+        t0 = time.perf_counter(); lex.save(path); t_save = time.perf_counter() - t0
+        t0 = time.perf_counter(); lex = Lexicon.load(path); t_load = time.perf_counter() - t0
+        t0 = time.perf_counter(); spans = lex.find(text); t_find = time.perf_counter() - t0
+        t0 = time.perf_counter(); redact_phi(text, lex); t_redact = time.perf_counter() - t0
+        row = {"entries": n, "states": len(lex), "npz_bytes": os.path.getsize(path), "build_s": round(t_build, 2),
+               "save_s": round(t_save, 2), "load_s": round(t_load, 2), "text_bytes": size, "spans": len(spans),
+               "lexicon_mb_s": _mbs(size, t_find), "redact_with_lexicon_mb_s": _mbs(size, t_redact)}
+        if n <= regex_max:
+            # What adding the lexicon to PII_PATTERNS as one big alternation would cost.
+            t0 = time.perf_counter()
+            rx = re.compile(r"\b(?:" + "|".join(re.escape(e) for e, _ in entries) + r")\b", re.IGNORECASE)
+            t_compile = time.perf_counter() - t0
+            sample = text[:1_000_000]
+            t0 = time.perf_counter(); rx.sub("[REDACTED]", sample); t_rx = time.perf_counter() - t0
+            row.update(regex_compile_s=round(t_compile, 2), regex_mb_s=_mbs(len(sample.encode("utf-8")), t_rx))
+        results.append(row)
+        print(json.dumps(row), flush=True)
+    return results
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Lexicon (token Aho-Corasick) redaction vs regex alternation across lexicon sizes.")
+    ap.add_argument("--sizes", default="1000,10000,100000,1000000")
+    ap.add_argument("--mb", type=int, default=8, help="text size per run")
+    args = ap.parse_args()
+    run([int(x) for x in args.sizes.split(",")], args.mb)
@@ -0,0 +1,67 @@
+import os, sys, time, json, argparse, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdfplumber
+import PyPDF2
+
+def legacy_extract(pdf_path: str) -> str:
+    # The pre-engine SummarizeTool._extract_pdf_text, kept verbatim for comparison.
+    text = ""
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                extracted = page.extract_text()
+                if extracted:
+                    text += extracted + "\n"
+    except Exception:
+        with open(pdf_path, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            for page in reader.pages:
+                extracted = page.extract_text()
+                if extracted:
+                    text += extracted + "\n"
+    return text.strip()
+
+def make_pdf(path: str, pages: int = 300, lines: int = 40):
+    import random
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    rnd = random.Random(0)
+    with PdfPages(path) as pp:
+        for i in range(pages):
+            fig = plt.figure(figsize=(8.5, 11))
+            for j in range(lines):
+                fig.text(0.05, 0.95 - j * 0.023, f"Page {i+1} line {j}: finding {rnd.random():.4f} dose {rnd.randint(1, 500)} mg", fontsize=8)
+            pp.savefig(fig); plt.close(fig)
+
+def _timed(fn):
+    t0 = time.perf_counter(); out = fn(); return out, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser(description="Legacy vs page-parallel PDF extraction.")
+    ap.add_argument("pdf", nargs="?", help="PDF to extract (default: a generated 300-page document)")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="pdfbench")
+    from utils import pdf_extract
+    from utils.pdf_extract import extract_text
+    path = args.pdf or os.path.join(tmp, "bench.pdf")
+    if not args.pdf: make_pdf(path)
+    workers = args.workers or pdf_extract.PDF_WORKERS
+    data = open(path, "rb").read()
+    ref, t_legacy = _timed(lambda: legacy_extract(path))
+    first = {}
+    def first_page():
+        t0 = time.perf_counter()
+        for i, _ in pdf_extract.iter_pages(data, workers=workers):
+            if i == 0: first["s"] = time.perf_counter() - t0
+    _, t_cold = _timed(first_page)
+    out, t_warm = _timed(lambda: extract_text(data, workers=workers))
+    res = {"pages": pdf_extract.page_count(data), "bytes": len(data), "workers": workers, "cpus": os.cpu_count(),
+           "legacy_s": round(t_legacy, 3), "engine_cold_s": round(t_cold, 3), "engine_first_page_s": round(first["s"], 3),
+           "engine_cached_s": round(t_warm, 4), "same_text": out == ref}
+    print(json.dumps(res, indent=2))
+
+if __name__ == "__main__":
+    main()
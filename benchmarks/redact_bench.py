@@ -0,0 +1,61 @@
+import os, re, sys, json, time, random, argparse, tempfile, statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.redactor_agent import PII_PATTERNS, redact_phi, redact_file
+
+def legacy_redact(text: str) -> str:
+    # The pre-engine redact_phi: one re.sub pass per pattern.
+    out = text
+    for p in PII_PATTERNS:
+        out = re.sub(p, "[REDACTED]", out)
+    return out
+
+def make_notes(path: str, mb: int, seed: int = 0):
+    # Synthetic clinical-note export: free text with PHI sprinkled in at a few percent of tokens.
+    rnd = random.Random(seed)
+    words = ("patient presents with acute chest pain denies fever history of hypertension on lisinopril "
+             "follow up in two weeks labs within normal limits plan discussed with family").split()
+    def phi():
+        k = rnd.randrange(4)
+        if k == 0: return f"{rnd.randint(100,999)}-{rnd.randint(10,99)}-{rnd.randint(1000,9999)}"
+        if k == 1: return f"{rnd.randint(200,999)}-{rnd.randint(200,999)}-{rnd.randint(1000,9999)}"
+        if k == 2: return f"pt{rnd.randint(1,99999)}@clinic{rnd.randint(1,50)}.org"
+        return f"{rnd.randint(10000,99999)}"
+    target = mb * 1_000_000
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        while written < target:
+            note = " ".join(phi() if rnd.random() < 0.03 else rnd.choice(words) for _ in range(rnd.randint(40, 200)))
+            line = f"NOTE {written}: {note}\n"
+            f.write(line); written += len(line)
+
+def _mbs(size: int, secs: float) -> float:
+    return round(size / 1e6 / secs, 2) if secs else 0.0
+
+def _median_s(fn, repeat: int):
+    # (median wall time over `repeat` runs, last result); single runs of the regex passes vary by up to ~30%
+    times, out = [], None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter(); out = fn(); times.append(time.perf_counter() - t0)
+    return statistics.median(times), out
+
+def run(mb: int = 64, path: str = None, repeat: int = 1) -> dict:
+    tmp = tempfile.mkdtemp(prefix="redbench")
+    path = path or os.path.join(tmp, "notes.txt")
+    if not os.path.exists(path): make_notes(path, mb)
+    size = os.path.getsize(path)
+    text = open(path, encoding="utf-8").read()
+    t_legacy, a = _median_s(lambda: legacy_redact(text), repeat)
+    t_engine, b = _median_s(lambda: redact_phi(text), repeat)
+    del text
+    out = os.path.join(tmp, "notes.redacted.txt")
+    t_stream, stats = _median_s(lambda: redact_file(path, out), repeat)
+    return {"bytes": size, "legacy_mb_s": _mbs(size, t_legacy), "engine_mb_s": _mbs(size, t_engine),
+            "stream_mb_s": _mbs(size, t_stream), "same_output": a == b, "counts": stats["counts"]}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Redaction throughput: legacy 4-pass re.sub vs single-pass engine vs streaming.")
+    ap.add_argument("--mb", type=int, default=64, help="size of the generated export")
+    ap.add_argument("--file", help="existing text export to use instead")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per variant; the median is reported")
+    args = ap.parse_args()
+    print(json.dumps(run(args.mb, args.file, args.repeat), indent=2))
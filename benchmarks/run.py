@@ -0,0 +1,313 @@
+import os, sys, json, math, time, random, argparse, platform, traceback
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "ReliScore_Agents"))
+from typing import Callable, Dict, List
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+NEAR_DUP_MAX = 100_000  # MinHash over 1M titles is minutes on a laptop; exact-key dedupe still runs at 1M
+VECTOR_MAX = 100_000  # the float16 matrix at 1M x 384 is 768 MB; ANN behaviour is already clear at 100k
+TIERS = ["guideline", "systematic_review", "randomized_trial", "cohort", "case_control", "case_series", "in_vitro", "animal"]
+
+def metric(value: float, unit: str, higher_is_better: bool) -> Dict:
+    return {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better}
+
+def _best(fn: Callable[[], None], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+def make_items(n: int, dup_rate: float = 0.1, seed: int = 0) -> List[Dict]:
+    # Evidence records shaped like the source adapters' output; ~dup_rate of them repeat an earlier id or title.
+    rnd = random.Random(seed)
+    words = "aspirin cancer risk cohort trial statin prevention incidence mortality randomized colorectal breast dose".split()
+    out = []
+    for i in range(n):
+        if out and rnd.random() < dup_rate:
+            d = dict(rnd.choice(out)); d["source"] = rnd.choice(["EuropePMC", "Crossref"]); out.append(d); continue
+        out.append({"id": f"PMID:{10_000_000 + i}", "pmid": str(10_000_000 + i), "source": "PubMed",
+                    "title": " ".join(rnd.choice(words) for _ in range(rnd.randint(6, 14))) + f" {i}",
+                    "year": rnd.randint(1990, 2025), "tier": rnd.choice(TIERS), "applicability": rnd.random(),
+                    "oa_url": "https://example.org/x.pdf" if rnd.random() < 0.3 else "", "direction": "unclear"})
+    return out
+
+def bench_ranking(sizes: List[int], repeat: int) -> Dict[str, Dict]:
+    from src.ranking import rank_items
+    from src.dedupe import dedupe_records
+    out = {}
+    for n in sizes:
+        items = make_items(n)
+        r = max(1, repeat if n <= 100_000 else 1)
+        t = _best(lambda: rank_items(items), r)
+        out[f"rank_items.{n}"] = metric(n / t, "items/s", True)
+        t = _best(lambda: rank_items(items, k=10), r)
+        out[f"rank_items_top10.{n}"] = metric(n / t, "items/s", True)
+        # dedupe throughput: dedupe_records merging on canonical keys (the exact pass that replaced dedupe_list), then with the
+        # MinHash near-duplicate pass the pipeline adds on top
+        t = _best(lambda: dedupe_records(items, near_dup=False), r)
+        out[f"dedupe.{n}"] = metric(n / t, "items/s", True)
+        if n <= NEAR_DUP_MAX:
+            t = _best(lambda: dedupe_records(items), r)
+            out[f"dedupe_near.{n}"] = metric(n / t, "items/s", True)
+        print(f"ranking/dedupe {n}: done", file=sys.stderr, flush=True)
+    return out
+
+def bench_meta(sizes: List[int], repeat: int) -> Dict[str, Dict]:
+    from src.meta import META_LOO_MAX, MetaPool, pooled_effect
+    rnd = random.Random(0)
+    def points(n):
+        out = []
+        for i in range(n):
+            y, se = rnd.gauss(-0.2, 0.3), rnd.uniform(0.05, 0.5)
+            out.append({"id": i, "effect": {"metric": "RR", "value": math.exp(y), "ci_low": math.exp(y - 1.96 * se), "ci_high": math.exp(y + 1.96 * se)}})
+        return out
+    out = {}
+    for n in sizes:
+        pts = points(n)
+        out[f"pooled_effect.{n}"] = metric(_best(lambda: pooled_effect(pts), repeat), "s", False)
+    # the largest pool that still gets a leave-one-out summary by default
+    mp = MetaPool().add_studies(points(META_LOO_MAX))
+    out["meta_loo_at_cap"] = metric(_best(mp.leave_one_out, repeat), "s", False)
+    # study points arriving one at a time, re-pooling after each
+    pts = points(1000)
+    def stream():
+        mp = MetaPool()
+        for p in pts:
+            mp.add_studies([p]); mp.random()
+    out["meta_incremental_update"] = metric(len(pts) / _best(stream, repeat), "updates/s", True)
+    return out
+
+INDEX_VOCAB = ("aspirin statin metformin cancer colorectal breast prostate lung risk cohort trial randomized prevention incidence "
+               "mortality dose hazard ratio survival screening women men adults aged follow years association reduced increased "
+               "placebo meta analysis systematic review").split()
+
+def _bm25_exact(docs: List[List[str]], query: List[str], k: int) -> List[float]:
+    # Reference BM25 over token lists, for checking the index; returns the top-k scores.
+    from src.evidence_index import BM25_K1, BM25_B
+    n, avgdl = len(docs), max(sum(map(len, docs)) / max(len(docs), 1), 1.0)
+    df = {t: sum(1 for d in docs if t in d) for t in query}
+    scores = []
+    for d in docs:
+        s = 0.0
+        for t in query:
+            tf = d.count(t)
+            if tf: s += math.log1p((n - df[t] + 0.5) / (df[t] + 0.5)) * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(d) / avgdl))
+        if s > 0: scores.append(s)
+    return sorted(scores, reverse=True)[:k]
+
+def check_index_replace(n: int = 400, replaced: int = 40, queries: int = 50) -> float:
+    # Share of queries whose top-20 scores match a brute-force BM25 over the stored docs after some records were re-added
+    # (replaced docs stay in their segment until a merge and must not count towards df).
+    import tempfile, shutil
+    from src.evidence_index import EvidenceIndex, doc_tokens, tokenize
+    rnd = random.Random(3)
+    items = make_items(n, dup_rate=0.0, seed=3)
+    for x in items:
+        x["abstract"] = "aspirin " + " ".join(rnd.choices(INDEX_VOCAB, k=30))
+    root = tempfile.mkdtemp(prefix="reli-index-check-")
+    try:
+        ix = EvidenceIndex(root)
+        ix.add(items)
+        ix.add([dict(x, abstract=" ".join(rnd.choices(INDEX_VOCAB, k=30))) for x in items[:replaced]])
+        ix._merger.submit(lambda: None).result()
+        docs = [doc_tokens(json.loads(it)) for (it,) in ix._conn().execute("SELECT item FROM docs")]
+        qs = ["aspirin"] + [" ".join(rnd.sample(INDEX_VOCAB, 2)) for _ in range(queries - 1)]
+        ok = 0
+        for q in qs:
+            got = [x["_bm25"] for x in ix.search(q, k=20)]
+            want = _bm25_exact(docs, list(dict.fromkeys(tokenize(q))), 20)
+            ok += len(got) == len(want) and all(math.isclose(a, b, rel_tol=1e-3, abs_tol=1e-4) for a, b in zip(got, want))
+        return ok / len(qs)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def bench_index(sizes: List[int], queries: int) -> Dict[str, Dict]:
+    import tempfile, shutil
+    from src.evidence_index import EvidenceIndex
+    rnd = random.Random(1)
+    vocab = INDEX_VOCAB
+    qs = [" ".join(rnd.sample(vocab, 4)) for _ in range(queries)]
+    out = {"index_replace_exact": metric(check_index_replace(), "share", True)}
+    for n in sizes:
+        items = make_items(n, dup_rate=0.0)
+        for x in items:
+            x["abstract"] = " ".join(rnd.choices(vocab, k=40))
+        root = tempfile.mkdtemp(prefix="reli-index-")
+        try:
+            ix = EvidenceIndex(root)
+            t0 = time.perf_counter(); ix.add(items); ix.maybe_merge()
+            out[f"index_build.{n}"] = metric(n / (time.perf_counter() - t0), "docs/s", True)
+            lat = []
+            for q in qs:
+                t0 = time.perf_counter(); ix.search(q, k=20, min_match=0.5); lat.append(time.perf_counter() - t0)
+            out[f"index_query.{n}"] = metric(len(qs) / sum(lat), "queries/s", True)
+            out[f"index_query_p50.{n}"] = metric(sorted(lat)[len(lat) // 2], "s", False)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"index {n}: done", file=sys.stderr, flush=True)
+    return out
+
+def bench_vectors(sizes: List[int], queries: int) -> Dict[str, Dict]:
+    # Offline hashing backend: cold vs cached embedding, cost of 1k new texts on top of n, IVF query rate and recall@10.
+    import tempfile, shutil
+    import numpy as np
+    from src.vector_store import VectorStore
+    rnd = random.Random(2)
+    words = "aspirin statin metformin cancer colorectal breast prostate lung risk cohort trial prevention mortality survival".split()
+    qs = [" ".join(rnd.sample(words, 4)) for _ in range(queries)]
+    out = {}
+    for n in sizes:
+        items = make_items(n + 1000, dup_rate=0.0, seed=n)
+        root = tempfile.mkdtemp(prefix="reli-vectors-")
+        try:
+            vs = VectorStore(root)
+            t0 = time.perf_counter(); vs.add_items(items[:n])
+            out[f"embed_cold.{n}"] = metric(n / (time.perf_counter() - t0), "texts/s", True)
+            vs._builder.submit(lambda: None).result()  # let the background ANN build finish before timing the rest
+            t0 = time.perf_counter(); vs.add_items(items[:n])
+            out[f"embed_cached.{n}"] = metric(n / (time.perf_counter() - t0), "texts/s", True)
+            t0 = time.perf_counter(); vs.add_items(items[n:])
+            out[f"embed_1k_new.{n}"] = metric(time.perf_counter() - t0, "s", False)
+            vs.build()
+            m = np.asarray(vs._matrix(0), dtype=np.float32)
+            rows = dict(vs._conn().execute("SELECT row, ref FROM vecs"))
+            t, hit = 0.0, 0
+            for q in qs:
+                t0 = time.perf_counter(); got = {r for r, _ in vs.neighbors(q, 10)}; t += time.perf_counter() - t0
+                exact = np.argsort(-(m @ vs.embed([q])[0]))[:11]
+                want = [rows[int(r)] for r in exact if rows.get(int(r))][:10]
+                hit += len(got.intersection(want)) / max(1, len(want))
+            out[f"ann_query.{n}"] = metric(len(qs) / t, "queries/s", True)
+            out[f"ann_recall10.{n}"] = metric(hit / len(qs), "recall", True)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"vectors {n}: done", file=sys.stderr, flush=True)
+    return out
+
+def bench_redact(mb: int, repeat: int) -> Dict[str, Dict]:
+    from benchmarks.redact_bench import run
+    r = run(mb, repeat=repeat)
+    return {"redact_phi": metric(r["engine_mb_s"], "MB/s", True), "redact_stream": metric(r["stream_mb_s"], "MB/s", True),
+            "redact_legacy": metric(r["legacy_mb_s"], "MB/s", True)}
+
+def bench_summarize(latency: float) -> Dict[str, Dict]:
+    from benchmarks.fake_openai import FakeOpenAI
+    fake = FakeOpenAI(latency).start()
+    os.environ.update(OPENAI_BASE_URL=fake.url, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY") or "sk-bench", LLM_CACHE="0")
+    try:
+        from agents.summarize_agent import SummarizeTool
+        tool = SummarizeTool(verbose=False)
+        para = "Patient admitted with chest pain. Troponin elevated. Started on aspirin and heparin. Echo shows EF 45%.\n"
+        out = {}
+        for name, text in (("short", para * 20), ("long", para * 2000)):
+            calls = fake.calls
+            t0 = time.perf_counter(); tool.execute(text); dt = time.perf_counter() - t0
+            out[f"summarize_{name}.latency"] = metric(dt, "s", False)
+            out[f"summarize_{name}.llm_calls"] = metric(fake.calls - calls, "calls", False)
+        return out
+    finally:
+        fake.stop()
+
+def bench_pipeline(claims: List[str], latency_ms: str, failure_rate: float) -> Dict[str, Dict]:
+    from benchmarks.stub_server import SourceStub, load_recordings
+    lo, hi = (float(x) / 1000 for x in latency_ms.split(","))
+    stub = SourceStub(load_recordings(), (lo, hi), failure_rate).start()
+    # http_client reads these at import time, so they must be set before src.pipeline loads.
+    os.environ.update(HTTP_STUB_URL=stub.url, HTTP_CACHE="0")
+    try:
+        from src.pipeline import process_claim_stream
+        stages: Dict[str, List[float]] = {}
+        for claim in claims:
+            t0 = last = time.perf_counter()
+            for ev in process_claim_stream(claim):
+                now = time.perf_counter()
+                key = ev["type"] if ev["type"] != "source" else f"source.{ev['source']}"
+                # source events measure from the start of retrieval; the rest measure the step that produced them
+                stages.setdefault(key, []).append(now - (t0 if key.startswith("source.") else last))
+                last = now
+            stages.setdefault("total", []).append(time.perf_counter() - t0)
+        out = {f"pipeline.{k}": metric(sorted(v)[len(v) // 2], "s", False) for k, v in stages.items()}
+        out["pipeline.stub_requests"] = metric(stub.counters["requests"] / len(claims), "requests/claim", False)
+        return out
+    finally:
+        stub.stop()
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    # A baseline entry may carry its own "tolerance" (noisy metrics get more room, exact checks none); else the default.
+    regressions = []
+    for k, m in results.items():
+        b = baseline.get(k)
+        if not b or not b.get("value"): continue
+        tolerance_k = b.get("tolerance", tolerance)
+        ratio = m["value"] / b["value"]
+        worse = ratio < 1 - tolerance_k if m["higher_is_better"] else ratio > 1 + tolerance_k
+        m["baseline"], m["change"] = b["value"], round(ratio - 1, 4)
+        if worse: regressions.append(f"{k}: {b['value']} -> {m['value']} {m['unit']} ({ratio - 1:+.0%})")
+    return regressions
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline benchmark suite; compares against benchmarks/baseline.json.")
+    ap.add_argument("--only", default="pipeline,ranking,meta,index,vectors,redact,summarize")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--index-queries", type=int, default=200)
+    ap.add_argument("--redact-mb", type=int, default=32)
+    ap.add_argument("--redact-repeat", type=int, default=3, help="runs per redaction variant; the median is reported")
+    ap.add_argument("--llm-latency-ms", type=float, default=50)
+    ap.add_argument("--source-latency-ms", default="50,200", help="min,max latency the source stub adds")
+    ap.add_argument("--source-failure-rate", type=float, default=0.0)
+    ap.add_argument("--claims", default="Aspirin prevents colorectal cancer;Statins reduce breast cancer mortality")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before it counts as a regression, "
+                    "for metrics whose baseline entry sets no tolerance of its own")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--allow-skip", action="store_true", help="exit 0 even if a section could not run (e.g. missing modules)")
+    ap.add_argument("--out", help="write results JSON here as well as stdout")
+    args = ap.parse_args(argv)
+    sections = {
+        "pipeline": lambda: bench_pipeline(args.claims.split(";"), args.source_latency_ms, args.source_failure_rate),
+        "ranking": lambda: bench_ranking([int(x) for x in args.sizes.split(",")], args.repeat),
+        "meta": lambda: bench_meta([1_000, 10_000], args.repeat),
+        "index": lambda: bench_index([int(x) for x in args.sizes.split(",")], args.index_queries),
+        "vectors": lambda: bench_vectors([n for n in (int(x) for x in args.sizes.split(",")) if n <= VECTOR_MAX], args.index_queries),
+        "redact": lambda: bench_redact(args.redact_mb, args.redact_repeat),
+        "summarize": lambda: bench_summarize(args.llm_latency_ms / 1000),
+    }
+    results: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+    for name in args.only.split(","):
+        try:
+            results.update(sections[name]())
+        except ImportError as e:
+            skipped[name] = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            traceback.print_exc()
+            skipped[name] = f"{type(e).__name__}: {e}"
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f: baseline = json.load(f).get("metrics", {})
+    regressions = compare(results, baseline, args.tolerance)
+    report = {"machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+              "metrics": results, "skipped": skipped, "regressions": regressions}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f: f.write(text)
+    if args.update_baseline:
+        merged = dict(baseline)
+        # re-recorded values keep any per-metric tolerance set by hand
+        merged.update({k: dict({kk: v[kk] for kk in ("value", "unit", "higher_is_better")},
+                               **{kk: merged[k][kk] for kk in ("tolerance",) if kk in merged.get(k, {})}) for k, v in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": report["machine"], "metrics": merged}, f, indent=2, sort_keys=True); f.write("\n")
+        return 0
+    for r in regressions: print("REGRESSION " + r, file=sys.stderr)
+    # a section that could not run leaves its metrics ungated, so it fails the run unless skipping was asked for
+    for name, why in skipped.items(): print(f"SKIPPED {name}: {why}", file=sys.stderr)
+    if regressions: return 1
+    return 2 if skipped and not args.allow_skip else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os, sys, json, zlib, time, base64, random, sqlite3, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sources.synthetic.jsonl")
+
+def _key(host: str, path: str, query: str) -> str:
+    return f"{host.lower()}{path}?{urlencode(sorted(parse_qsl(query, keep_blank_values=True)))}"
+
+def load_recordings(path: str = FIXTURES) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def record_from_cache(cache_db: str, out: str) -> int:
+    # Turns the http_client cache (data_cache/http.sqlite) into replayable recordings; errors are skipped.
+    n = 0
+    with sqlite3.connect(cache_db) as c, open(out, "w", encoding="utf-8") as f:
+        for (blob,) in c.execute("SELECT value FROM kv"):
+            e = json.loads(zlib.decompress(blob).decode("utf-8"))
+            if not isinstance(e, dict) or e.get("error") or "content" not in e or not e.get("url"): continue
+            f.write(json.dumps({"url": e["url"], "status": e.get("status", 200), "headers": e.get("headers") or {},
+                                "content": e["content"]}) + "\n")
+            n += 1
+    return n
+
+class SourceStub:
+    # Replays recorded upstream responses at <base>/<host>/<path>; an unrecorded query falls back to the
+    # recording on the same host sharing the longest path prefix. Latency and failures are injected per request.
+    def __init__(self, recordings: List[Dict], latency: Tuple[float, float] = (0.05, 0.2), failure_rate: float = 0.0,
+                 failure_status: int = 503, seed: int = 0, port: int = 0):
+        self.exact: Dict[str, Dict] = {}
+        self.by_host: Dict[str, List[Tuple[str, Dict]]] = {}
+        for r in recordings:
+            u = urlsplit(r["url"])
+            self.exact[_key(u.netloc, u.path, u.query)] = r
+            self.by_host.setdefault(u.netloc.lower(), []).append((u.path, r))
+        self.latency, self.failure_rate, self.failure_status = latency, failure_rate, failure_status
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "exact": 0, "fallback": 0, "missing": 0, "injected_failures": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "SourceStub":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown(); self.server.server_close()
+
+    def _lookup(self, host: str, path: str, query: str) -> Tuple[Optional[Dict], str]:
+        r = self.exact.get(_key(host, path, query))
+        if r is not None: return r, "exact"
+        best, n = None, -1
+        for p, r in self.by_host.get(host.lower(), []):
+            k = len(os.path.commonprefix([p, path]))
+            if k > n: best, n = r, k
+        return (best, "fallback") if best is not None else (None, "missing")
+
+    def _handler(self):
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def log_message(self, *a): pass
+            def _send(self, status: int, body: bytes, headers: Dict[str, str]):
+                self.send_response(status)
+                for k, v in headers.items(): self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+            def do_GET(self):
+                u = urlsplit(self.path)
+                host, _, path = u.path.lstrip("/").partition("/")
+                with stub.lock:
+                    delay = stub.rnd.uniform(*stub.latency)
+                    fail = stub.rnd.random() < stub.failure_rate
+                    stub.counters["requests"] += 1
+                time.sleep(delay)
+                if fail:
+                    with stub.lock: stub.counters["injected_failures"] += 1
+                    return self._send(stub.failure_status, b"{}", {"Content-Type": "application/json"})
+                r, how = stub._lookup(host, "/" + path, u.query)
+                with stub.lock: stub.counters[how] += 1
+                if r is None:
+                    return self._send(404, b"{}", {"Content-Type": "application/json"})
+                body = base64.b64decode(r["content"]) if "content" in r else r.get("body", "").encode("utf-8")
+                hdrs = dict(r.get("headers") or {}); hdrs.setdefault("Content-Type", "application/json")
+                hdrs.pop("ETag", None); hdrs.pop("Last-Modified", None)
+                self._send(r.get("status", 200), body, hdrs)
+        return Handler
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Replay recorded source responses for offline runs (point HTTP_STUB_URL at it).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sv = sub.add_parser("serve")
+    sv.add_argument("--fixtures", default=FIXTURES)
+    sv.add_argument("--port", type=int, default=8765)
+    sv.add_argument("--latency-ms", default="50,200", help="min,max injected latency")
+    sv.add_argument("--failure-rate", type=float, default=0.0)
+    rc = sub.add_parser("record")
+    rc.add_argument("cache_db", help="e.g. ReliScore_Agents/data_cache/http.sqlite")
+    rc.add_argument("out")
+    args = ap.parse_args()
+    if args.cmd == "record":
+        print(f"{record_from_cache(args.cache_db, args.out)} recordings -> {args.out}")
+        sys.exit(0)
+    lo, hi = (float(x) / 1000 for x in args.latency_ms.split(","))
+    stub = SourceStub(load_recordings(args.fixtures), (lo, hi), args.failure_rate, port=args.port).start()
+    print(f"serving {len(stub.exact)} recordings on {stub.url}; export HTTP_STUB_URL={stub.url}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
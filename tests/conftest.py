@@ -0,0 +1,6 @@
+import os, sys, tempfile
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "ReliScore_Agents"))
+# src.utils creates data_cache/ under the working directory on import; keep the suite's caches out of the tree.
+os.chdir(tempfile.mkdtemp(prefix="reliscore-tests-"))
@@ -0,0 +1,58 @@
+import json
+from src import cache
+from src.cache import CacheStore, get_or_set, memoize_json
+from src.utils import cache_path
+
+class _Clock:
+    def __init__(self, t=1_000_000.0): self.t = t
+    def __call__(self): return self.t
+
+def test_values_survive_a_new_process_view(tmp_path):
+    a = CacheStore(tmp_path / "c.sqlite")
+    a.set("k", {"x": [1, 2], "s": "é"})
+    assert a.get("k") == {"x": [1, 2], "s": "é"}
+    b = CacheStore(tmp_path / "c.sqlite")  # empty memory tier, same file
+    assert b.get("k") == {"x": [1, 2], "s": "é"} and b.get("missing", 7) == 7
+    assert b.stats()["disk_hits"] == 1 and b.stats()["misses"] == 1
+    b.get("k")
+    assert b.stats()["mem_hits"] == 1
+
+def test_ttl_expires_in_memory_and_on_disk(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    s = CacheStore(tmp_path / "c.sqlite", default_ttl=10)
+    s.set("default", 1); s.set("short", 2, ttl=1); s.set("forever", 3, ttl=None)
+    clock.t += 5
+    assert (s.get("default"), s.get("short"), s.get("forever")) == (1, None, 3)
+    clock.t += 10
+    fresh = CacheStore(tmp_path / "c.sqlite")
+    assert (fresh.get("default"), s.get("default"), fresh.get("forever")) == (None, None, 3)
+    assert fresh.stats()["expired"] == 1 and fresh.stats()["entries"] == 1
+
+def test_eviction_drops_least_recently_used_until_under_budget(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    s = CacheStore(tmp_path / "c.sqlite", max_bytes=10_000, mem_items=4)
+    blob = lambda i: "".join(chr(0x4e00 + (i * 7919 + j * 104729) % 20000) for j in range(400))  # barely compressible
+    for i in range(40):
+        clock.t += 100  # past the 60 s atime refresh window
+        s.set(f"k{i}", blob(i))
+        if i % 5 == 0: s.get("k0")  # keep k0 warm
+    s.evict()
+    st = s.stats()
+    assert st["bytes"] <= 10_000 and st["evictions"] > 0
+    assert s.get("k0") == blob(0) and s.get("k39") == blob(39)
+    assert CacheStore(tmp_path / "c.sqlite").get("k1") is None
+    assert len(s._mem) <= 4
+
+def test_read_through_helpers_build_once_and_import_legacy_files():
+    calls = []
+    build = lambda: calls.append(1) or {"built": len(calls)}
+    assert get_or_set("test_cache_obj.json", build) == {"built": 1}
+    assert get_or_set("test_cache_obj.json", build) == {"built": 1} and len(calls) == 1
+    legacy = cache_path("legacy_obj.json")
+    legacy.write_text(json.dumps({"from": "disk"}), encoding="utf-8")
+    assert get_or_set("legacy_obj.json", build) == {"from": "disk"} and len(calls) == 1
+    add = lambda a, b=0: calls.append(1) or a + b
+    assert memoize_json("add:2:3", add, 2, b=3) == 5 and memoize_json("add:2:3", add, 2, b=3) == 5
+    assert len(calls) == 2
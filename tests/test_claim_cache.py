@@ -0,0 +1,84 @@
+import threading, time
+import pytest
+pytest.importorskip("src.nlp.claim_detect")  # notebook-only package; this runs where the full tree is built
+from src import claim_cache as cc
+from src.claim_cache import ClaimCache, claim_key
+
+class _Clock:
+    def __init__(self): self.t = time.time()
+    def __call__(self): return self.t
+
+def _result(status="ok"):
+    return {"claim": "x", "verdict": {"label": "Supported"}, "retrieval": {"pubmed": {"status": status}}, "facts": {"claim": "x"}}
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(cc.time, "time", c)
+    return c
+
+def _wait(pred, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not pred() and time.monotonic() < end: time.sleep(0.01)
+    return pred()
+
+def test_key_ignores_case_and_punctuation_but_not_word_order():
+    assert claim_key("Statins prevent breast cancer.")[0] == claim_key("  statins PREVENT breast-cancer ")[0]
+    assert claim_key("Drug A is superior to drug B")[0] != claim_key("Drug B is superior to drug A")[0]
+
+def test_concurrent_misses_run_once_and_serve_each_callers_wording(clock):
+    cache, calls, gate = ClaimCache(ttl_s={"default": 100}, stale_s=100), [], threading.Event()
+    def run(claim):
+        calls.append(claim); gate.wait(5)
+        return _result()
+    out = []
+    ts = [threading.Thread(target=lambda c=c: out.append(cache.get_or_compute(c, run)))
+          for c in ["Aspirin prevents colon cancer"] * 4 + ["aspirin prevents colon cancer!"] * 2]
+    for t in ts: t.start()
+    assert _wait(lambda: cache.counters["coalesced"] == 5)
+    gate.set()
+    for t in ts: t.join()
+    assert len(calls) == 1 and all(o["cache"]["status"] == "miss" for o in out)
+    assert {o["claim"] for o in out} == {"Aspirin prevents colon cancer", "aspirin prevents colon cancer!"}
+    assert all(o["facts"]["claim"] == o["claim"] for o in out)
+
+def test_fresh_then_stale_while_revalidate_then_expired(clock):
+    cache, calls = ClaimCache(ttl_s={"default": 100}, stale_s=50), []
+    run = lambda claim: calls.append(claim) or _result()
+    claim = "Metformin lowers cancer risk in diabetics"
+    cache.get_or_compute(claim, run)
+    clock.t += 99
+    assert cache.get_or_compute(claim, run)["cache"]["status"] == "hit" and len(calls) == 1
+    clock.t += 20  # past ttl, inside the stale window: served at once, refreshed in the background
+    assert cache.get_or_compute(claim, run)["cache"]["status"] == "stale"
+    assert _wait(lambda: len(calls) == 2)
+    assert _wait(lambda: cache.get_or_compute(claim, run)["cache"]["status"] == "hit")
+    clock.t += 200
+    assert cache.get_or_compute(claim, run)["cache"]["status"] == "miss" and len(calls) == 3
+
+def test_degraded_results_expire_quickly_and_are_never_served_stale(clock):
+    cache, calls = ClaimCache(ttl_s={"default": 100}, stale_s=1000, degraded_ttl_s=10), []
+    run = lambda claim: calls.append(claim) or _result("timed_out")
+    claim = "Vitamin D prevents melanoma"
+    cache.get_or_compute(claim, run)
+    clock.t += 5
+    assert cache.get_or_compute(claim, run)["cache"]["status"] == "hit"
+    clock.t += 10
+    assert cache.get_or_compute(claim, run)["cache"]["status"] == "miss" and len(calls) == 2
+    assert cache.counters["degraded"] == 2 and cache.counters["stale"] == 0
+
+def test_errors_reach_every_waiter_and_are_not_cached(clock):
+    cache, gate = ClaimCache(), threading.Event()
+    def boom(claim):
+        gate.wait(5); raise RuntimeError("all sources down")
+    errors = []
+    def call():
+        try: cache.get_or_compute("Green tea prevents prostate cancer", boom)
+        except RuntimeError as e: errors.append(str(e))
+    ts = [threading.Thread(target=call) for _ in range(3)]
+    for t in ts: t.start()
+    assert _wait(lambda: cache.counters["coalesced"] == 2)
+    gate.set()
+    for t in ts: t.join()
+    assert errors == ["all sources down"] * 3
+    assert cache.get_or_compute("Green tea prevents prostate cancer", lambda c: _result())["cache"]["status"] == "miss"
@@ -0,0 +1,44 @@
+import random
+from src.dedupe import dedupe_records, canonical_keys, norm_title, _band_keys, _shingles
+
+TITLE = "Statin use and breast cancer recurrence in a nationwide cohort"
+
+def _rec(id_, title=TITLE, source="Crossref", year=2020, **kw):
+    return dict(id=id_, title=title, source=source, year=year, **kw)
+
+def test_canonical_keys_prefer_registry_ids_over_titles():
+    assert canonical_keys(_rec("DOI:10.1/ABC", pmid="123")) == ["doi:10.1/abc", "pmid:123"]
+    assert canonical_keys(_rec("NCT01234567 arm B")) == ["nct:NCT01234567"]
+    assert canonical_keys(_rec("x", title="short")) == []
+    assert canonical_keys(_rec("x"))[0].startswith("title:")
+
+def test_exact_duplicates_merge_with_source_priority():
+    out = dedupe_records([_rec("DOI:10.1/a", source="Crossref", abstract="short"),
+                          _rec("PMID:9", source="PubMed", doi="10.1/A", abstract=""),
+                          _rec("DOI:10.1/b", title="Another paper about something else entirely")])
+    assert len(out) == 2
+    merged = out[0]
+    assert merged["source"] == "PubMed" and merged["abstract"] == "short"
+    assert merged["sources"] == ["PubMed", "Crossref"] and set(merged["merged_ids"]) == {"PMID:9", "DOI:10.1/a"}
+
+def test_titles_join_only_records_without_conflicting_ids_or_years():
+    assert len(dedupe_records([_rec("a"), _rec("b", title=TITLE.upper() + "!")])) == 1
+    assert len(dedupe_records([_rec("a", year=2010), _rec("b", year=2020)])) == 2
+    assert len(dedupe_records([_rec("DOI:10.1/a"), _rec("DOI:10.1/b")])) == 2
+    # a record carrying PMID 1 and DOI b must not bridge DOI a into the same group
+    out = dedupe_records([_rec("DOI:10.1/a", pmid="1"), _rec("PMID:1", doi="10.1/b"), _rec("PMID:1")])
+    assert sorted(len(r.get("merged_ids") or [1]) for r in out) == [1, 2]
+
+def test_near_duplicate_titles_merge_only_with_near_dup():
+    typo = TITLE.replace("nationwide", "nation-wide").replace("recurrence", "recurence")
+    items = [_rec("a"), _rec("b", title=typo), _rec("c", title="Aspirin and colorectal adenoma prevention trial results")]
+    assert len(dedupe_records(items)) == 2
+    assert len(dedupe_records(items, near_dup=False)) == 3
+
+def test_band_keys_do_not_depend_on_chunking():
+    rnd = random.Random(0)
+    words = ["statin", "cancer", "cohort", "trial", "risk", "breast", "aspirin", "effect", "women", "mortality"]
+    shs = [_shingles(norm_title(" ".join(rnd.choices(words, k=rnd.randint(3, 12))))) for _ in range(300)]
+    assert (_band_keys(shs) == _band_keys(shs, chunk=64)).all()
+    same = _band_keys([shs[0], set(shs[0])])
+    assert (same[0] == same[1]).all()
@@ -0,0 +1,65 @@
+import json, math, random
+from collections import Counter
+import pytest
+from src.evidence_index import EvidenceIndex, doc_tokens, BM25_K1, BM25_B
+
+WORDS = "statin aspirin cancer breast colorectal cohort trial risk mortality women men dose prevention recurrence".split()
+
+def _item(rnd, i):
+    return {"id": f"DOI:10.1/{i}", "source": "PubMed", "title": " ".join(rnd.choices(WORDS, k=rnd.randint(3, 8))),
+            "abstract": " ".join(rnd.choices(WORDS, k=rnd.randint(0, 30)))}
+
+def _reference(idx, query, k):
+    # plain BM25 over the documents the index currently holds
+    docs = [json.loads(it) for (it,) in idx._conn().execute("SELECT item FROM docs")]
+    toks = [Counter(doc_tokens(d)) for d in docs]
+    n = len(docs)
+    avgdl = max(sum(sum(t.values()) for t in toks) / n, 1.0)
+    terms = list(dict.fromkeys(w for w in query.split()))
+    df = {w: sum(1 for t in toks if w in t) for w in terms}
+    out = []
+    for d, t in zip(docs, toks):
+        dl = sum(t.values())
+        s = sum(math.log1p((n - df[w] + 0.5) / (df[w] + 0.5)) * (BM25_K1 + 1) * t[w] /
+                (t[w] + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)) for w in terms if t[w])
+        if s > 0: out.append((s, d["id"]))
+    return sorted(out, key=lambda x: -x[0])[:k]
+
+def _check(idx, rnd):
+    for _ in range(10):
+        q = " ".join(rnd.sample(WORDS, rnd.randint(1, 3)))
+        got = [(r["_bm25"], r["id"]) for r in idx.search(q, k=15)]
+        ref = _reference(idx, q, 15)
+        # _bm25 is rounded to 4 places and computed in float32
+        assert [s for s, _ in got] == pytest.approx([s for s, _ in ref], rel=1e-4, abs=1e-4)
+        # ties may come back in either order: every doc returned must score at least the k-th best, and every doc
+        # scoring clearly more must be returned
+        full = {i: s for s, i in _reference(idx, q, None)}
+        cut = ref[-1][0] if ref else 0
+        assert all(full[i] >= cut - 1e-4 for _, i in got)
+        assert {i for i, s in full.items() if s > cut + 1e-4} <= {i for _, i in got}
+
+def test_bm25_matches_reference_through_replacements_and_merges(tmp_path):
+    rnd = random.Random(0)
+    idx = EvidenceIndex(tmp_path)
+    for b in range(4):
+        idx.add([_item(rnd, b * 50 + i) for i in range(50)])
+    _check(idx, rnd)
+    # re-adding a DOI replaces the stored doc: its old postings must stop counting for df and scores
+    idx.add([_item(rnd, i) for i in range(0, 200, 3)])
+    assert idx.size() == 200
+    _check(idx, rnd)
+    idx.optimize()
+    assert idx.stats()["segments"] == 1 and idx.stats()["segment_docs"] == 200
+    _check(idx, rnd)
+
+def test_replaced_text_is_no_longer_found(tmp_path):
+    idx = EvidenceIndex(tmp_path)
+    idx.add([{"id": "DOI:10.1/x", "title": "zebrafish fin regeneration", "abstract": "cohort"}])
+    idx.add([{"id": "PMID:5", "doi": "10.1/X", "title": "statin cohort", "abstract": ""}])
+    assert idx.search("zebrafish") == []
+    hits = idx.search("statin")
+    assert len(hits) == 1 and hits[0]["abstract"] == "cohort"  # fields only the old copy had are kept
+    assert [r["title"] for r in idx.get(["pmid:5", "doi:10.1/x"])] == ["statin cohort"]
+    idx.optimize()
+    assert idx.search("zebrafish") == [] and idx.size() == 1
@@ -0,0 +1,42 @@
+import random
+import networkx as nx
+from src.graph_store import GraphStore
+
+def _k_hops(g, seeds, hops=2):
+    # graphrag._neighbors_k_hops, the expansion run_multihop does on whatever graph it is given
+    seen, frontier = set(seeds), set(seeds)
+    for _ in range(hops):
+        nxt = {n for node in frontier for n in g.neighbors(node) if n not in seen}
+        seen |= nxt; frontier = nxt
+    return seen, {(u, v, g.edges[u, v].get("rel", "")) for u in seen for v in g.neighbors(u) if v in seen and u < v}
+
+def _random_graph(n=300, m=900, seed=0):
+    rnd = random.Random(seed)
+    g = nx.Graph()
+    g.add_nodes_from(f"n{i}" for i in range(n))
+    while g.number_of_edges() < m:
+        u, v = rnd.sample(range(n), 2)
+        g.add_edge(f"n{u}", f"n{v}", rel=rnd.choice(["mentions", "cites"]))
+    return g
+
+def test_neighborhood_matches_full_graph_across_csr_and_delta(tmp_path):
+    full = _random_graph()
+    store = GraphStore(tmp_path)
+    edges = list(full.edges(data=True))
+    # half the edges end up in the compacted CSR base, the rest stay in the SQLite delta
+    store.add([(n, {}) for n in full.nodes], [(u, v, a["rel"]) for u, v, a in edges[:450]])
+    store.compact()
+    store.add([], [(u, v, a["rel"]) for u, v, a in edges[450:]])
+    rnd = random.Random(1)
+    for _ in range(20):
+        seeds = rnd.sample(sorted(full.nodes), 3)
+        sub = store.neighborhood(seeds, hops=2)
+        assert _k_hops(sub, seeds) == _k_hops(full, seeds)
+
+def test_neighborhood_unknown_seeds_and_empty_store(tmp_path):
+    store = GraphStore(tmp_path)
+    assert store.neighborhood(["Aspirin"]).number_of_nodes() == 0
+    store.add([("p1", {"kind": "paper"}), ("Aspirin", {"kind": "entity"})], [("p1", "Aspirin", "mentions")])
+    sub = store.neighborhood(["Aspirin", "Statin"])
+    assert list(sub.neighbors("Statin")) == []
+    assert _k_hops(sub, ["Aspirin", "Statin"]) == ({"Aspirin", "Statin", "p1"}, {("Aspirin", "p1", "mentions")})
@@ -0,0 +1,45 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from src.idempotency import IdempotencyIndex
+from src.utils import log_idempotent, log_idempotent_many
+
+def _open_and_migrate(log: str) -> int:
+    return IdempotencyIndex(Path(log + ".idx.sqlite")).migrate_once(Path(log))
+
+def _mark(args) -> list:
+    log, keys = args
+    return log_idempotent_many(Path(log), keys)
+
+def _spawn_pool(n):
+    return ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+
+def test_check_and_mark_many_reports_first_sighting_only(tmp_path):
+    idx = IdempotencyIndex(tmp_path / "log.idx.sqlite")
+    assert idx.check_and_mark_many(["a", "b", "a", "c"]) == [True, True, False, True]
+    assert idx.check_and_mark_many(["c", "d"]) == [False, True]
+    assert idx.check_and_mark("d") is False and idx.check_and_mark("e") is True
+    assert len(idx) == 5 and "a" in idx and "z" not in idx
+    keys = [f"k{i}" for i in range(1200)]  # crosses the 500-key chunk size
+    assert idx.check_and_mark_many(keys + keys[:10]) == [True] * 1200 + [False] * 10
+
+def test_legacy_log_is_imported_once_across_processes(tmp_path):
+    log = tmp_path / "processed.log"
+    log.write_text("".join(f"id{i}\n" for i in range(5000)) + "\n  \n", encoding="utf-8")
+    with _spawn_pool(4) as pool:
+        imported = list(pool.map(_open_and_migrate, [str(log)] * 8))
+    assert sorted(imported) == [0] * 7 + [5000]
+    assert log_idempotent(log, "id42") is False
+    assert log_idempotent(log, "new") is True
+
+def test_concurrent_marks_hand_each_key_to_one_process(tmp_path):
+    log = tmp_path / "processed.log"
+    # every worker tries the same keys, in a different order
+    jobs = [(str(log), [f"k{(i * 7 + w) % 3000}" for i in range(3000)]) for w in range(6)]
+    with _spawn_pool(6) as pool:
+        results = list(pool.map(_mark, jobs))
+    winners = {}
+    for (_, keys), fresh in zip(jobs, results):
+        for k, f in zip(keys, fresh):
+            if f: winners[k] = winners.get(k, 0) + 1
+    assert len(winners) == 3000 and set(winners.values()) == {1}
@@ -0,0 +1,57 @@
+import random, re
+from utils.lexicon import Lexicon
+
+_TOKEN = re.compile(r"\w+")
+
+def _brute(entries, text):
+    # longest entry ending at each token, then sorted and overlaps merged: what the automaton reports
+    kind_of = {}
+    for e in entries:
+        t, k = (e, "LEXICON") if isinstance(e, str) else e
+        kind_of.setdefault(tuple(w.casefold() for w in _TOKEN.findall(t)), k)
+    toks = list(_TOKEN.finditer(text))
+    words = [m.group().casefold() for m in toks]
+    hits = []
+    for j in range(len(toks)):
+        for L in range(j + 1, 0, -1):
+            k = kind_of.get(tuple(words[j - L + 1:j + 1]))
+            if k is not None:
+                hits.append((toks[j - L + 1].start(), toks[j].end(), k)); break
+    hits.sort()
+    out = []
+    for a, b, k in hits:
+        if out and a < out[-1][1]:
+            if b > out[-1][1]: out[-1] = (out[-1][0], b, out[-1][2])
+        else:
+            out.append((a, b, k))
+    return out
+
+def test_matches_brute_force_on_random_text():
+    rnd = random.Random(0)
+    vocab = ["john", "smith", "mary", "st", "general", "hospital", "of", "mrn", "x1", "ann"]
+    for _ in range(200):
+        entries = list({" ".join(rnd.choices(vocab, k=rnd.randint(1, 4))) for _ in range(rnd.randint(1, 12))})
+        entries = [(e, rnd.choice(["NAME", "FACILITY"])) for e in entries]
+        lex = Lexicon.build(entries)
+        text = " ".join(rnd.choice(vocab + ["the", "a", "JOHN", "Smith,"]) for _ in range(rnd.randint(0, 60)))
+        assert lex.find(text) == _brute(entries, text), (entries, text)
+
+def test_word_boundaries_case_and_offsets():
+    lex = Lexicon.build([("John Smith", "NAME"), "St Mary Hospital"])
+    text = "Dr. JOHN smith saw Johnny Smithson at st. mary hospital."
+    assert lex.find(text) == [(4, 14, "NAME"), (38, 55, "LEXICON")]
+    assert lex.find(text, pos=5) == [(38, 55, "LEXICON")]
+    assert lex.find(text, endpos=50) == [(4, 14, "NAME")]
+    assert Lexicon.build(["John Smith"], case_sensitive=True).find(text) == []
+    # casefold changes the length of "ß", so offsets must still point into the original text
+    assert Lexicon.build(["strasse"]).find("Die Straße und die strasse") == [(4, 10, "LEXICON"), (19, 26, "LEXICON")]
+
+def test_file_build_and_saved_automaton_round_trip(tmp_path):
+    src = tmp_path / "entries.txt"
+    src.write_text("NAME\tJohn Smith\nSt Mary Hospital\n\nMRN\tmrn 4411\n", encoding="utf-8")
+    lex = Lexicon.from_file(str(src))
+    lex.save(str(tmp_path / "lex.npz"))
+    back = Lexicon.load(str(tmp_path / "lex.npz"))
+    text = "mrn 4411 for john smith at St Mary Hospital"
+    assert back.find(text) == lex.find(text) == [(0, 8, "MRN"), (13, 23, "NAME"), (27, 43, "LEXICON")]
+    assert len(back) == len(lex)
@@ -0,0 +1,64 @@
+import asyncio, threading, time
+import pytest
+from utils.llm_cache import LLMCache, cache_key
+from reliscore.cache import CacheStore
+
+def _cache(tmp_path):
+    return LLMCache(CacheStore(tmp_path / "llm.sqlite"))
+
+def test_key_covers_endpoint_models_prompt_and_params():
+    k = cache_key(["m"], "sys", "user", temperature=0)
+    assert k == cache_key(["m"], "sys", "user", base_url="https://api.openai.com/v1/", temperature=0)
+    assert len({k, cache_key(["m"], "sys", "user", base_url="http://localhost:8000/v1", temperature=0),
+                cache_key(["m2"], "sys", "user", temperature=0), cache_key(["m"], "sys", "user2", temperature=0),
+                cache_key(["m"], "sys", "user", temperature=1)}) == 5
+
+def test_concurrent_misses_share_one_call(tmp_path):
+    c, calls, gate = _cache(tmp_path), [], threading.Event()
+    def slow():
+        calls.append(1); gate.wait(5)
+        return "answer"
+    out = []
+    ts = [threading.Thread(target=lambda: out.append(c.get_or_compute("k", slow))) for _ in range(8)]
+    for t in ts: t.start()
+    while c.coalesced < 7: time.sleep(0.01)
+    gate.set()
+    for t in ts: t.join()
+    assert out == ["answer"] * 8 and len(calls) == 1 and c.coalesced == 7
+    assert c.get_or_compute("k", lambda: "other") == "answer"
+    assert _cache(tmp_path).get("k") == "answer"  # persisted in the store
+
+def test_failure_reaches_every_waiter_and_is_not_cached(tmp_path):
+    c, gate, errors = _cache(tmp_path), threading.Event(), []
+    def boom():
+        gate.wait(5); raise RuntimeError("rate limited")
+    def call():
+        try: c.get_or_compute("k", boom)
+        except RuntimeError as e: errors.append(str(e))
+    ts = [threading.Thread(target=call) for _ in range(4)]
+    for t in ts: t.start()
+    while c.coalesced < 3: time.sleep(0.01)
+    gate.set()
+    for t in ts: t.join()
+    assert errors == ["rate limited"] * 4
+    assert c.get("k") is None and c.get_or_compute("k", lambda: "ok") == "ok"
+
+def test_async_misses_share_one_call(tmp_path):
+    c, calls = _cache(tmp_path), []
+    async def fetch():
+        calls.append(1); await asyncio.sleep(0.05)
+        return "answer"
+    async def main():
+        return await asyncio.gather(*(c.aget_or_compute("k", fetch) for _ in range(6)))
+    assert asyncio.run(main()) == ["answer"] * 6 and len(calls) == 1
+
+def test_async_failure_is_raised_to_all_and_cleared(tmp_path):
+    c = _cache(tmp_path)
+    async def boom():
+        await asyncio.sleep(0.02); raise ValueError("bad")
+    async def main():
+        return await asyncio.gather(*(c.aget_or_compute("k", boom) for _ in range(3)), return_exceptions=True)
+    assert [type(e) for e in asyncio.run(main())] == [ValueError] * 3
+    assert not c._ainflight
+    with pytest.raises(ValueError):
+        asyncio.run(c.aget_or_compute("k", boom))
@@ -0,0 +1,92 @@
+import asyncio, json, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from benchmarks.fake_openai import FakeOpenAI
+from utils.llm_cache import LLMCache
+from utils.llm_client import LLMGateway, TokenRate
+from reliscore.cache import CacheStore
+
+class _Server(FakeOpenAI):
+    # Per-model latency and failures, and the peak number of requests in flight (overall and per model).
+    def __init__(self, latency=None, fail=()):
+        super().__init__(latency=0)
+        self.server.handle_error = lambda *a: None  # hedged requests that lose the race are dropped mid-response
+        self.delay, self.fail = latency or {}, set(fail)
+        self.inflight, self.peak = {}, {}
+
+    def _track(self, model, d):
+        with self.lock:
+            self.inflight[model] = self.inflight.get(model, 0) + d
+            self.inflight["*"] = self.inflight.get("*", 0) + d
+            for k in (model, "*"): self.peak[k] = max(self.peak.get(k, 0), self.inflight[k])
+
+    def _reply(self, body):
+        m = body["model"]
+        self._track(m, 1)
+        try:
+            time.sleep(self.delay.get(m, 0.05))
+        finally:
+            self._track(m, -1)
+        if m in self.fail:
+            return json.dumps({"error": {"message": "boom", "type": "server_error"}}).encode("utf-8"), 500
+        out, status = super()._reply(body)
+        d = json.loads(out); d["choices"][0]["message"]["content"] = f"from {m}"
+        return json.dumps(d).encode("utf-8"), status
+
+@pytest.fixture
+def server():
+    s = None
+    def start(**kw):
+        nonlocal s
+        s = _Server(**kw).start()
+        return s
+    yield start
+    if s is not None: s.stop()
+
+def _gateway(srv, **kw):
+    return LLMGateway(model="a", base_url=srv.url, api_key="test", cache=kw.pop("cache", False), **kw)
+
+def test_concurrency_limits_hold_across_sync_and_async_calls(server):
+    srv = server(latency={"a": 0.3, "b": 0.3})
+    gw = _gateway(srv, max_concurrency=3, model_concurrency=2)
+    async def burst():
+        return await asyncio.gather(*(gw.acomplete("s", f"u{i}", model="b") for i in range(6)))
+    with ThreadPoolExecutor(8) as pool:
+        futs = [pool.submit(gw.complete, "s", f"u{i}", model="a") for i in range(8)]
+        assert asyncio.run(burst()) == ["from b"] * 6
+        assert [f.result() for f in futs] == ["from a"] * 8
+    assert srv.peak["a"] <= 2 and srv.peak["b"] <= 2 and srv.peak["*"] <= 3
+    assert srv.peak["*"] == 3  # the limits are actually reached, not just respected
+
+def test_failures_are_retried_then_fall_back(server):
+    srv = server(fail={"bad"})
+    gw = _gateway(srv, retries=1)
+    assert gw.complete("s", "u", model="bad", fallbacks=["a"]) == "from a"
+    assert srv.models == {"bad": 2, "a": 1}
+    assert asyncio.run(gw.acomplete("s", "u", model="bad", fallbacks=["a"], retries=0)) == "from a"
+    with pytest.raises(Exception):
+        gw.complete("s", "u", model="bad", fallbacks=[], retries=0)
+
+def test_hedge_answers_from_the_fallback_when_the_primary_is_slow(server):
+    srv = server(latency={"slow": 1.0})
+    gw = _gateway(srv, hedge_after=0.1)
+    t0 = time.monotonic()
+    assert gw.complete("s", "u", model="slow", fallbacks=["a"]) == "from a"
+    assert asyncio.run(gw.acomplete("s", "u", model="slow", fallbacks=["a"])) == "from a"
+    assert time.monotonic() - t0 < 0.9
+    # a primary that answers before the hedge delay never starts the fallback
+    assert gw.complete("s", "u2", model="a", fallbacks=["slow"]) == "from a" and srv.models.get("slow") == 2
+
+def test_token_rate_books_ahead():
+    r = TokenRate(600)  # 10 tokens/s
+    assert r.reserve(600) == 0.0
+    assert r.reserve(10) == pytest.approx(1.0, abs=0.05)
+    assert r.reserve(5000) == pytest.approx(61.0, abs=0.1)  # one request never books more than a minute's budget
+
+def test_deterministic_calls_are_cached(server, tmp_path):
+    srv = server()
+    gw = _gateway(srv, cache=LLMCache(CacheStore(tmp_path / "llm.sqlite")))
+    assert [gw.complete("s", "same") for _ in range(3)] == ["from a"] * 3
+    assert asyncio.run(gw.acomplete("s", "same")) == "from a"
+    gw.complete("s", "same", temperature=0.7); gw.complete("s", "same", cache=False)
+    assert srv.calls == 3
@@ -0,0 +1,69 @@
+import math, random
+import numpy as np
+import pytest
+from src.meta import MetaPool, log_se, median_log_effect, pooled_effect, Z95
+
+def _dl(y, v):
+    # textbook DerSimonian-Laird, straight from the formulas
+    w = [1 / x for x in v]
+    sw = sum(w)
+    mu_f = sum(a * b for a, b in zip(w, y)) / sw
+    q = sum(a * (b - mu_f) ** 2 for a, b in zip(w, y))
+    c = sw - sum(a * a for a in w) / sw
+    t2 = max(0.0, (q - (len(y) - 1)) / c) if len(y) > 1 and c > 0 else 0.0
+    ws = [1 / (x + t2) for x in v]
+    mu_r = sum(a * b for a, b in zip(ws, y)) / sum(ws)
+    return {"fixed": mu_f, "q": q, "tau2": t2, "random": mu_r, "se_r": math.sqrt(1 / sum(ws))}
+
+def _studies(k, seed=0):
+    rnd = random.Random(seed)
+    y = [rnd.gauss(-0.2, 0.3) for _ in range(k)]
+    se = [rnd.uniform(0.05, 0.5) for _ in range(k)]
+    return y, se
+
+@pytest.mark.parametrize("k", [2, 3, 17, 250])
+def test_incremental_pool_matches_the_formulas(k):
+    y, se = _studies(k, k)
+    mp = MetaPool(capacity=2)
+    for s in range(0, k, 7):
+        mp.add(y[s:s + 7], se[s:s + 7])
+    ref = _dl(y, [s * s for s in se])
+    assert mp.k == k
+    assert mp.fixed()["log"] == pytest.approx(ref["fixed"], rel=1e-10, abs=1e-12)
+    assert mp.q == pytest.approx(ref["q"], rel=1e-9, abs=1e-9)
+    assert mp.tau2() == pytest.approx(ref["tau2"], rel=1e-9, abs=1e-12)
+    r = mp.random()
+    assert r["log"] == pytest.approx(ref["random"], rel=1e-9, abs=1e-12)
+    assert r["se"] == pytest.approx(ref["se_r"], rel=1e-9)
+    assert r["ci_low"] == pytest.approx(math.exp(ref["random"] - Z95 * ref["se_r"]), rel=1e-9)
+
+def test_leave_one_out_matches_refitting_without_each_study():
+    y, se = _studies(40, 3)
+    v = [s * s for s in se]
+    loo = MetaPool().add(y, se).leave_one_out()
+    for i in range(40):
+        ref = _dl(y[:i] + y[i + 1:], v[:i] + v[i + 1:])
+        assert loo["fixed"][i] == pytest.approx(ref["fixed"], rel=1e-9, abs=1e-12)
+        assert loo["tau2"][i] == pytest.approx(ref["tau2"], rel=1e-7, abs=1e-12)
+        assert loo["random"][i] == pytest.approx(ref["random"], rel=1e-9, abs=1e-12)
+
+def test_invalid_inputs_are_skipped():
+    y, se = log_se([0.8, -1, 0.5, 0.9, 1.2], [0.6, 0.5, 0.6, 0.7, 1.3], [1.1, 2, 0.4, float("nan"), 1.1])
+    assert np.isfinite(y[0]) and np.isnan(y[1]) and np.isnan(se[2]) and np.isnan(se[3]) and np.isnan(se[4])
+    mp = MetaPool().add(y, se)
+    assert mp.k == 1 and mp.tau2() == 0.0 and mp.heterogeneity()["i2"] == 0.0
+    assert MetaPool().random() is None
+    assert median_log_effect([0.5, 2.0, 4.0, float("nan"), -1]) == pytest.approx(math.log(2.0))
+    assert median_log_effect([]) == 0.0
+
+def test_pooled_effect_over_study_points():
+    pts = [{"id": f"s{i}", "effect": {"value": v, "ci_low": lo, "ci_high": hi}}
+           for i, (v, lo, hi) in enumerate([(0.8, 0.6, 1.07), (0.7, 0.5, 0.98), (1.1, 0.8, 1.5), (0.9, 0.85, 0.95)])]
+    out = pooled_effect(pts + [{"id": "none"}])
+    y, se = log_se([0.8, 0.7, 1.1, 0.9], [0.6, 0.5, 0.8, 0.85], [1.07, 0.98, 1.5, 0.95])
+    assert out["method"] == "dersimonian_laird" and out["n"] == 4 and out["k"] == 4
+    assert out["pooled"] == pytest.approx(math.exp(_dl(list(y), list(se ** 2))["random"]))
+    assert out["loo"]["most_influential"] in {p["id"] for p in pts}
+    geo = pooled_effect([{"effect": {"value": 0.5}}, {"effect": {"value": 2.0}}])
+    assert geo["method"] == "geometric_mean" and geo["pooled"] == pytest.approx(1.0)
+    assert pooled_effect([{"effect": {}}]) == {"pooled": None, "n": 0}
@@ -0,0 +1,45 @@
+import random
+from agents.redactor_agent import redact_stream, redact_with_spans
+from utils.lexicon import Lexicon
+
+_ALPHABET = "ab0123456789@.-_+% \n"
+
+def _text(rnd, n):
+    # digits, separators and long runs of [\w.%+@-] so that matches and runs straddle the stream cuts
+    parts = []
+    while sum(map(len, parts)) < n:
+        r = rnd.random()
+        if r < 0.2: parts.append(f"{rnd.randint(100, 999)}-{rnd.randint(10, 99)}-{rnd.randint(1000, 9999)}")
+        elif r < 0.4: parts.append("x" * rnd.randint(1, 60) + "@host.example.org")
+        elif r < 0.5: parts.append("John Smith")
+        else: parts.append("".join(rnd.choice(_ALPHABET) for _ in range(rnd.randint(1, 40))))
+        parts.append(rnd.choice([" ", "", "\n", "."]))
+    return "".join(parts)
+
+def _chunks(rnd, text):
+    i = 0
+    while i < len(text):
+        j = i + rnd.randint(1, 50)
+        yield text[i:j]
+        i = j
+
+def _streamed(text, rnd, overlap, lexicon):
+    out, spans = [], []
+    for t, sp in redact_stream(_chunks(rnd, text), overlap=overlap, lexicon=lexicon):
+        out.append(t); spans += sp
+    return "".join(out), spans
+
+def test_stream_matches_whole_text_redaction():
+    rnd = random.Random(0)
+    lex = Lexicon.build([("John Smith", "NAME")])
+    for i in range(1500):
+        text = _text(rnd, rnd.randint(0, 600))
+        overlap = rnd.randint(12, 40)  # at least the longest match ("John Smith"), as STREAM_OVERLAP requires
+        lexicon = lex if i % 2 else None
+        assert _streamed(text, rnd, overlap, lexicon) == redact_with_spans(text, lexicon), (text, overlap)
+
+def test_run_longer_than_the_buffer_is_held_until_it_ends():
+    text = "id " + "7" * 500 + "@host.org and 123-45-6789"
+    out, spans = _streamed(text, random.Random(1), 16, None)
+    assert out == "id [REDACTED] and [REDACTED]"
+    assert [s["type"] for s in spans] == ["EMAIL", "SSN"]
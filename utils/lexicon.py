@@ -0,0 +1,136 @@
+import re, sys, time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+Entry = Union[str, Tuple[str, str]]
+
+class Lexicon:
+    # Aho-Corasick automaton over word tokens: entries match on word boundaries only, in one left-to-right pass.
+    # State transitions are a flat dict keyed by state * n_words + word_id; out_len/out_kind already follow the fail chain.
+    def __init__(self, vocab: Dict[str, int], goto: Dict[int, int], fail: List[int], out_len: List[int], out_kind: List[int],
+                 kinds: List[str], case_sensitive: bool = False):
+        self.vocab, self.goto, self.fail = vocab, goto, fail
+        self.out_len, self.out_kind, self.kinds = out_len, out_kind, kinds
+        self.case_sensitive = case_sensitive
+        self.V = max(1, len(vocab))
+        self.max_len = max(out_len) if out_len else 0
+
+    @classmethod
+    def build(cls, entries: Iterable[Entry], case_sensitive: bool = False, default_kind: str = "LEXICON") -> "Lexicon":
+        # entries: "text" or ("text", kind); kind becomes the span type.
+        norm = (lambda w: w) if case_sensitive else str.casefold
+        vocab: Dict[str, int] = {}
+        kinds: List[str] = []
+        kind_ids: Dict[str, int] = {}
+        seqs = []
+        for e in entries:
+            text, kind = (e, default_kind) if isinstance(e, str) else e
+            toks = [norm(t) for t in _TOKEN.findall(text)]
+            if not toks: continue
+            if kind not in kind_ids:
+                kind_ids[kind] = len(kinds); kinds.append(kind)
+            seqs.append(([vocab.setdefault(t, len(vocab)) for t in toks], kind_ids[kind]))
+        V = max(1, len(vocab))
+        goto: Dict[int, int] = {}
+        parent, label, depth, own_len, own_kind = [0], [0], [0], [0], [0]
+        for ids, k in seqs:
+            s = 0
+            for w in ids:
+                key = s * V + w
+                nxt = goto.get(key)
+                if nxt is None:
+                    nxt = len(parent)
+                    goto[key] = nxt
+                    parent.append(s); label.append(w); depth.append(depth[s] + 1); own_len.append(0); own_kind.append(0)
+                s = nxt
+            if len(ids) > own_len[s]:
+                own_len[s], own_kind[s] = len(ids), k
+        n = len(parent)
+        fail, out_len, out_kind = [0] * n, own_len[:], own_kind[:]
+        # Breadth-first: a state's fail target is always shallower, so it is final before we read it.
+        for s in sorted(range(1, n), key=depth.__getitem__):
+            p, w = parent[s], label[s]
+            if p:
+                f = fail[p]
+                while f and (f * V + w) not in goto:
+                    f = fail[f]
+                t = goto.get(f * V + w, 0)
+                fail[s] = t if t != s else 0
+            if out_len[fail[s]] > out_len[s]:
+                out_len[s], out_kind[s] = out_len[fail[s]], out_kind[fail[s]]
+        return cls(vocab, goto, fail, out_len, out_kind, kinds, case_sensitive)
+
+    @classmethod
+    def from_file(cls, path: str, case_sensitive: bool = False, default_kind: str = "LEXICON") -> "Lexicon":
+        # One entry per line, optionally "KIND<TAB>entry".
+        def rows():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    if not line.strip(): continue
+                    kind, sep, text = line.partition("\t")
+                    yield (text, kind) if sep else line
+        return cls.build(rows(), case_sensitive, default_kind)
+
+    def save(self, path: str):
+        words = [""] * len(self.vocab)
+        for w, i in self.vocab.items(): words[i] = w
+        keys = np.fromiter(self.goto.keys(), dtype=np.int64, count=len(self.goto))
+        vals = np.fromiter(self.goto.values(), dtype=np.int32, count=len(self.goto))
+        np.savez(path, keys=keys, vals=vals, fail=np.asarray(self.fail, dtype=np.int32),
+                 out_len=np.asarray(self.out_len, dtype=np.int16), out_kind=np.asarray(self.out_kind, dtype=np.int16),
+                 words=np.frombuffer("\n".join(words).encode("utf-8"), dtype=np.uint8),
+                 kinds=np.frombuffer("\n".join(self.kinds).encode("utf-8"), dtype=np.uint8),
+                 case_sensitive=np.asarray(self.case_sensitive))
+
+    @classmethod
+    def load(cls, path: str) -> "Lexicon":
+        z = np.load(path)
+        words = z["words"].tobytes().decode("utf-8").split("\n") if len(z["words"]) else []
+        kinds = z["kinds"].tobytes().decode("utf-8").split("\n") if len(z["kinds"]) else []
+        return cls({w: i for i, w in enumerate(words)}, dict(zip(z["keys"].tolist(), z["vals"].tolist())),
+                   z["fail"].tolist(), z["out_len"].tolist(), z["out_kind"].tolist(), kinds, bool(z["case_sensitive"]))
+
+    def find(self, text: str, pos: int = 0, endpos: Optional[int] = None) -> List[Tuple[int, int, str]]:
+        # Sorted, non-overlapping (start, end, kind) spans; overlapping entries are merged into one span.
+        vocab, goto, fail, out_len, V = self.vocab, self.goto, self.fail, self.out_len, self.V
+        endpos = len(text) if endpos is None else endpos
+        folded = text if self.case_sensitive else text.casefold()
+        per_token = len(folded) != len(text)  # casefold changed lengths (e.g. ß), so fold token by token instead
+        src = text if per_token else folded
+        starts = deque(maxlen=max(1, self.max_len))
+        hits = []
+        s = 0
+        for m in _TOKEN.finditer(src, pos, endpos):
+            w = vocab.get(m.group().casefold() if per_token else m.group())
+            if w is None:
+                # no entry contains this word, so no match can span it
+                s = 0; continue
+            starts.append(m.start())
+            while s and (s * V + w) not in goto:
+                s = fail[s]
+            s = goto.get(s * V + w, 0)
+            L = out_len[s]
+            if L:
+                hits.append((starts[-L], m.end(), self.kinds[self.out_kind[s]]))
+        if not hits: return []
+        hits.sort()
+        out = [hits[0]]
+        for a, b, k in hits[1:]:
+            if a < out[-1][1]:
+                if b > out[-1][1]: out[-1] = (out[-1][0], b, out[-1][2])
+            else:
+                out.append((a, b, k))
+        return out
+
+    def __len__(self) -> int:
+        return len(self.fail)
+
+if __name__ == "__main__":
+    # python -m utils.lexicon <entries.txt> <out.npz> [--case-sensitive]
+    t0 = time.perf_counter()
+    lex = Lexicon.from_file(sys.argv[1], case_sensitive="--case-sensitive" in sys.argv)
+    lex.save(sys.argv[2])
+    print(f"{len(lex)} states, {len(lex.vocab)} words in {time.perf_counter() - t0:.1f}s -> {sys.argv[2]}")
@@ -0,0 +1,105 @@
+import os, json, asyncio, hashlib, threading
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+from utils import reliscore  # registers ReliScore_Agents/src as the "reliscore" package
+# Storage is ReliScore's CacheStore (LRU over SQLite, TTL, byte bound).
+from reliscore.cache import CacheStore, get_store
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_MEM_ITEMS = int(os.getenv("LLM_CACHE_MEM_ITEMS", "1024"))
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+def cache_key(models: Sequence[str], system: str, user: str, base_url: Optional[str] = None, **params) -> str:
+    # The endpoint is part of the key: two OpenAI-compatible servers can serve different models under the same name.
+    blob = json.dumps({"base_url": (base_url or DEFAULT_BASE_URL).rstrip("/"), "models": list(models), "system": system,
+                       "user": user, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+    def __init__(self):
+        self.event, self.value, self.error = threading.Event(), None, None
+
+class LLMCache:
+    # Completion text by content hash in the "llm" CacheStore; concurrent misses for one key share one call.
+    def __init__(self, store: Optional[CacheStore] = None):
+        self.store = store or get_store("llm", max_bytes=LLM_CACHE_MAX_BYTES, mem_items=LLM_CACHE_MEM_ITEMS, default_ttl=LLM_CACHE_TTL)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+        self._ainflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[str]:
+        return self.store.get(key)
+
+    def set(self, key: str, text: str):
+        self.store.set(key, text)
+
+    def get_or_compute(self, key: str, fn: Callable[[], str]) -> str:
+        text = self.get(key)
+        if text is not None:
+            return text
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None: raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+            self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_compute(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        text = self.get(key)
+        if text is not None:
+            return text
+        fut = self._ainflight.get(key)
+        if fut is not None and fut.get_loop() is asyncio.get_running_loop():
+            with self._lock: self.coalesced += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._ainflight[key] = fut
+        try:
+            text = await fn()
+            self.set(key, text)
+            fut.set_result(text)
+            return text
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            if self._ainflight.get(key) is fut:
+                del self._ainflight[key]
+
+    def stats(self) -> Dict:
+        return dict(self.store.stats(), coalesced=self.coalesced)
+
+_CACHE: Optional[LLMCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMCache]:
+    # LLM_CACHE=0 turns response caching off process-wide.
+    global _CACHE
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = LLMCache()
+        return _CACHE
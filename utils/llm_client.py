@@ -1,21 +1,246 @@
-import os
+import os, time, random, asyncio, logging, threading, weakref
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Sequence, Union
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from utils.llm_cache import LLMCache, cache_key, get_llm_cache
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
 
 load_dotenv()
+log = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "4"))
+LLM_TPM = int(os.getenv("LLM_TPM", "200000"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "1.0"))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+RETRYABLE = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+class TokenRate:
+    # Tokens-per-minute bucket. reserve() books the tokens and says how long to wait, so sync and async share it.
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.cap = float(per_minute)
+        self.level, self.ts = self.cap, time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, n: int) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.cap, self.level + (now - self.ts) * self.rate)
+            self.ts = now
+            self.level -= min(n, self.cap)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+def _estimate_tokens(system: str, user: str, max_tokens: int) -> int:
+    return (len(system or "") + len(user or "")) // 4 + (max_tokens or 0)
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, LLM_BACKOFF * (2 ** attempt))
+
+@asynccontextmanager
+async def _slots(*sems: threading.BoundedSemaphore):
+    # Holds the same thread semaphores the sync path uses, without blocking the event loop. Acquisition is polled rather
+    # than handed to a thread, so a cancelled task never ends up holding (and leaking) a slot.
+    held = []
+    try:
+        for sem in sems:
+            delay = 0.001
+            while not sem.acquire(blocking=False):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+            held.append(sem)
+        yield
+    finally:
+        for sem in reversed(held): sem.release()
+
+class LLMGateway:
+    # One pooled OpenAI client per process, shared concurrency/token limits, jittered retries, optional hedging to a fallback model.
+    # complete() and acomplete() draw on the same concurrency slots; the async client is per event loop, since httpx's
+    # async pool is bound to the loop it was first used on (a later asyncio.run would find it closed).
+    def __init__(self, model: Optional[str] = None, fallbacks: Sequence[str] = (), base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, model_concurrency: int = LLM_MODEL_CONCURRENCY, tpm: int = LLM_TPM,
+                 retries: int = LLM_RETRIES, hedge_after: float = LLM_HEDGE_AFTER, timeout: float = LLM_TIMEOUT, cache: Union[LLMCache, bool, None] = None):
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.fallbacks = list(fallbacks)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.api_key = api_key
+        self.retries, self.hedge_after, self.timeout = retries, hedge_after, timeout
+        self.model_concurrency, self.tpm = model_concurrency, tpm
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._per_model: Dict[str, threading.BoundedSemaphore] = {}
+        self._rates: Dict[str, TokenRate] = {}
+        self._lock = threading.Lock()
+        self._client: Optional[OpenAI] = None
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-hedge")
+        self._max_concurrency = max_concurrency
+        self.cache = get_llm_cache() if cache is None else (cache or None)
+
+    @property
+    def client(self) -> OpenAI:
+        with self._lock:
+            if self._client is None:
+                http = httpx.Client(limits=httpx.Limits(max_connections=self._max_concurrency * 2, max_keepalive_connections=self._max_concurrency), timeout=self.timeout)
+                self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http, max_retries=0)
+            return self._client
+
+    @property
+    def aclient(self) -> AsyncOpenAI:
+        # The running loop's client; must be called from a coroutine.
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            c = self._aclients.get(loop)
+            if c is None:
+                http = httpx.AsyncClient(limits=httpx.Limits(max_connections=self._max_concurrency * 2, max_keepalive_connections=self._max_concurrency), timeout=self.timeout)
+                c = self._aclients[loop] = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http, max_retries=0)
+            return c
+
+    def _sem(self, model: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if model not in self._per_model:
+                self._per_model[model] = threading.BoundedSemaphore(self.model_concurrency)
+                self._rates[model] = TokenRate(self.tpm)
+            return self._per_model[model]
+
+    def _messages(self, system: str, user: str) -> List[Dict]:
+        return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+    # ---- sync ----
+    def _call(self, model: str, system: str, user: str, max_tokens: int, temperature: float, retries: int) -> str:
+        sem = self._sem(model)
+        last = None
+        for attempt in range(retries + 1):
+            time.sleep(self._rates[model].reserve(_estimate_tokens(system, user, max_tokens)))
+            with self._global, sem:
+                try:
+                    resp = self.client.chat.completions.create(model=model, messages=self._messages(system, user),
+                                                               max_tokens=max_tokens, temperature=temperature)
+                    return resp.choices[0].message.content.strip()
+                except RETRYABLE as e:
+                    last = e
+                    log.info("llm attempt %d on %s failed: %s", attempt + 1, model, e)
+            if attempt < retries:
+                time.sleep(_backoff(attempt))
+        raise last
+
+    def _chain(self, models: List[str], *args) -> str:
+        last = None
+        for m in models:
+            try:
+                return self._call(m, *args)
+            except Exception as e:
+                last = e
+        raise last
+
+    def _cached(self, cache: Optional[bool], temperature: float) -> bool:
+        # Only deterministic calls are cached unless the caller says otherwise; cache=False always bypasses.
+        return self.cache is not None and (temperature == 0.0 if cache is None else cache)
+
+    def complete(self, system: str, user: str, model: Optional[str] = None, fallbacks: Optional[Sequence[str]] = None,
+                 max_tokens: int = 800, temperature: float = 0.0, retries: Optional[int] = None, hedge_after: Optional[float] = None,
+                 cache: Optional[bool] = None) -> str:
+        models = [model or self.model] + list(self.fallbacks if fallbacks is None else fallbacks)
+        args = (system, user, max_tokens, temperature, self.retries if retries is None else retries)
+        hedge = self.hedge_after if hedge_after is None else hedge_after
+        if self._cached(cache, temperature):
+            key = cache_key(models, system, user, self.base_url, max_tokens=max_tokens, temperature=temperature)
+            return self.cache.get_or_compute(key, lambda: self._complete(models, args, hedge))
+        return self._complete(models, args, hedge)
+
+    def _complete(self, models: List[str], args: tuple, hedge: float) -> str:
+        if not hedge or len(models) < 2:
+            return self._chain(models, *args)
+        # Hedge: if the primary is still running after `hedge` seconds, race the fallback chain against it.
+        primary = self._hedge_pool.submit(self._call, models[0], *args)
+        done, _ = wait([primary], timeout=hedge)
+        if done and primary.exception() is None:
+            return primary.result()
+        backup = self._hedge_pool.submit(self._chain, models[1:], *args)
+        pending = {primary, backup}
+        last = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                last = f.exception()
+        raise last
+
+    # ---- async ----
+    async def _acall(self, model: str, system: str, user: str, max_tokens: int, temperature: float, retries: int) -> str:
+        sem = self._sem(model)
+        last = None
+        for attempt in range(retries + 1):
+            await asyncio.sleep(self._rates[model].reserve(_estimate_tokens(system, user, max_tokens)))
+            async with _slots(self._global, sem):
+                try:
+                    resp = await self.aclient.chat.completions.create(model=model, messages=self._messages(system, user),
+                                                                      max_tokens=max_tokens, temperature=temperature)
+                    return resp.choices[0].message.content.strip()
+                except RETRYABLE as e:
+                    last = e
+                    log.info("llm attempt %d on %s failed: %s", attempt + 1, model, e)
+            if attempt < retries:
+                await asyncio.sleep(_backoff(attempt))
+        raise last
+
+    async def _achain(self, models: List[str], *args) -> str:
+        last = None
+        for m in models:
+            try:
+                return await self._acall(m, *args)
+            except Exception as e:
+                last = e
+        raise last
+
+    async def acomplete(self, system: str, user: str, model: Optional[str] = None, fallbacks: Optional[Sequence[str]] = None,
+                        max_tokens: int = 800, temperature: float = 0.0, retries: Optional[int] = None, hedge_after: Optional[float] = None,
+                        cache: Optional[bool] = None) -> str:
+        models = [model or self.model] + list(self.fallbacks if fallbacks is None else fallbacks)
+        args = (system, user, max_tokens, temperature, self.retries if retries is None else retries)
+        hedge = self.hedge_after if hedge_after is None else hedge_after
+        if self._cached(cache, temperature):
+            key = cache_key(models, system, user, self.base_url, max_tokens=max_tokens, temperature=temperature)
+            return await self.cache.aget_or_compute(key, lambda: self._acomplete(models, args, hedge))
+        return await self._acomplete(models, args, hedge)
+
+    async def _acomplete(self, models: List[str], args: tuple, hedge: float) -> str:
+        if not hedge or len(models) < 2:
+            return await self._achain(models, *args)
+        primary = asyncio.ensure_future(self._acall(models[0], *args))
+        done, _ = await asyncio.wait({primary}, timeout=hedge)
+        if done and primary.exception() is None:
+            return primary.result()
+        pending = {primary, asyncio.ensure_future(self._achain(models[1:], *args))}
+        last = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    for p in pending: p.cancel()
+                    return f.result()
+                last = f.exception()
+        raise last
+
+_GATEWAY: Optional[LLMGateway] = None
+_GATEWAY_LOCK = threading.Lock()
+
+def get_gateway() -> LLMGateway:
+    global _GATEWAY
+    with _GATEWAY_LOCK:
+        if _GATEWAY is None:
+            _GATEWAY = LLMGateway()
+        return _GATEWAY
 
 class LLMClient:
+    # Thin per-model handle on the shared gateway; cheap to construct.
     def __init__(self, model=None):
-        self.client = OpenAI()
-        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.gateway = get_gateway()
+        self.model = model or self.gateway.model
 
-    def complete(self, system: str, user: str, max_tokens: int = 800) -> str:
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.0,
-        )
-        return resp.choices[0].message.content.strip()
+    def complete(self, system: str, user: str, max_tokens: int = 800, cache: Optional[bool] = None) -> str:
+        return self.gateway.complete(system, user, model=self.model, max_tokens=max_tokens, temperature=0.0, cache=cache)
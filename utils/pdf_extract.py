@@ -0,0 +1,156 @@
+import os, io, mmap, hashlib, tempfile, threading, multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+import pdfplumber
+import PyPDF2
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+PDF_BATCH_PAGES = int(os.getenv("PDF_BATCH_PAGES", "8"))
+PDF_MEM_DOCS = int(os.getenv("PDF_MEM_DOCS", "16"))
+# Extracted text of uploaded reports is patient data: it is kept on disk only when PDF_CACHE=1, and then in the
+# bounded, expiring "pdf_text" CacheStore rather than indefinitely.
+PDF_CACHE = os.getenv("PDF_CACHE", "0") == "1"
+PDF_CACHE_TTL = float(os.getenv("PDF_CACHE_TTL", str(24 * 3600)))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+Source = Union[bytes, bytearray, memoryview, str, Path]
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_MEM: "OrderedDict[str, List[str]]" = OrderedDict()
+_MEM_LOCK = threading.Lock()
+
+def _open(src) -> io.IOBase:
+    # Paths are memory-mapped read-only rather than read into a buffer.
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return io.BytesIO(src)
+    with open(src, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def file_hash(src: Source) -> str:
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(src).hexdigest()
+    fp = _open(src)
+    try:
+        return hashlib.sha256(fp).hexdigest()
+    finally:
+        fp.close()
+
+def page_count(src: Source) -> int:
+    fp = _open(src)
+    try:
+        return len(PyPDF2.PdfReader(fp).pages)
+    finally:
+        fp.close()
+
+def _iter_range(src, first: int, last: int) -> Iterator[str]:
+    # pdfplumber per page; only a page it fails on is retried with PyPDF2.
+    fp = _open(src)
+    try:
+        try:
+            pdf = pdfplumber.open(fp)
+        except Exception:
+            pdf = None
+        reader = None
+        for i in range(first, last):
+            text = None
+            if pdf is not None:
+                try:
+                    page = pdf.pages[i]
+                    text = page.extract_text() or ""
+                    page.close()  # drop the parsed layout so long documents don't accumulate it
+                except Exception:
+                    pass
+            if text is None:
+                try:
+                    reader = reader or PyPDF2.PdfReader(fp)
+                    text = reader.pages[i].extract_text() or ""
+                except Exception:
+                    text = ""
+            yield text
+        if pdf is not None: pdf.close()
+    finally:
+        fp.close()
+
+def _extract_range(src, first: int, last: int) -> List[str]:
+    return list(_iter_range(src, first, last))
+
+def _pool() -> ProcessPoolExecutor:
+    # spawn for the same reason as the render pool: the Streamlit server is multi-threaded.
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+def _store():
+    from utils import reliscore  # registers ReliScore_Agents/src as the "reliscore" package
+    from reliscore.cache import get_store
+    # mem_items=0: the in-process tier is _MEM, which keeps the page lists themselves
+    return get_store("pdf_text", max_bytes=PDF_CACHE_MAX_BYTES, mem_items=0, default_ttl=PDF_CACHE_TTL)
+
+def _mem_put(h: str, pages: List[str]):
+    with _MEM_LOCK:
+        _MEM[h] = pages
+        _MEM.move_to_end(h)
+        while len(_MEM) > PDF_MEM_DOCS:
+            _MEM.popitem(last=False)
+
+def _cache_get(h: str) -> Optional[List[str]]:
+    with _MEM_LOCK:
+        if h in _MEM:
+            _MEM.move_to_end(h)
+            return _MEM[h]
+    if not PDF_CACHE:
+        return None
+    pages = _store().get(h)
+    if pages is not None:
+        _mem_put(h, pages)
+    return pages
+
+def _cache_put(h: str, pages: List[str]):
+    _mem_put(h, pages)
+    if PDF_CACHE:
+        _store().set(h, pages)
+
+def iter_pages(src: Source, workers: int = PDF_WORKERS, batch: int = PDF_BATCH_PAGES) -> Iterator[Tuple[int, str]]:
+    # Yields (page_index, text) in page order as soon as each batch of pages is done; results are cached by file hash.
+    if isinstance(src, (bytearray, memoryview)):
+        src = bytes(src)
+    elif not isinstance(src, bytes):
+        src = str(src)
+    h = file_hash(src)
+    cached = _cache_get(h)
+    if cached is not None:
+        yield from enumerate(cached)
+        return
+    n = page_count(src)
+    pages: List[str] = []
+    if workers <= 1 or n <= batch:
+        for text in _iter_range(src, 0, n):
+            yield len(pages), text
+            pages.append(text)
+    else:
+        # Workers get a path, not the bytes: an upload would otherwise be pickled to the pool once per batch. The
+        # private temp copy is removed once every batch has been read.
+        tmp = None
+        if isinstance(src, bytes):
+            fd, tmp = tempfile.mkstemp(prefix="reli-pdf-", suffix=".pdf")
+            with os.fdopen(fd, "wb") as f: f.write(src)
+        futs = [_pool().submit(_extract_range, tmp or src, a, min(a + batch, n)) for a in range(0, n, batch)]
+        try:
+            for f in futs:
+                for text in f.result():
+                    yield len(pages), text
+                    pages.append(text)
+        finally:
+            for f in futs: f.cancel()
+            if tmp is not None:
+                wait(futs)
+                os.unlink(tmp)
+    _cache_put(h, pages)
+
+def extract_text(src: Source, **kw) -> str:
+    return "\n".join(t for _, t in iter_pages(src, **kw) if t).strip()
@@ -0,0 +1,20 @@
+import os, sys, importlib.util
+
+# ReliScore_Agents/src registered as the package "reliscore", so the app can use its modules (cache, ...) without
+# putting a generically named `src` on sys.path. Its modules import each other relatively, so they load as reliscore.*.
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ReliScore_Agents", "src")
+
+def _register():
+    mod = sys.modules.get("reliscore")
+    if mod is None:
+        spec = importlib.util.spec_from_file_location("reliscore", os.path.join(SRC, "__init__.py"), submodule_search_locations=[SRC])
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules["reliscore"] = mod
+        try:
+            spec.loader.exec_module(mod)
+        except BaseException:
+            del sys.modules["reliscore"]
+            raise
+    return mod
+
+_register()